@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+SWIFT 解析性能基准
+
+并行扩展性：同一批报文分别用 1/2/4/... 个进程解析，输出吞吐量(files/s)和加速比。
+OLE 读取：生成 Outlook .msg（可带附件），对比内置正文流读取器与 extract_msg 的单文件耗时和峰值内存。
+DW 回写：合成大 DW 表，对比金额模糊匹配的线性扫描与排序索引（结果逐条核对）。
+分阶段：用 swift_corpus 生成合成语料（IN/OUT、USD/EUR、50K/50F、59/59F/59K、不同长度的 HISTORY、
+文本导出 + OLE），分别计时 read / tokenize / extract / map / write，结果写成 JSON 便于对比回归。
+
+用法：
+    python benchmark_swift.py --files 5000 --workers 1,2,4,8,16
+    python benchmark_swift.py --ole --files 300 --attachment-kb 512
+    python benchmark_swift.py --suite --sizes 100,1000,10000,100000 --json bench_results.json
+    python benchmark_swift.py --dw --dw-rows 300000 --step3-rows 5000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import swift_core
+import swift_ole
+from swift_corpus import build_ole_msg, generate_corpus
+from swift_export import open_table_writer
+from swift_records import RecordStore
+from swift_xlsx import StreamingXlsxWriter
+
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_FILES = ["报文1", "报文2"]
+
+
+# -----------------------------
+# 语料：复制样例报文
+# -----------------------------
+def build_corpus(folder: str, n_files: int) -> list[str]:
+    samples = []
+    for name in SAMPLE_FILES:
+        with open(os.path.join(PROJECT_DIR, name), "rb") as f:
+            samples.append(f.read())
+
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(folder, f"{i:06d}.msg")
+        with open(path, "wb") as f:
+            f.write(samples[i % len(samples)])
+        paths.append(path)
+    return paths
+
+
+# -----------------------------
+# 并行扩展性
+# -----------------------------
+def bench_workers(paths: list[str], worker_counts: list[int]) -> list[dict]:
+    results = []
+    base = None
+    for w in worker_counts:
+        t0 = time.perf_counter()
+        n = sum(1 for _ in swift_core.iter_parsed_files(paths, w))
+        elapsed = time.perf_counter() - t0
+
+        rate = n / elapsed if elapsed > 0 else 0.0
+        if base is None:
+            base = rate
+        results.append({
+            "workers": w,
+            "files": n,
+            "seconds": round(elapsed, 3),
+            "files_per_sec": round(rate, 1),
+            "speedup": round(rate / base, 2) if base else 0.0,
+        })
+    return results
+
+
+def print_table(results: list[dict]):
+    print(f"{'workers':>8} {'files':>8} {'seconds':>9} {'files/s':>10} {'speedup':>8}")
+    for r in results:
+        print(f"{r['workers']:>8} {r['files']:>8} {r['seconds']:>9.3f} "
+              f"{r['files_per_sec']:>10.1f} {r['speedup']:>7.2f}x")
+
+
+# -----------------------------
+# OLE 读取：内置读取器 vs extract_msg
+# -----------------------------
+def build_ole_corpus(folder: str, n_files: int, attachment_size: int = 0) -> list[str]:
+    samples = []
+    for name in SAMPLE_FILES:
+        with open(os.path.join(PROJECT_DIR, name), "r", encoding="utf-8", errors="ignore") as f:
+            samples.append(f.read())
+
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(folder, f"{i:06d}.msg")
+        with open(path, "wb") as f:
+            f.write(build_ole_msg(samples[i % len(samples)], f"SWIFT {i}", attachment_size))
+        paths.append(path)
+    return paths
+
+
+def _read_builtin(path: str) -> str:
+    body, _ = swift_ole.read_msg_body_subject(path)
+    return body
+
+
+def _read_extract_msg(path: str) -> str:
+    return swift_core._read_outlook_msg(path)
+
+
+def bench_ole_reader(paths: list[str]) -> list[dict]:
+    results = []
+    for name, fn in (("builtin", _read_builtin), ("extract_msg", _read_extract_msg)):
+        fn(paths[0])   # 预热：首次调用的导入开销不计入
+
+        t0 = time.perf_counter()
+        for p in paths:
+            fn(p)
+        elapsed = time.perf_counter() - t0
+
+        # 峰值内存单独测一遍（tracemalloc 本身会拖慢计时）
+        peak = 0
+        tracemalloc.start()
+        for p in paths:
+            tracemalloc.reset_peak()
+            fn(p)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        results.append({
+            "reader": name,
+            "files": len(paths),
+            "ms_per_file": round(elapsed * 1000 / len(paths), 3),
+            "peak_kb": round(peak / 1024, 1),
+        })
+    return results
+
+
+def print_ole_table(results: list[dict]):
+    print(f"{'reader':>12} {'files':>8} {'ms/file':>10} {'peak KB':>10}")
+    for r in results:
+        print(f"{r['reader']:>12} {r['files']:>8} {r['ms_per_file']:>10.3f} {r['peak_kb']:>10.1f}")
+
+
+# -----------------------------
+# 分阶段基准（合成语料）
+# -----------------------------
+def _timed(results: dict, stage: str, n: int, fn):
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    results[stage] = {
+        "seconds": round(elapsed, 4),
+        "us_per_msg": round(elapsed * 1e6 / n, 2) if n else 0.0,
+        "msgs_per_sec": round(n / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    return out
+
+
+def _synthetic_mapping(recs: list[dict]) -> tuple:
+    """一半账号按 (账号, 币种) 命中，另一半只按账号命中，模拟真实 mapping 的两种查找路径。"""
+    by_ccy, by_acct = {}, {}
+    for i, rec in enumerate(recs):
+        acct = rec["Client Acct"]
+        if not acct:
+            continue
+        if i % 2:
+            by_ccy[(acct, rec["CCY"])] = f"P{i:06d}"
+        else:
+            by_acct.setdefault(acct, f"P{i:06d}")
+    return by_ccy, by_acct
+
+
+def _write_outputs(fmt: str, out_dir: str, recs: list[dict]):
+    base = os.path.join(out_dir, "bench_Swift")
+    finals = [r for r in recs if swift_core.is_step3_valid(r)]
+    if fmt == "xlsx":
+        debug_cols = ["FILE", "DIRECTION"] + swift_core.STEP3_COLS
+        with StreamingXlsxWriter(base + ".xlsx") as wb:
+            ws = wb.add_sheet("Step3_Final", swift_core.STEP3_COLS)
+            for r in finals:
+                ws.append([r[c] for c in swift_core.STEP3_COLS])
+            ws = wb.add_sheet("Debug", debug_cols)
+            for r in recs:
+                ws.append([r[c] for c in debug_cols])
+        return
+    with open_table_writer(fmt, f"{base}_Step3_Final.{fmt}", swift_core.STEP3_COLS) as t:
+        for r in finals:
+            t.append([r[c] for c in swift_core.STEP3_COLS])
+    with open_table_writer(fmt, f"{base}_Debug.{fmt}", swift_core.DEBUG_EXPORT_COLS) as t:
+        for r in recs:
+            t.append([r[c] for c in swift_core.DEBUG_EXPORT_COLS])
+
+
+def bench_stages(paths: list[str], out_dir: str, formats=("xlsx", "csv", "parquet")) -> dict:
+    """
+    单进程依次跑各阶段，每阶段的输入是上一阶段的输出：
+      read      read_msg_text（含格式识别、OLE 正文流、尾部截断）
+      tokenize  tokenize_blocks
+      extract   extract_step3_record（内部会再切一次 tag 段，是完整的单条解析耗时）
+      map       PRIM ID 查找
+      store     装入列式 RecordStore
+      filter    RecordStore.valid_mask（Step3_Final 批量过滤）
+      write_*   各输出格式（Step3_Final + Debug）
+    """
+    n = len(paths)
+    stages = {}
+    texts = _timed(stages, "read", n, lambda: [swift_core.read_msg_text(p) for p in paths])
+    _timed(stages, "tokenize", n, lambda: [swift_core.tokenize_blocks(t) for t in texts])
+    recs = _timed(stages, "extract", n, lambda: [swift_core.extract_step3_record(t) for t in texts])
+
+    by_ccy, by_acct = _synthetic_mapping(recs)
+
+    def apply_mapping():
+        for p, r in zip(paths, recs):
+            r["PRIM ID"] = swift_core.lookup_prim_id(by_ccy, by_acct, r["Client Acct"], r["CCY"])
+            r["FILE"] = os.path.basename(p)
+            r["ERROR"] = ""
+    _timed(stages, "map", n, apply_mapping)
+
+    store = _timed(stages, "store", n, lambda: RecordStore.from_records(recs))
+    _timed(stages, "filter", n, store.valid_mask)
+
+    for fmt in formats:
+        try:
+            _timed(stages, f"write_{fmt}", n, lambda: _write_outputs(fmt, out_dir, recs))
+        except ImportError as e:   # 没装 pyarrow 时跳过 parquet
+            stages[f"write_{fmt}"] = {"skipped": str(e)}
+    stages["memory"] = record_memory(recs)
+    return stages
+
+
+def record_memory(recs: list[dict]) -> dict:
+    """同一批记录分别存成 list[dict] 和 RecordStore 的每条内存（tracemalloc，重新构造后测量）。"""
+    payload = [json.dumps(r, ensure_ascii=False) for r in recs]
+    n = max(1, len(payload))
+
+    tracemalloc.start()
+    rows = [json.loads(p) for p in payload]
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+
+    tracemalloc.start()
+    store = RecordStore.from_records(json.loads(p) for p in payload)
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del store
+
+    return {
+        "dict_bytes_per_record": round(dict_bytes / n, 1),
+        "store_bytes_per_record": round(store_bytes / n, 1),
+        "ratio": round(store_bytes / dict_bytes, 3) if dict_bytes else 0.0,
+    }
+
+
+def run_suite(sizes: list[int], seed: int, ole_ratio: float, max_history: int, repeat: int) -> dict:
+    results = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "parser_version": swift_core.PARSER_VERSION,
+            "seed": seed,
+            "ole_ratio": ole_ratio,
+            "max_history": max_history,
+            "repeat": repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "runs": [],
+    }
+    for n in sizes:
+        folder = tempfile.mkdtemp(prefix="swift_suite_")
+        try:
+            paths = generate_corpus(os.path.join(folder, "in"), n, seed, ole_ratio, max_history)
+            out_dir = os.path.join(folder, "out")
+            os.makedirs(out_dir)
+            # 多次运行取每个阶段的最小值（受其他进程干扰最小的一次）
+            best = {}
+            for _ in range(repeat):
+                stages = bench_stages(paths, out_dir)
+                memory = stages.pop("memory")
+                for stage, r in stages.items():
+                    if stage not in best or r.get("seconds", 0) < best[stage].get("seconds", 0):
+                        best[stage] = r
+            results["runs"].append({"messages": n, "stages": best, "memory": memory})
+            print_stage_table(n, best)
+            print(f"{'内存/条':>14} dict {memory['dict_bytes_per_record']:.0f} B -> "
+                  f"RecordStore {memory['store_bytes_per_record']:.0f} B（{memory['ratio']:.0%}）")
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def print_stage_table(n: int, stages: dict):
+    print(f"\n{n} 条报文")
+    print(f"{'stage':>14} {'seconds':>9} {'us/msg':>10} {'msgs/s':>11}")
+    for stage, r in stages.items():
+        if "skipped" in r:
+            print(f"{stage:>14}  跳过：{r['skipped']}")
+            continue
+        print(f"{stage:>14} {r['seconds']:>9.3f} {r['us_per_msg']:>10.1f} {r['msgs_per_sec']:>11.1f}")
+
+
+# -----------------------------
+# DW 回写：金额窗口匹配
+# -----------------------------
+def build_dw_frame(n_rows: int, seed: int = 0):
+    import pandas as pd
+
+    rnd = random.Random(seed)
+    accounts = [str(rnd.randint(10**8, 10**12)) for _ in range(max(1, n_rows // 3))]
+    return pd.DataFrame({
+        "交易对手存款账户编码": [rnd.choice(accounts) for _ in range(n_rows)],
+        "存款发生金额": [round(rnd.uniform(1_000, 5_000_000), 2) for _ in range(n_rows)],
+    })
+
+
+def bench_dw_matching(dw_rows: int, step3_rows: int, linear_sample: int = 200, seed: int = 0) -> dict:
+    import update_cp_swift as upd
+
+    rnd = random.Random(seed + 1)
+    dw_df = build_dw_frame(dw_rows, seed)
+    dw_amounts = dw_df["存款发生金额"].tolist()
+    # 一半落在某个 DW 金额的窗口内，一半随机
+    targets = [
+        rnd.choice(dw_amounts) + rnd.choice([0, 0.5, 30, 99.99]) if i % 2 else round(rnd.uniform(1_000, 5_000_000), 2)
+        for i in range(step3_rows)
+    ]
+
+    t0 = time.perf_counter()
+    account_index, amount_index = upd.build_dw_indexes(dw_df)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hits = [amount_index.find_best(t, upd.AMT_DELTA) for t in targets]
+    indexed_s = time.perf_counter() - t0
+
+    # 账号命中：同账号多行时按金额取最接近、未用过的一行
+    dw_accounts = dw_df["交易对手存款账户编码"].tolist()
+    picks = [dw_accounts[rnd.randrange(dw_rows)] for _ in range(step3_rows)]
+    t0 = time.perf_counter()
+    for acc, t in zip(picks, targets):
+        account_index.take(acc, t)
+    account_s = time.perf_counter() - t0
+
+    # 整批一对一 vs 逐行：账号一半命中、一半只靠金额
+    step_acc = [acc if i % 2 else "" for i, acc in enumerate(picks)]
+    keys = upd.dw_match_keys(dw_df)
+    t0 = time.perf_counter()
+    batch_hits, batch_kinds = upd.match_step3_batch(step_acc, targets, [True] * step3_rows, keys,
+                                                    amount_index, upd.AMT_DELTA)
+    batch_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    seq_hits, seq_kinds = upd.match_step3_rowwise(step_acc, targets, [True] * step3_rows, keys,
+                                                  amount_index, upd.AMT_DELTA)
+    sequential_s = time.perf_counter() - t0
+    batch_rows = [int(h) for h, k in zip(batch_hits, batch_kinds) if k]
+    seq_rows = [int(h) for h, k in zip(seq_hits, seq_kinds) if k]
+
+    amount_list = [(a, i) for i, a in enumerate(dw_amounts)]
+    sample = targets[:linear_sample]
+    t0 = time.perf_counter()
+    linear_hits = [upd.find_best_by_amount(amount_list, t, upd.AMT_DELTA) for t in sample]
+    linear_s = (time.perf_counter() - t0) / max(1, len(sample)) * step3_rows
+
+    return {
+        "dw_rows": dw_rows,
+        "step3_rows": step3_rows,
+        "index_build_s": round(build_s, 3),
+        "indexed_match_s": round(indexed_s, 4),
+        "account_take_s": round(account_s, 4),
+        "batch_match_s": round(batch_s, 4),
+        "sequential_match_s": round(sequential_s, 4),
+        "batch_reused_rows": len(batch_rows) - len(set(batch_rows)),
+        "sequential_reused_rows": len(seq_rows) - len(set(seq_rows)),
+        "linear_match_s_est": round(linear_s, 2),
+        "speedup": round(linear_s / indexed_s, 1) if indexed_s > 0 else 0.0,
+        "identical_on_sample": linear_hits == hits[:len(sample)],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SWIFT 解析性能基准")
+    ap.add_argument("--files", type=int, default=5000, help="生成的报文数量")
+    ap.add_argument("--workers", default="1,2,4,8", help="逗号分隔的进程数列表")
+    ap.add_argument("--ole", action="store_true", help="改为对比 .msg 读取器（内置 vs extract_msg）")
+    ap.add_argument("--attachment-kb", type=int, default=0, help="--ole 时每封邮件附带的附件大小(KB)")
+    ap.add_argument("--suite", action="store_true", help="改为在合成语料上分阶段计时")
+    ap.add_argument("--sizes", default="100,1000,10000", help="--suite 的语料规模，逗号分隔")
+    ap.add_argument("--seed", type=int, default=0, help="--suite 语料随机种子")
+    ap.add_argument("--ole-ratio", type=float, default=0.2, help="--suite 中 OLE .msg 的比例")
+    ap.add_argument("--max-history", type=int, default=40, help="--suite 中 MESSAGE HISTORY 最多条数")
+    ap.add_argument("--repeat", type=int, default=1, help="--suite 每个规模重复次数（取最小值）")
+    ap.add_argument("--json", default="", help="--suite 结果写入的 JSON 文件")
+    ap.add_argument("--dw", action="store_true", help="改为测 DW 回写的金额模糊匹配（线性扫描 vs 排序索引）")
+    ap.add_argument("--dw-rows", type=int, default=300000, help="--dw 合成 DW 行数")
+    ap.add_argument("--step3-rows", type=int, default=5000, help="--dw 合成 Step3 行数")
+    args = ap.parse_args()
+
+    if args.dw:
+        r = bench_dw_matching(args.dw_rows, args.step3_rows)
+        for k, v in r.items():
+            print(f"{k:>20}: {v}")
+        return
+
+    if args.suite:
+        sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+        results = run_suite(sizes, args.seed, args.ole_ratio, args.max_history, max(1, args.repeat))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"\n结果已写入：{args.json}")
+        return
+
+    worker_counts = [int(x) for x in args.workers.split(",") if x.strip()]
+
+    folder = tempfile.mkdtemp(prefix="swift_bench_")
+    try:
+        if args.ole:
+            paths = build_ole_corpus(folder, args.files, args.attachment_kb * 1024)
+            print(f"语料：{len(paths)} 个 .msg，附件 {args.attachment_kb} KB（{folder}）")
+            print_ole_table(bench_ole_reader(paths))
+            return
+        paths = build_corpus(folder, args.files)
+        print(f"语料：{len(paths)} 个文件（{folder}）")
+        print_table(bench_workers(paths, worker_counts))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,37 @@
 
 # swift_app.py
+import time
+_T_START = time.perf_counter()
+
+import multiprocessing
 import os
 import sys
 import traceback
 
-from PySide6.QtCore import Qt, QThread, Signal, QRect
-from PySide6.QtGui import QIcon, QPixmap, QFont, QPainter, QPainterPath
+from PySide6.QtCore import Qt, QThread, Signal, QRect, QAbstractTableModel, QModelIndex
+from PySide6.QtGui import QIcon, QPixmap, QFont, QPainter, QPainterPath, QColor
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QPushButton, QLineEdit,
     QFileDialog, QProgressBar, QMessageBox, QHBoxLayout, QVBoxLayout,
-    QGroupBox, QFormLayout
+    QGroupBox, QFormLayout, QTableView, QHeaderView, QComboBox, QCheckBox
 )
+_T_QT = time.perf_counter()
 
+# swift_core 本身很轻：pandas / openpyxl / extract_msg 都在首次使用时才加载
 import swift_core
+from swift_metrics import RunMetrics
+from swift_profile import profiling_enabled, run_profiled
+from swift_records import RECORD_COLS, RecordStore, RecordView
+_T_CORE = time.perf_counter()
+
+# 启动耗时测量模式：python swfit_app.py --startup-time 或 SWIFT_STARTUP_TIME=1
+STARTUP_TIME_MODE = "--startup-time" in sys.argv or os.environ.get("SWIFT_STARTUP_TIME") == "1"
+
+# 运行时才会用到的重依赖，测量模式下逐个计时
+LAZY_MODULES = ["pandas", "openpyxl", "extract_msg", "pyarrow"]
+
+# 进度/状态刷新间隔（秒）：逐文件的回调在这个间隔内合并成一次 Qt 信号
+PROGRESS_INTERVAL = 0.2
 
 
 # -------------------------
@@ -48,39 +67,203 @@ def rounded_square_pixmap(pix: QPixmap, size: int = 56, radius: int = 12) -> QPi
     return out
 
 
+# -------------------------
+# 剩余时间显示
+# -------------------------
+def format_eta(seconds: float) -> str:
+    seconds = int(seconds + 0.5)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+# =========================
+# 实时结果表（虚拟化：视图只向模型要可见的几十行）
+# =========================
+class ResultsModel(QAbstractTableModel):
+    """
+    解析结果边跑边追加：记录存进列式 RecordStore，筛选/排序由 RecordView 维护行号索引，
+    data() 按行号回 RecordStore 取单个字段，10 万行以上也不卡。
+    """
+
+    ERROR_COLOR = QColor("#FF6B6B")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = RECORD_COLS
+        self.store = RecordStore(self.columns)
+        self.view = RecordView(self.store)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.view)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.store.cell(self.view.rows[index.row()], self.columns[index.column()])
+        if role == Qt.ForegroundRole:
+            if self.store.cell(self.view.rows[index.row()], "ERROR"):
+                return self.ERROR_COLOR
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.columns[section]
+        return str(section + 1)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self.view.set_sort(self.columns[column] if column >= 0 else None,
+                           descending=(order == Qt.DescendingOrder))
+        self.layoutChanged.emit()
+
+    def set_filter(self, **kwargs):
+        self.beginResetModel()
+        self.view.set_filter(**kwargs)
+        self.endResetModel()
+
+    def append_records(self, records: list):
+        if not records:
+            return
+        self.store.extend(records)
+        new = self.view.take_new()
+        if not new:
+            return
+        if self.view.sorted:
+            # 排序中：新行按序并入，整体换一次布局
+            self.layoutAboutToBeChanged.emit()
+            self.view.add(new)
+            self.layoutChanged.emit()
+        else:
+            first = len(self.view)
+            self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+            self.view.add(new)
+            self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.store = RecordStore(self.columns)
+        view = RecordView(self.store)
+        view.sort_col, view.descending = self.view.sort_col, self.view.descending
+        view.set_filter(self.view.direction, self.view.ccy, self.view.missing_prim, self.view.errors_only)
+        self.view = view
+        self.endResetModel()
+
+
 # =========================
 # Worker Thread
 # =========================
 class SwiftWorker(QThread):
-    progress = Signal(int, int, str)     # done, total, filename
+    progress = Signal(int, int, str, float)  # done, total, filename, 文件/秒（不含暂停时间）
+    records = Signal(list)               # 新解析出的一批记录（与 progress 同频合并发送）
     status = Signal(str)
     finished_ok = Signal(str)            # output_path
     failed = Signal(str)
+    cancelled = Signal()
 
-    def __init__(self, input_dir, output_dir, mapping_file, mapping_sheet):
+    def __init__(self, input_dir, output_dir, mapping_file, mapping_sheet, dw_file=None):
         super().__init__()
         self.input_dir = input_dir
         self.output_dir = output_dir
         self.mapping_file = mapping_file
         self.mapping_sheet = mapping_sheet
+        self.dw_file = dw_file                     # 指定时解析完直接在内存里回写 DW
+        self.metrics = RunMetrics("swift_batch")   # 完成后主窗口读取耗时摘要
+        # 回写模式：DW 回写的匹配/未匹配/冲突计数，完成后一并显示
+        self.dw_metrics = RunMetrics("update_cp_swift") if dw_file else None
+        self.control = swift_core.RunControl()     # 主窗口的暂停/取消按钮操作它
+
+    def _flush_records(self):
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self.records.emit(batch)
 
     def run(self):
+        self._pending = []
         try:
+            t_start = time.perf_counter()
+
             def progress_cb(done, total, fn):
-                self.progress.emit(done, total, fn)
+                self._flush_records()
+                elapsed = time.perf_counter() - t_start - self.control.paused_seconds()
+                self.progress.emit(done, total, fn, done / elapsed if elapsed > 0 else 0.0)
 
             def status_cb(msg):
                 self.status.emit(msg)
 
-            out = swift_core.run_swift_batch(
+            kwargs = dict(
                 input_dir=self.input_dir,
                 output_dir=self.output_dir,
                 mapping_file=self.mapping_file,
                 mapping_sheet=self.mapping_sheet,
                 progress_callback=progress_cb,
-                status_callback=status_cb
+                status_callback=status_cb,
+                record_callback=lambda rec: self._pending.append(rec),
+                workers=os.cpu_count() or 1,
+                metrics=self.metrics,
+                control=self.control,
+                progress_interval=PROGRESS_INTERVAL
             )
+
+            run = swift_core.run_swift_batch
+            if self.dw_file:
+                run = swift_core.run_swift_pipeline
+                kwargs.update(dw_file=self.dw_file, dw_metrics=self.dw_metrics)
+
+            # SWIFT_PROFILE=1：单进程运行并在输出文件夹写 pstats + 热点报告
+            if profiling_enabled():
+                kwargs["workers"] = 1
+                out, (_, report_path) = run_profiled(run, self.output_dir, **kwargs)
+                self.status.emit(f"性能剖析报告：{report_path}")
+            else:
+                out = run(**kwargs)
+            if self.dw_file:
+                out = out[1]   # 回写模式完成后打开 DW 新文件
+            self._flush_records()
             self.finished_ok.emit(out)
+        except swift_core.RunCancelled:
+            self._flush_records()
+            self.cancelled.emit()
+        except Exception as e:
+            self._flush_records()
+            err = f"{e}\n\n{traceback.format_exc()}"
+            self.failed.emit(err)
+
+
+class WatchWorker(QThread):
+    """监视模式：一直运行到 control.cancel()；每次当天输出更新后发出 updated"""
+    updated = Signal(str, list, list)    # output_path, 本轮新解析的记录, 当前全部记录
+    status = Signal(str)
+    stopped = Signal(str)                # 最后一次写出的输出路径（没写过为空串）
+    failed = Signal(str)
+
+    def __init__(self, input_dir, output_dir, mapping_file, mapping_sheet):
+        super().__init__()
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.mapping_file = mapping_file
+        self.mapping_sheet = mapping_sheet
+        self.control = swift_core.RunControl()     # 主窗口取消勾选“监视文件夹”时 cancel()
+
+    def run(self):
+        try:
+            out = swift_core.watch_swift_folder(
+                input_dir=self.input_dir,
+                output_dir=self.output_dir,
+                mapping_file=self.mapping_file,
+                mapping_sheet=self.mapping_sheet,
+                status_callback=self.status.emit,
+                update_callback=self.updated.emit,
+                control=self.control,
+                workers=os.cpu_count() or 1
+            )
+            self.stopped.emit(out or "")
         except Exception as e:
             err = f"{e}\n\n{traceback.format_exc()}"
             self.failed.emit(err)
@@ -95,7 +278,7 @@ class MainWindow(QMainWindow):
 
         self.setWindowTitle("SWIFT Data Collection")
         self.setMinimumWidth(860)
-        self.setMinimumHeight(560)
+        self.setMinimumHeight(760)
 
         # ------- icon -------
         icon_path = r"C:\Users\MY43DN\Desktop\app.ico"
@@ -191,13 +374,15 @@ class MainWindow(QMainWindow):
         default_input = r"Z:/To Jimmy Yu/Swift Data Collection/Swift"
         default_output = r"Z:/To Jimmy Yu/Swift Data Collection"
         default_mapping = r"Z:/To Jimmy Yu/Swift Data Collection/Swift Data Collection.xlsx"
+        default_dw = r"Z:/To Jimmy Yu/Swift Data Collection/DWCKFS 202512 revised.xlsx"
 
         self.input_edit = QLineEdit(default_input)
         self.output_edit = QLineEdit(default_output)
         self.map_edit = QLineEdit(default_mapping)
         self.sheet_edit = QLineEdit(swift_core.DEFAULT_MAPPING_SHEET)
+        self.dw_edit = QLineEdit(default_dw)
 
-        for w in (self.input_edit, self.output_edit, self.map_edit, self.sheet_edit):
+        for w in (self.input_edit, self.output_edit, self.map_edit, self.sheet_edit, self.dw_edit):
             w.setStyleSheet("""
                 QLineEdit{
                     background:#0F0F0F;
@@ -212,7 +397,8 @@ class MainWindow(QMainWindow):
         btn_in = QPushButton("选择…")
         btn_out = QPushButton("选择…")
         btn_map = QPushButton("选择…")
-        for b in (btn_in, btn_out, btn_map):
+        btn_dw = QPushButton("选择…")
+        for b in (btn_in, btn_out, btn_map, btn_dw):
             b.setCursor(Qt.PointingHandCursor)
             b.setStyleSheet("""
                 QPushButton{
@@ -237,10 +423,15 @@ class MainWindow(QMainWindow):
         row_map.addWidget(self.map_edit, 1)
         row_map.addWidget(btn_map)
 
+        row_dw = QHBoxLayout()
+        row_dw.addWidget(self.dw_edit, 1)
+        row_dw.addWidget(btn_dw)
+
         form.addRow(QLabel("MSG文件夹："), self._wrap(row_in))
         form.addRow(QLabel("输出文件夹："), self._wrap(row_out))
         form.addRow(QLabel("Mapping 文件："), self._wrap(row_map))
         form.addRow(QLabel("Sheet 名称："), self.sheet_edit)
+        form.addRow(QLabel("DW 文件："), self._wrap(row_dw))
 
         layout.addWidget(group)
 
@@ -267,6 +458,40 @@ class MainWindow(QMainWindow):
             }
         """)
 
+        # 解析 + DW 回写一条龙：Step3_Final 记录在内存里直接交给回写，不再读回 Excel
+        self.run_dw_btn = QPushButton("▶ 运行并回写DW")
+        self.run_dw_btn.setCursor(Qt.PointingHandCursor)
+        self.run_dw_btn.setFixedHeight(44)
+        self.run_dw_btn.setStyleSheet(self.run_btn.styleSheet())
+
+        # 运行中可暂停/继续、取消（在两条记录之间生效，未完成的输出文件不会落盘）
+        self.pause_btn = QPushButton("⏸ 暂停")
+        self.cancel_btn = QPushButton("■ 取消")
+        for b in (self.pause_btn, self.cancel_btn):
+            b.setCursor(Qt.PointingHandCursor)
+            b.setFixedHeight(44)
+            b.setEnabled(False)
+            b.setStyleSheet("""
+                QPushButton{
+                    background:#1E1E1E;
+                    color:#EAEAEA;
+                    border:1px solid #333;
+                    border-radius:10px;
+                    padding:10px 14px;
+                }
+                QPushButton:hover{ border:1px solid #FFB000; }
+                QPushButton:disabled{ color:#555; border:1px solid #2A2A2A; }
+            """)
+
+        # 监视模式：新报文写完后几秒内更新当天输出；再点一次停止
+        self.watch_btn = QPushButton("👁 监视文件夹")
+        self.watch_btn.setCheckable(True)
+        self.watch_btn.setCursor(Qt.PointingHandCursor)
+        self.watch_btn.setFixedHeight(44)
+        self.watch_btn.setStyleSheet(self.pause_btn.styleSheet() + """
+            QPushButton:checked{ color:#111; background:#2DD4BF; border:1px solid #2DD4BF; }
+        """)
+
         self.progress = QProgressBar()
         self.progress.setFixedHeight(18)
         self.progress.setRange(0, 100)
@@ -287,6 +512,10 @@ class MainWindow(QMainWindow):
         """)
 
         action_row.addWidget(self.run_btn, 0)
+        action_row.addWidget(self.run_dw_btn, 0)
+        action_row.addWidget(self.pause_btn, 0)
+        action_row.addWidget(self.cancel_btn, 0)
+        action_row.addWidget(self.watch_btn, 0)
         action_row.addWidget(self.progress, 1)
         layout.addLayout(action_row)
 
@@ -294,6 +523,76 @@ class MainWindow(QMainWindow):
         self.status_label.setStyleSheet("color:#B8B8B8; font-size:12px;")
         layout.addWidget(self.status_label)
 
+        # ------- live results -------
+        # 运行中边解析边显示；按 DIRECTION / CCY / 缺 PRIM ID / ERROR 筛选，点表头排序
+        filter_row = QHBoxLayout()
+        filter_row.setSpacing(10)
+        self.dir_combo = QComboBox()
+        self.dir_combo.addItem("方向：全部", None)
+        for d in ("IN", "OUT"):
+            self.dir_combo.addItem(d, d)
+        self.dir_combo.addItem("方向为空", "")
+        self.ccy_combo = QComboBox()
+        self.ccy_combo.addItem("币种：全部", None)
+        self.missing_prim_check = QCheckBox("缺 PRIM ID")
+        self.errors_check = QCheckBox("仅 ERROR")
+        self.result_count = QLabel("0 条")
+        self.result_count.setStyleSheet("color:#B8B8B8; font-size:12px;")
+        for w in (self.dir_combo, self.ccy_combo):
+            w.setStyleSheet("""
+                QComboBox{
+                    background:#0F0F0F;
+                    color:#EAEAEA;
+                    border:1px solid #2E2E2E;
+                    border-radius:8px;
+                    padding:4px 10px;
+                    min-width:110px;
+                }
+                QComboBox QAbstractItemView{ background:#0F0F0F; color:#EAEAEA; }
+            """)
+        for w in (self.missing_prim_check, self.errors_check):
+            w.setStyleSheet("color:#EAEAEA;")
+        filter_row.addWidget(self.dir_combo)
+        filter_row.addWidget(self.ccy_combo)
+        filter_row.addWidget(self.missing_prim_check)
+        filter_row.addWidget(self.errors_check)
+        filter_row.addStretch(1)
+        filter_row.addWidget(self.result_count)
+        layout.addLayout(filter_row)
+
+        self.results = ResultsModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.results)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)   # 默认按到达顺序
+        self.table.setSortingEnabled(True)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setAlternatingRowColors(True)
+        # 固定行高、不按内容算列宽：视图只为可见行取数据
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(22)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.horizontalHeader().setDefaultSectionSize(120)
+        self.table.setStyleSheet("""
+            QTableView{
+                background:#0F0F0F;
+                alternate-background-color:#151515;
+                color:#EAEAEA;
+                gridline-color:#242424;
+                border:1px solid #2E2E2E;
+                border-radius:8px;
+                font-size:12px;
+            }
+            QHeaderView::section{
+                background:#1A1A1A;
+                color:#B8B8B8;
+                border:none;
+                border-right:1px solid #2A2A2A;
+                padding:4px 6px;
+            }
+            QTableView::item:selected{ background:#3A2A00; color:#FFFFFF; }
+        """)
+        layout.addWidget(self.table, 1)
+
         # ------- footer -------
         footer = QLabel("Designed by 余智秋 in Shanghai")
         footer.setAlignment(Qt.AlignCenter)
@@ -301,14 +600,22 @@ class MainWindow(QMainWindow):
         footer_font.setPointSize(9)
         footer.setFont(footer_font)
         footer.setStyleSheet("color:#D4AF37;")  # 金色
-        layout.addStretch(1)
         layout.addWidget(footer)
 
         # ------- connections -------
         btn_in.clicked.connect(self.pick_input)
         btn_out.clicked.connect(self.pick_output)
         btn_map.clicked.connect(self.pick_mapping)
+        btn_dw.clicked.connect(self.pick_dw)
         self.run_btn.clicked.connect(self.run_job)
+        self.run_dw_btn.clicked.connect(self.run_dw_job)
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        self.cancel_btn.clicked.connect(self.cancel_job)
+        self.watch_btn.toggled.connect(self.toggle_watch)
+        self.dir_combo.currentIndexChanged.connect(self.apply_filter)
+        self.ccy_combo.currentIndexChanged.connect(self.apply_filter)
+        self.missing_prim_check.toggled.connect(self.apply_filter)
+        self.errors_check.toggled.connect(self.apply_filter)
 
         # ------- dark theme for window background -------
         self.setStyleSheet("""
@@ -317,6 +624,7 @@ class MainWindow(QMainWindow):
         """)
 
         self.worker = None
+        self.watcher = None
 
     def _wrap(self, layout: QHBoxLayout) -> QWidget:
         w = QWidget()
@@ -346,7 +654,20 @@ class MainWindow(QMainWindow):
         if f:
             self.map_edit.setText(f)
 
-    def run_job(self):
+    def pick_dw(self):
+        f, _ = QFileDialog.getOpenFileName(self, "选择 DW Excel", self.dw_edit.text().strip() or os.getcwd(), "Excel (*.xlsx)")
+        if f:
+            self.dw_edit.setText(f)
+
+    def run_dw_job(self):
+        dw_file = self.dw_edit.text().strip()
+        if not dw_file or not os.path.exists(dw_file):
+            self._msgbox(QMessageBox.Warning, "路径错误", "DW 文件不存在，请重新选择。")
+            return
+        self.run_job(dw_file=dw_file)
+
+    def _job_paths(self):
+        """(input_dir, output_dir, mapping_file, sheet)；路径有误时提示并返回 None"""
         input_dir = self.input_edit.text().strip()
         output_dir = self.output_edit.text().strip()
         mapping_file = self.map_edit.text().strip()
@@ -354,44 +675,183 @@ class MainWindow(QMainWindow):
 
         if not input_dir or not os.path.exists(input_dir):
             self._msgbox(QMessageBox.Warning, "路径错误", "MSG 文件夹不存在，请重新选择。")
-            return
+            return None
         if not output_dir:
             self._msgbox(QMessageBox.Warning, "路径错误", "输出文件夹不能为空。")
-            return
+            return None
         if not mapping_file or not os.path.exists(mapping_file):
             self._msgbox(QMessageBox.Warning, "路径错误", "Mapping 文件不存在，请重新选择。")
+            return None
+        return input_dir, output_dir, mapping_file, sheet
+
+    def run_job(self, checked=False, dw_file=None):
+        paths = self._job_paths()
+        if paths is None:
             return
+        input_dir, output_dir, mapping_file, sheet = paths
 
         self.progress.setValue(0)
         self.progress.setFormat("0%")
         self.status_label.setText("启动任务中...")
-        self.run_btn.setEnabled(False)
+        self._set_running(True)
 
-        self.worker = SwiftWorker(input_dir, output_dir, mapping_file, sheet)
+        self.worker = SwiftWorker(input_dir, output_dir, mapping_file, sheet, dw_file)
+        self.results.clear()
+        self._update_result_count()
         self.worker.progress.connect(self.on_progress)
+        self.worker.records.connect(self.on_records)
         self.worker.status.connect(self.on_status)
         self.worker.finished_ok.connect(self.on_done)
         self.worker.failed.connect(self.on_failed)
+        self.worker.cancelled.connect(self.on_cancelled)
         self.worker.start()
 
-    def on_progress(self, done, total, filename):
+    def _set_running(self, running: bool):
+        self.run_btn.setEnabled(not running)
+        self.run_dw_btn.setEnabled(not running)
+        self.watch_btn.setEnabled(not running)
+        self.pause_btn.setEnabled(running)
+        self.cancel_btn.setEnabled(running)
+        self.pause_btn.setText("⏸ 暂停")
+
+    def toggle_watch(self, checked: bool):
+        if not checked:
+            if self.watcher is not None:
+                self.watcher.control.cancel()
+                self.watch_btn.setEnabled(False)   # 停下后（stopped）再恢复
+                self.status_label.setText("正在停止监视...")
+            return
+
+        paths = self._job_paths()
+        if paths is None:
+            self.watch_btn.setChecked(False)
+            return
+
+        self.run_btn.setEnabled(False)
+        self.run_dw_btn.setEnabled(False)
+        self.progress.setValue(0)
+        self.progress.setFormat("监视中")
+        self.status_label.setText("启动监视中...")
+
+        self.watcher = WatchWorker(*paths)
+        self.results.clear()
+        self._update_result_count()
+        self.watcher.updated.connect(self.on_watch_updated)
+        self.watcher.status.connect(self.status_label.setText)
+        self.watcher.stopped.connect(self.on_watch_stopped)
+        self.watcher.failed.connect(self.on_watch_failed)
+        self.watcher.start()
+
+    def on_watch_updated(self, output_path, new_records, all_records):
+        # 只有新增文件时追加；有文件变更/删除或 mapping 更新时整表换成当前全部记录
+        if new_records and len(self.results.store) + len(new_records) == len(all_records):
+            self.on_records(new_records)
+        else:
+            self.results.clear()
+            self.on_records(all_records)
+        self.progress.setFormat(f"监视中  共 {len(all_records)} 条")
+
+    def _watch_ended(self):
+        self.watcher = None
+        self.watch_btn.blockSignals(True)
+        self.watch_btn.setChecked(False)
+        self.watch_btn.blockSignals(False)
+        self._set_running(False)
+        self.progress.setFormat(f"{self.progress.value()}%")
+
+    def on_watch_stopped(self, output_path):
+        self._watch_ended()
+        self.status_label.setText(f"监视已停止。输出：{output_path}" if output_path else "监视已停止。")
+
+    def on_watch_failed(self, err):
+        self._watch_ended()
+        self.status_label.setText("监视失败，请查看错误。")
+        self._msgbox(QMessageBox.Critical, "监视失败", err)
+
+    def closeEvent(self, event):
+        # 监视线程不会自己结束：关窗前先停下，等当前一轮写完
+        if self.watcher is not None:
+            self.watcher.control.cancel()
+            self.watcher.wait()
+        super().closeEvent(event)
+
+    def toggle_pause(self):
+        control = self.worker.control
+        if control.paused:
+            control.resume()
+            self.pause_btn.setText("⏸ 暂停")
+            self.status_label.setText("继续运行...")
+        else:
+            control.pause()
+            self.pause_btn.setText("▶ 继续")
+            self.status_label.setText("已暂停（当前文件处理完后停下）")
+
+    def cancel_job(self):
+        self.worker.control.cancel()
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
+        self.status_label.setText("正在取消...")
+
+    def apply_filter(self, *_):
+        self.results.set_filter(
+            direction=self.dir_combo.currentData(),
+            ccy=self.ccy_combo.currentData(),
+            missing_prim=self.missing_prim_check.isChecked(),
+            errors_only=self.errors_check.isChecked(),
+        )
+        self._update_result_count()
+
+    def on_records(self, records):
+        self.results.append_records(records)
+        # 新出现的币种加进筛选下拉框
+        known = {self.ccy_combo.itemData(i) for i in range(1, self.ccy_combo.count())}
+        for ccy in self.results.store.categories("CCY"):
+            ccy = ccy.strip()
+            if ccy and ccy not in known:
+                known.add(ccy)
+                self.ccy_combo.addItem(ccy, ccy)
+        self._update_result_count()
+
+    def _update_result_count(self):
+        shown, total = len(self.results.view), len(self.results.store)
+        self.result_count.setText(f"{total} 条" if shown == total else f"显示 {shown} / 共 {total} 条")
+
+    def on_progress(self, done, total, filename, rate):
         if total <= 0:
             self.progress.setValue(0)
             self.progress.setFormat("0%")
             return
         pct = int(done * 100 / total)
         self.progress.setValue(pct)
-        self.progress.setFormat(f"{pct}%  ({done}/{total})")
+        text = f"{pct}%  ({done}/{total})"
+        if rate > 0 and done < total:
+            text += f"  {rate:.0f} 个/秒  剩余 {format_eta((total - done) / rate)}"
+        self.progress.setFormat(text)
 
     def on_status(self, msg):
+        if self.worker is not None and self.worker.control.paused:
+            return   # 暂停前已发出的状态不覆盖“已暂停”提示
         self.status_label.setText(msg)
 
     def on_done(self, output_path):
-        self.run_btn.setEnabled(True)
+        self._set_running(False)
         self.progress.setValue(100)
         self.progress.setFormat("100%  完成")
 
-        self._msgbox(QMessageBox.Information, "完成", f"已完成处理。\n输出文件：\n{output_path}\n\n将自动打开 Excel。")
+        # 分阶段耗时摘要（详细指标见输出文件旁的 *_metrics.json）
+        summary = self.worker.metrics.summary().replace(" | ", "\n")
+        dw_summary = ""
+        if self.worker.dw_metrics is not None:
+            c = self.worker.dw_metrics.counters
+            dw_summary = (
+                f"\n\nDW 回写：\n账号匹配 {c.get('matched_ac', 0)}，金额匹配 {c.get('matched_amt', 0)}，"
+                f"写入单元格 {c.get('written', 0)}\n"
+                f"未匹配 {c.get('unmatched', 0)}（见 Unmatched_Step3），冲突 {c.get('conflicts', 0)}"
+            )
+        self._msgbox(
+            QMessageBox.Information, "完成",
+            f"已完成处理。\n输出文件：\n{output_path}\n\n耗时：\n{summary}{dw_summary}\n\n将自动打开 Excel。"
+        )
 
         # 自动打开 Excel（Windows）
         try:
@@ -400,16 +860,71 @@ class MainWindow(QMainWindow):
         except Exception as e:
             self._msgbox(QMessageBox.Warning, "打开失败", f"无法自动打开文件：{e}")
 
+    def on_cancelled(self):
+        self._set_running(False)
+        self.progress.setFormat(f"{self.progress.value()}%  已取消")
+        self.status_label.setText("已取消。已解析的文件留在缓存里，下次运行直接复用。")
+
     def on_failed(self, err):
-        self.run_btn.setEnabled(True)
+        self._set_running(False)
         self.status_label.setText("运行失败，请查看错误。")
         self._msgbox(QMessageBox.Critical, "运行失败", err)
 
 
+# -------------------------
+# 启动耗时报告
+# -------------------------
+def startup_time_report(t_window_shown: float) -> str:
+    import importlib
+
+    def ms(a, b):
+        return f"{(b - a) * 1000:8.1f} ms"
+
+    lines = [
+        "启动耗时（进程内计时，不含解释器/打包解压时间）",
+        f"  PySide6 导入        {ms(_T_START, _T_QT)}",
+        f"  swift_core 导入     {ms(_T_QT, _T_CORE)}",
+        f"  主窗口显示          {ms(_T_CORE, t_window_shown)}",
+        f"  合计（到窗口可见）  {ms(_T_START, t_window_shown)}",
+        "",
+        "按需加载模块（首次使用时的导入成本；按顺序计，已被前面模块带入的接近 0）",
+    ]
+    for name in LAZY_MODULES:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            cost = ms(t0, time.perf_counter())
+        except ImportError:
+            cost = "  未安装"
+        lines.append(f"  {name:<18}  {cost}")
+    return "\n".join(lines)
+
+
+def write_startup_report(report: str) -> str:
+    # 打包的 exe 没有控制台：报告写到 exe（或脚本）旁边
+    if getattr(sys, "frozen", False):
+        base = os.path.dirname(sys.executable)
+    else:
+        base = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(base, "startup_time.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+    return path
+
+
 def main():
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     w = MainWindow()
     w.show()
+
+    if STARTUP_TIME_MODE:
+        app.processEvents()
+        report = startup_time_report(time.perf_counter())
+        print(report)
+        print("报告已写入：", write_startup_report(report))
+        sys.exit(0)
+
     sys.exit(app.exec())
 
 
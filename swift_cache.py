@@ -0,0 +1,213 @@
+
+# swift_cache.py
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+
+
+# =========================
+# 解析缓存（SQLite，默认放在输出文件夹）
+# =========================
+CACHE_FILENAME = ".swift_parse_cache.sqlite"
+
+# 每写入多少条提交一次：中途崩溃后，已解析部分下次直接命中缓存
+COMMIT_EVERY = 200
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def bytes_digest(data: bytes) -> str:
+    """同 file_digest，输入为已经读进内存的整个文件（解析方读一次，哈希和解析共用）"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ParseCache:
+    """
+    .msg 解析结果缓存：path -> (size, mtime, 内容哈希, parser_version, record)
+
+    命中规则：
+    - parser_version 不一致 -> 失效（解析规则改了）
+    - size + mtime 一致 -> 直接命中（不读文件）
+    - size 一致但 mtime 变了 -> 比较内容哈希，一致仍命中（例如文件被重新拷贝）
+    """
+
+    def __init__(self, db_path: str, parser_version):
+        self.db_path = db_path
+        self.parser_version = str(parser_version)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS parsed (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                parser_version TEXT NOT NULL,
+                record TEXT NOT NULL
+            )
+            """
+        )
+        # 版本变更：整表清空，避免旧规则的结果残留
+        self.conn.execute("DELETE FROM parsed WHERE parser_version <> ?", (self.parser_version,))
+        self.conn.commit()
+        self._pending = 0
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def get(self, path: str):
+        """命中返回 record(dict)，否则 None。"""
+        key = self._key(path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, digest, record FROM parsed WHERE path = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        size, mtime_ns, digest, record = row
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size != size:
+            return None
+        if st.st_mtime_ns != mtime_ns:
+            if file_digest(path) != digest:
+                return None
+            self.conn.execute("UPDATE parsed SET mtime_ns = ? WHERE path = ?", (st.st_mtime_ns, key))
+            self._tick()
+        return json.loads(record)
+
+    def put(self, path: str, record: dict, size: int, mtime_ns: int, digest: str):
+        """
+        size / mtime_ns / digest 由解析方在读取时取得（见 swift_core._parse_chunk），这里不再访问文件：
+        解析后文件又被改动时，缓存键仍对应被解析的那一版，下次运行按变更重新解析。
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO parsed (path, size, mtime_ns, digest, parser_version, record) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                self._key(path), size, mtime_ns, digest,
+                self.parser_version, json.dumps(record, ensure_ascii=False),
+            ),
+        )
+        self._tick()
+
+    def _tick(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+    def commit(self):
+        """立即提交（监视模式每轮结束调用，不必等攒够 COMMIT_EVERY 条）"""
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# =========================
+# ACCT Mapping 编译结果缓存（本机用户目录）
+# =========================
+MAPPING_CACHE_VERSION = 1
+
+
+def local_cache_dir() -> str:
+    """Windows: %LOCALAPPDATA%\\SWIFT Data Collection；其他系统：~/.cache/swift_data_collection"""
+    base = os.environ.get("LOCALAPPDATA")
+    if base:
+        return os.path.join(base, "SWIFT Data Collection")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "swift_data_collection")
+
+
+def mapping_cache_key(mapping_file: str, mapping_sheet: str) -> tuple:
+    st = os.stat(mapping_file)
+    path = os.path.normcase(os.path.abspath(mapping_file))
+    return (MAPPING_CACHE_VERSION, path, mapping_sheet, st.st_mtime_ns, st.st_size)
+
+
+def _local_cache_path(prefix: str, key: tuple) -> str:
+    # 文件名只取路径+sheet：同一个源文件更新后覆盖旧缓存，不会越积越多
+    name = hashlib.blake2b(f"{key[1]}|{key[2]}".encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(local_cache_dir(), f"{prefix}_{name}.pkl")
+
+
+def _load_local_cache(path: str, key: tuple):
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(payload, dict) or payload.get("key") != key:
+        return None
+    return payload
+
+
+def _save_local_cache(path: str, payload: dict):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # 缓存写不了不影响主流程
+
+
+def _mapping_cache_path(key: tuple) -> str:
+    return _local_cache_path("acct_mapping", key)
+
+
+def load_mapping_cache(key: tuple):
+    """命中返回 (map_by_acct_ccy, map_by_acct_only)，否则 None。"""
+    payload = _load_local_cache(_mapping_cache_path(key), key)
+    return None if payload is None else payload["mapping"]
+
+
+def save_mapping_cache(key: tuple, mapping: tuple):
+    _save_local_cache(_mapping_cache_path(key), {"key": key, "mapping": mapping})
+
+
+# =========================
+# DW 匹配索引缓存（本机用户目录）
+# =========================
+# 缓存的是匹配键（规范化账号、金额）和金额排序结果，都是紧凑的二进制块（bytes），
+# 与 ACCT Mapping 缓存一样按 (路径, sheet, mtime, size) 失效；另带上匹配列配置，改了列也会重建。
+DW_INDEX_CACHE_VERSION = 1
+
+
+def dw_index_cache_key(dw_file: str, dw_sheet: str, columns: tuple = ()) -> tuple:
+    st = os.stat(dw_file)
+    path = os.path.normcase(os.path.abspath(dw_file))
+    return (DW_INDEX_CACHE_VERSION, path, dw_sheet, st.st_mtime_ns, st.st_size, tuple(columns))
+
+
+def load_dw_index_cache(key: tuple):
+    """命中返回保存时的 index 字典，否则 None。"""
+    payload = _load_local_cache(_local_cache_path("dw_index", key), key)
+    return None if payload is None else payload["index"]
+
+
+def save_dw_index_cache(key: tuple, index: dict):
+    _save_local_cache(_local_cache_path("dw_index", key), {"key": key, "index": index})
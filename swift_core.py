@@ -1,9 +1,25 @@
 
 # swift_core.py
+import codecs
+import functools
+import io
+import itertools
 import os
 import re
+import threading
+import time
+from contextlib import ExitStack
 from datetime import datetime
-import pandas as pd
+
+from swift_cache import (
+    CACHE_FILENAME, ParseCache, bytes_digest,
+    load_mapping_cache, mapping_cache_key, save_mapping_cache,
+)
+from swift_export import append_table_rows, normalize_formats, open_table_writer
+from swift_metrics import RunMetrics, metrics_path_for
+from swift_ole import OLE_MAGIC, read_msg_body_subject
+from swift_records import STEP3_KEY_COLS, is_step3_valid
+from swift_xlsx import StreamingXlsxWriter
 
 # =========================
 # 默认配置（按你的实际路径）
@@ -14,33 +30,167 @@ DEFAULT_OUTPUT_FOLDER = r"Z:\To Jimmy Yu\Swift Data Collection"
 DEFAULT_MAPPING_FILE = r"Z:\To Jimmy Yu\Swift Data Collection\Swift Data Collection.xlsx"
 DEFAULT_MAPPING_SHEET = "ACCT Mapping"
 
+# 解析规则版本：修改 extract_step3_record 等解析逻辑后 +1（使解析缓存失效）
+PARSER_VERSION = 3
+
+# 并行解析：文件数少于该值时直接串行（进程启动开销不划算）
+PARALLEL_MIN_FILES = 200
+
+DEFAULT_SKIP_KEYWORDS = ["FFD", "MT199"]
+
+STEP3_COLS = [
+    "Client Acct","PRIM ID","DATE","CCY","AMT",
+    "CP NAME","CP A/C","CP SWIFT","CP BANK NAME","DIRECTION"
+]
+
+# CSV / Parquet 的 Debug 列：固定含 ERROR、不重复 DIRECTION，保证每次 schema 一致
+DEBUG_EXPORT_COLS = ["FILE"] + STEP3_COLS + ["ERROR"]
+
+# Excel 的 Debug 表：DIRECTION 放在前面，没有错误时去掉 ERROR 列
+DEBUG_XLSX_COLS = ["FILE", "DIRECTION"] + STEP3_COLS + ["ERROR"]
+
 
 # -----------------------------
-# Read .msg as text (2 modes)
+# 重依赖按需加载（pandas / extract_msg 不在模块导入时加载，GUI 启动更快）
 # -----------------------------
-def read_msg_text(path: str) -> str:
-    # Try extract_msg (for Outlook .msg)
+_NOT_LOADED = object()
+_extract_msg = _NOT_LOADED
+
+
+def _load_extract_msg():
+    """首次调用时 import extract_msg；未安装返回 None（只尝试一次）。"""
+    global _extract_msg
+    if _extract_msg is _NOT_LOADED:
+        try:
+            import extract_msg  # pip install extract-msg
+        except ImportError:
+            extract_msg = None
+        _extract_msg = extract_msg
+    return _extract_msg
+
+
+# -----------------------------
+# Read .msg as text（按文件头判断格式，只解码一次）
+# -----------------------------
+def sniff_msg_format(head: bytes) -> str:
+    """
+    根据文件头判断格式：
+      'ole'                       -> Outlook .msg
+      'utf-8-sig' / 'utf-16'      -> 带 BOM 的文本导出
+      'utf-16-le' / 'utf-16-be'   -> 无 BOM 但明显是 UTF-16（大量 \x00 交错）
+      'text'                      -> 其他（ASCII / UTF-8）
+    """
+    if head.startswith(OLE_MAGIC):
+        return "ole"
+    if head.startswith(b"\xEF\xBB\xBF"):
+        return "utf-8-sig"
+    if head.startswith((b"\xFF\xFE", b"\xFE\xFF")):
+        return "utf-16"
+    sample = head[:512]
+    if len(sample) >= 4:
+        half = len(sample) // 2
+        if sample[1::2].count(0) > half * 0.8:
+            return "utf-16-le"
+        if sample[0::2].count(0) > half * 0.8:
+            return "utf-16-be"
+    return "text"
+
+
+def decode_msg_bytes(data: bytes, fmt: str) -> str:
+    if fmt == "text":
+        if data.isascii():
+            return data.decode("ascii")
+        return data.decode("utf-8", errors="ignore")
+    if fmt == "ole":
+        return data.decode("latin1", errors="ignore")
+    return data.decode(fmt, errors="ignore")
+
+
+def _read_outlook_msg(path: str) -> str:
+    extract_msg = _load_extract_msg()
+    if extract_msg is None:
+        return ""
     try:
-        import extract_msg  # pip install extract-msg
         msg = extract_msg.Message(path)
-        text = (msg.body or "") + "\n" + (msg.subject or "")
-        msg.close()
-        if text.strip():
-            return text
+        try:
+            return (msg.body or "") + "\n" + (msg.subject or "")
+        finally:
+            msg.close()
     except Exception:
-        pass
+        return ""
 
-    # Fallback: raw decode (for text-export .msg)
-    with open(path, "rb") as f:
-        data = f.read()
-    for enc in ("utf-8", "utf-16", "latin1"):
-        try:
-            t = data.decode(enc, errors="ignore")
-            if t.strip():
-                return t
-        except Exception:
-            continue
-    return data.decode("latin1", errors="ignore")
+
+# -----------------------------
+# 报文尾部（MESSAGE HISTORY / MESSAGE AUDIT）截断
+# -----------------------------
+# 尾部只有系统流水，往往比正文还长；字段解析和方向判断都只需要前面的头部 + 正文。
+_TRAILER_RE = re.compile(r"^[ \t]*--+[ \t]*MESSAGE[ \t]+(?:HISTORY|AUDIT)", re.MULTILINE)
+
+# 文本导出逐块读取，遇到尾部标记即停止（不再读取/解码后面的内容）
+READ_CHUNK_BYTES = 16 * 1024
+
+
+def find_trailer(text: str, pos: int = 0) -> int:
+    """返回尾部标记所在行的起始位置；没有尾部返回 -1。"""
+    m = _TRAILER_RE.search(text, pos)
+    return m.start() if m else -1
+
+
+def payload_text(text: str) -> str:
+    """去掉 MESSAGE HISTORY / AUDIT 及之后的内容。"""
+    cut = find_trailer(text)
+    return text if cut < 0 else text[:cut]
+
+
+def _read_text_payload(f, head: bytes, fmt: str) -> str:
+    """
+    文本导出：增量解码，每读一块只在新内容里找尾部标记，找到即截断返回。
+    与整文件解码结果一致（ASCII 是 UTF-8 的子集）。
+    """
+    codec = "utf-8" if fmt == "text" else fmt
+    decoder = codecs.getincrementaldecoder(codec)(errors="ignore")
+    text = ""
+    data = head
+    while True:
+        final = not data
+        chunk = decoder.decode(data, final=final)
+        if chunk:
+            # 上一块最后一行可能不完整，从它的行首开始找
+            pos = text.rfind("\n") + 1
+            text += chunk
+            cut = find_trailer(text, pos)
+            if cut >= 0:
+                return text[:cut]
+        if final:
+            return text
+        data = f.read(READ_CHUNK_BYTES)
+
+
+def read_msg_text(path: str, data: bytes = None) -> str:
+    """
+    读取报文正文（已去掉 MESSAGE HISTORY / AUDIT 尾部）；Outlook .msg 末尾附主题。
+    data 为已读进内存的整个文件时从内存解析，不再读盘（extract_msg 兜底除外）。
+    """
+    with open(path, "rb") if data is None else io.BytesIO(data) as f:
+        head = f.read(512)
+        fmt = sniff_msg_format(head)
+        if fmt != "ole":
+            return _read_text_payload(f, head, fmt)
+
+    # Outlook .msg：先用内置读取器只取正文/主题流，取不到再交给 extract_msg，
+    # 都失败时退回原始字节解码
+    parts = read_msg_body_subject(path, data)
+    if parts is not None:
+        text = parts[0] + "\n" + parts[1]
+        if text.strip():
+            return payload_text(parts[0]) + "\n" + parts[1]
+    text = _read_outlook_msg(path)
+    if text.strip():
+        return payload_text(text)
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    return payload_text(decode_msg_bytes(data, "ole"))
 
 
 # -----------------------------
@@ -161,12 +311,102 @@ def extract_block_lines(text: str, tag: str) -> list[str]:
     return out
 
 
+# -----------------------------
+# 单次扫描的 tag 段切分（extract_step3_record 使用）
+# -----------------------------
+_TAG_LINE_RE = re.compile(r"^\s*(\d{2}[A-Z]?)\s*:")
+_STAR_RE = re.compile(r"^\*\s*")
+_UNSET = object()
+
+
+class SwiftBlock(list):
+    """
+    一个 tag 段的数据行（不含 ':' 后的标题），附带派生视图缓存：
+    cleaned / account_index / swift 只计算一次，供多个 picker 共用。
+    """
+    __slots__ = ("tag", "_cleaned", "_acct_idx", "_swift")
+
+    def __init__(self, tag: str, lines=()):
+        super().__init__(lines)
+        self.tag = tag
+        self._cleaned = None
+        self._acct_idx = _UNSET
+        self._swift = None
+
+    @property
+    def cleaned(self) -> list[str]:
+        if self._cleaned is None:
+            self._cleaned = _clean(self)
+        return self._cleaned
+
+    @property
+    def account_index(self):
+        """cleaned 中第一条账号行的下标；没有则 None。"""
+        if self._acct_idx is _UNSET:
+            self._acct_idx = _first_account_index(self.cleaned)
+        return self._acct_idx
+
+    @property
+    def swift(self) -> str:
+        if self._swift is None:
+            self._swift = _pick_swift(self.cleaned)
+        return self._swift
+
+
+def tokenize_blocks(text: str) -> dict[str, SwiftBlock]:
+    """
+    单次扫描报文，返回 {tag: SwiftBlock}。
+    与 extract_block_lines 语义一致：
+    - 每个 tag 只取第一次出现的段（紧邻重复的同 tag 段会合并，如连续两个 71F）
+    - 段在下一个 tag 行或 '-----' 分隔线处结束
+    """
+    blocks: dict[str, SwiftBlock] = {}
+    cur = None
+
+    for line in text.splitlines():
+        m = _TAG_LINE_RE.match(line)
+        if m:
+            tag = m.group(1)
+            if cur is not None and cur.tag == tag:
+                continue
+            if tag in blocks:
+                cur = None
+            else:
+                cur = blocks[tag] = SwiftBlock(tag)
+            continue
+
+        if cur is None:
+            continue
+        cleaned = line.strip()
+        if cleaned.startswith("-----"):
+            cur = None
+        elif cleaned:
+            cur.append(cleaned)
+
+    return blocks
+
+
+def get_block(blocks: dict[str, SwiftBlock], tag: str) -> SwiftBlock:
+    return blocks.get(tag) or SwiftBlock(tag)
+
+
 def strip_star(s: str) -> str:
-    return re.sub(r"^\*\s*", "", s).strip()
+    return _STAR_RE.sub("", s).strip()
+
+
+def _clean(lines: list[str]) -> list[str]:
+    out = []
+    for x in lines:
+        s = strip_star(x)
+        if s:
+            out.append(s)
+    return out
 
 
 def cleaned_lines(lines: list[str]) -> list[str]:
-    return [strip_star(x) for x in lines if strip_star(x)]
+    if isinstance(lines, SwiftBlock):
+        return lines.cleaned
+    return _clean(lines)
 
 
 # -----------------------------
@@ -177,14 +417,26 @@ def looks_like_account(s: str) -> bool:
     return bool(re.search(r"\d", s)) and len(s.replace(" ", "")) >= 6
 
 
+def _first_account_index(cl: list[str]):
+    for i, s in enumerate(cl):
+        if looks_like_account(s):
+            return i
+    return None
+
+
+def _account_index(lines: list[str], cl: list[str]):
+    if isinstance(lines, SwiftBlock):
+        return lines.account_index
+    return _first_account_index(cl)
+
+
 def pick_account_line1(lines: list[str]) -> str:
     """
     For 50K/59/59F: pick first line that looks like an account (contains digits).
     """
-    for s in cleaned_lines(lines):
-        if looks_like_account(s):
-            return s
-    return ""
+    cl = cleaned_lines(lines)
+    acct_idx = _account_index(lines, cl)
+    return "" if acct_idx is None else cl[acct_idx]
 
 
 def pick_name_line2(lines: list[str]) -> str:
@@ -192,11 +444,7 @@ def pick_name_line2(lines: list[str]) -> str:
     For 50K/59/59F: pick the first "name-like" line after the account line.
     """
     cl = cleaned_lines(lines)
-    acct_idx = None
-    for i, s in enumerate(cl):
-        if looks_like_account(s):
-            acct_idx = i
-            break
+    acct_idx = _account_index(lines, cl)
     if acct_idx is not None and acct_idx + 1 < len(cl):
         return cl[acct_idx + 1]
     # fallback: first non-account line
@@ -220,7 +468,13 @@ def pick_swift(lines: list[str]) -> str:
     """
     For 52A/57A: pick first line that looks like swift, skip pure numeric account/ids.
     """
-    for s in cleaned_lines(lines):
+    if isinstance(lines, SwiftBlock):
+        return lines.swift
+    return _pick_swift(cleaned_lines(lines))
+
+
+def _pick_swift(cl: list[str]) -> str:
+    for s in cl:
         if looks_like_account(s) and not looks_like_swift(s):
             continue
         if looks_like_swift(s):
@@ -263,13 +517,16 @@ def pick_from_blocks(picker, *blocks: list[str]) -> str:
     return ""
 
 
-def parse_32A(text: str):
-    b = extract_block_lines(text, "32A")
-    cl = cleaned_lines(b)
+def parse_32A(text: str, blocks: dict[str, SwiftBlock] = None):
+    if blocks is not None:
+        cl = cleaned_lines(get_block(blocks, "32A"))
+    else:
+        cl = cleaned_lines(extract_block_lines(text, "32A"))
 
     date_iso = ""
     ccy = ""
     amt = ""
+    amt_value = None
 
     # find date line
     for s in cl:
@@ -282,45 +539,65 @@ def parse_32A(text: str):
         m = re.search(r"\b([A-Z]{3})\b\s*([0-9][0-9,.\s]*)(?:\(|$)", s.strip())
         if m:
             ccy = m.group(1).upper()
-            amt = format_amount(parse_amount_to_float(m.group(2)))
+            amt_value = parse_amount_to_float(m.group(2))
+            amt = format_amount(amt_value)
             break
 
-    return date_iso, ccy, amt
+    return date_iso, ccy, amt, amt_value
 
 
 # -----------------------------
 # Mapping loader (ACCT Mapping)
 # -----------------------------
-def load_acct_mapping(mapping_file: str, mapping_sheet: str):
+MAPPING_COLS = {"PRIMARY ID", "CCY", "R-TAG"}
+
+
+def _text_col(col):
+    """与逐行 str(v).strip() 等价：空值 -> 'nan'（后面统一过滤）"""
+    return col.astype(object).where(col.notna(), "nan").astype(str).str.strip()
+
+
+def load_acct_mapping(mapping_file: str, mapping_sheet: str, use_cache: bool = True):
     if not os.path.exists(mapping_file):
         raise FileNotFoundError(
             f"找不到 mapping 文件：{mapping_file}\n请确认 Z 盘已映射且有权限。"
         )
 
-    df = pd.read_excel(mapping_file, sheet_name=mapping_sheet, engine="openpyxl")
-    df.columns = [str(c).strip().upper() for c in df.columns]
+    # 编译结果按 (路径, sheet, mtime, size) 缓存在本地，mapping 没变就不再解析 Excel
+    cache_key = mapping_cache_key(mapping_file, mapping_sheet)
+    if use_cache:
+        cached = load_mapping_cache(cache_key)
+        if cached is not None:
+            return cached
 
-    need = {"PRIMARY ID", "CCY", "R-TAG"}
-    if not need.issubset(set(df.columns)):
-        raise ValueError(f"ACCT Mapping sheet 需要列：{need}；当前列：{list(df.columns)}")
+    import pandas as pd
 
-    map_by_acct_ccy = {}
-    map_by_acct_only = {}
+    # 只读 PRIMARY ID / CCY / R-TAG 三列
+    df = pd.read_excel(
+        mapping_file, sheet_name=mapping_sheet, engine="openpyxl",
+        usecols=lambda c: str(c).strip().upper() in MAPPING_COLS,
+    )
+    df.columns = [str(c).strip().upper() for c in df.columns]
 
-    for _, r in df.iterrows():
-        prim = str(r["PRIMARY ID"]).strip()
-        ccy  = str(r["CCY"]).strip().upper()
-        acct = str(r["R-TAG"]).strip()
+    if not MAPPING_COLS.issubset(set(df.columns)):
+        raise ValueError(f"ACCT Mapping sheet 需要列：{MAPPING_COLS}；当前列：{list(df.columns)}")
 
-        if not acct or acct.lower() == "nan":
-            continue
-        if not prim or prim.lower() == "nan":
-            continue
+    prim = _text_col(df["PRIMARY ID"])
+    ccy  = _text_col(df["CCY"]).str.upper()
+    acct = _text_col(df["R-TAG"])
+
+    keep = (acct != "") & (acct.str.lower() != "nan") & (prim != "") & (prim.str.lower() != "nan")
+    prim, ccy, acct = prim[keep], ccy[keep], acct[keep]
 
-        map_by_acct_ccy[(acct, ccy)] = prim
-        map_by_acct_only.setdefault(acct, prim)
+    # 同 (acct, ccy) 后出现的覆盖前面的；只按 acct 时保留第一次出现
+    map_by_acct_ccy = dict(zip(zip(acct, ccy), prim))
+    first = ~acct.duplicated(keep="first")
+    map_by_acct_only = dict(zip(acct[first], prim[first]))
 
-    return map_by_acct_ccy, map_by_acct_only
+    result = (map_by_acct_ccy, map_by_acct_only)
+    if use_cache:
+        save_mapping_cache(cache_key, result)
+    return result
 
 
 # -----------------------------
@@ -332,11 +609,7 @@ def pick_beneficiary_name_until_add(lines: list[str]) -> str:
     cl = cleaned_lines(lines)
 
     # 找到账号行索引
-    acct_idx = None
-    for i, s in enumerate(cl):
-        if looks_like_account(s):
-            acct_idx = i
-            break
+    acct_idx = _account_index(lines, cl)
     start = acct_idx + 1 if acct_idx is not None else 0
 
     name_parts = []
@@ -372,16 +645,19 @@ def pick_beneficiary_name_until_add(lines: list[str]) -> str:
 # Per-message extraction
 # -----------------------------
 def extract_step3_record(text: str) -> dict:
+    # 方向判断和 tag 切分都只看尾部之前的内容
+    text = payload_text(text)
     direction = detect_direction(text)
-    date_iso, ccy, amt = parse_32A(text)
+    blocks = tokenize_blocks(text)
+    date_iso, ccy, amt, amt_value = parse_32A(text, blocks)
 
-    b50k = extract_block_lines(text, "50K")
-    b50f = extract_block_lines(text, "50F")
-    b59  = extract_block_lines(text, "59")
-    b59f = extract_block_lines(text, "59F")
-    b59k = extract_block_lines(text, "59K")
-    b52a = extract_block_lines(text, "52A")
-    b57a = extract_block_lines(text, "57A")
+    b50k = get_block(blocks, "50K")
+    b50f = get_block(blocks, "50F")
+    b59  = get_block(blocks, "59")
+    b59f = get_block(blocks, "59F")
+    b59k = get_block(blocks, "59K")
+    b52a = get_block(blocks, "52A")
+    b57a = get_block(blocks, "57A")
 
     if direction == "OUT":
         # 50K / 50F parallel logic
@@ -411,6 +687,8 @@ def extract_step3_record(text: str) -> dict:
         "DATE": date_iso,
         "CCY": ccy,
         "AMT": amt,
+        # 金额数值（按显示的两位小数取整，与 AMT 文本一致）：DW 回写在内存里直接用，不必再解析 AMT 文本
+        "AMT VALUE": None if amt_value is None else round(amt_value, 2),
         "CP NAME": cp_name,
         "CP A/C": cp_acct,
         "CP SWIFT": cp_swift,
@@ -420,17 +698,357 @@ def extract_step3_record(text: str) -> dict:
 
 
 # -----------------------------
-# 自动列宽（openpyxl）
+# 单文件解析 + 进程池并行
 # -----------------------------
-def autofit_worksheet(ws, df):
-    for i, col in enumerate(df.columns, start=1):
-        max_len = len(str(col))
-        for cell in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=i, max_col=i):
-            v = cell[0].value
-            if v is None:
+def parse_msg_file(path: str) -> dict:
+    """读取并解析单个 .msg（进程池 worker 也调用它，需保持顶层可 pickle）。"""
+    return extract_step3_record(read_msg_text(path))
+
+
+def _parse_chunk(chunk, cache_key: bool = False):
+    """
+    worker：解析一批 (index, path)，逐个捕获异常，返回 [(index, rec, error, stats, key)]。
+    stats = (read_wall, read_cpu, parse_wall, parse_cpu, 文件字节数)，供 RunMetrics 汇总。
+    cache_key=True 时在读取时一并取得缓存键 key = (size, mtime_ns, digest)（哈希在 worker 里算，不占主进程）：
+    整个文件只读一次，同一份字节既算哈希又解析；
+    读完后文件的大小/修改时间变了（仍在写入/被替换）则 key 为 None，这条结果不进缓存。
+    """
+    clock, cpu = time.perf_counter, time.process_time
+    out = []
+    for idx, path in chunk:
+        t0, c0 = clock(), cpu()
+        t1 = c1 = None
+        try:
+            st = os.stat(path)
+            key = data = None
+            if cache_key:
+                with open(path, "rb") as f:
+                    data = f.read()
+            text = read_msg_text(path, data)
+            if cache_key:
+                st_after = os.stat(path)
+                unchanged = (st_after.st_size, st_after.st_mtime_ns) == (st.st_size, st.st_mtime_ns)
+                if unchanged and len(data) == st.st_size:
+                    key = (st.st_size, st.st_mtime_ns, bytes_digest(data))
+            t1, c1 = clock(), cpu()
+            rec = extract_step3_record(text)
+            t2, c2 = clock(), cpu()
+            out.append((idx, rec, None, (t1 - t0, c1 - c0, t2 - t1, c2 - c1, st.st_size), key))
+        except Exception as e:
+            t2, c2 = clock(), cpu()
+            if t1 is None:
+                t1, c1 = t2, c2
+            out.append((idx, None, str(e), (t1 - t0, c1 - c0, t2 - t1, c2 - c1, 0), None))
+    return out
+
+
+def _segment_size(n_files: int, workers: int) -> int:
+    """并行时每段的文件数：每个 worker 大约分到 8 段，单段不超过 64 个文件"""
+    return max(1, min(64, n_files // (workers * 8)))
+
+
+def _iter_segments(paths: list[str], seg_size: int, cache: ParseCache = None, metrics: RunMetrics = None):
+    """
+    按文件顺序切段，逐段 yield (hits, misses)：hits = [(index, rec)] 缓存命中，misses = [(index, path)] 待解析。
+    缓存边走边查，只有当前窗口里的段持有命中的记录。
+    """
+    hits, misses = [], []
+    for i, p in enumerate(paths):
+        rec = None
+        if cache is not None:
+            if metrics is None:
+                rec = cache.get(p)
+            else:
+                with metrics.stage("cache", files=1):
+                    rec = cache.get(p)
+        if rec is None:
+            misses.append((i, p))
+        else:
+            hits.append((i, rec))
+            if metrics is not None:
+                metrics.count("cache_hits")
+        if len(hits) + len(misses) >= seg_size:
+            yield hits, misses
+            hits, misses = [], []
+    if hits or misses:
+        yield hits, misses
+
+
+class _Segment:
+    __slots__ = ("hits", "future", "done")
+
+    def __init__(self, hits, future):
+        self.hits = hits
+        self.future = future    # 没有待解析文件时为 None
+        self.done = False       # 已产出
+
+
+def iter_parsed_files(paths: list[str], workers: int = 1, cache: ParseCache = None,
+                      metrics: RunMetrics = None, pool_callback=None):
+    """
+    解析一组文件，逐个 yield (index, rec, error)。
+    文件按输入顺序切段派发：串行时严格按文件顺序产出；
+    并行时从最早一个还没产出的段算起，最多 workers*2 段在窗口里，段内按文件顺序、段间按完成顺序产出，
+    所以产出顺序最多错开一个窗口（调用方按 index 还原文件顺序时，暂存的记录数有上限，不随文件数增长）。
+    传入 cache 时命中的文件不再解析（随所在的段产出），解析结果写回缓存。
+    传入 metrics 时累计 cache / read / parse 阶段耗时。
+    pool_callback(workers) 在真正启动进程池时调用一次（全部命中缓存或走串行时不调用）。
+    """
+    parse_chunk = functools.partial(_parse_chunk, cache_key=cache is not None)
+
+    def finish(results):
+        for idx, rec, err, stats, key in results:
+            if metrics is not None:
+                read_wall, read_cpu, parse_wall, parse_cpu, size = stats
+                metrics.add("read", read_wall, read_cpu, files=1, nbytes=size)
+                metrics.add("parse", parse_wall, parse_cpu, files=1)
+                if err is not None:
+                    metrics.count("errors")
+            if key is not None:
+                if metrics is None:
+                    cache.put(paths[idx], rec, *key)
+                else:
+                    with metrics.stage("cache"):
+                        cache.put(paths[idx], rec, *key)
+            yield idx, rec, err
+
+    if workers <= 1 or len(paths) < PARALLEL_MIN_FILES:
+        for hits, misses in _iter_segments(paths, 1, cache, metrics):
+            for idx, rec in hits:
+                yield idx, rec, None
+            if misses:
+                yield from finish(parse_chunk(misses))
+        return
+
+    from collections import deque
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    # 窗口从最早未产出的段算起：调用方暂停时进程池很快停下，
+    # 取消（关闭生成器）时只等在途的段，没派发的根本不会读
+    segments = _iter_segments(paths, _segment_size(len(paths), workers), cache, metrics)
+    window = deque()
+    pool = None    # 第一段有未命中的文件时才启动（全部命中缓存时不起进程）
+    try:
+        while True:
+            while len(window) < workers * 2:
+                seg = next(segments, None)
+                if seg is None:
+                    break
+                hits, misses = seg
+                future = None
+                if misses:
+                    if pool is None:
+                        if pool_callback is not None:
+                            pool_callback(workers)
+                        pool = ProcessPoolExecutor(max_workers=workers)
+                    future = pool.submit(parse_chunk, misses)
+                window.append(_Segment(hits, future))
+            if not window:
+                return
+
+            ready = [sg for sg in window if not sg.done and (sg.future is None or sg.future.done())]
+            if not ready:
+                wait([sg.future for sg in window if not sg.done], return_when=FIRST_COMPLETED)
                 continue
-            max_len = max(max_len, len(str(v)))
-        ws.column_dimensions[ws.cell(row=1, column=i).column_letter].width = min(max_len + 2, 80)
+            for sg in ready:
+                out = [(idx, rec, None) for idx, rec in sg.hits]
+                if sg.future is not None:
+                    out.extend(finish(sg.future.result()))
+                out.sort(key=lambda t: t[0])
+                sg.done = True
+                sg.hits = None
+                yield from out
+            while window and window[0].done:
+                window.popleft()
+    finally:
+        if pool is not None:
+            for sg in window:
+                if sg.future is not None:
+                    sg.future.cancel()
+            pool.shutdown(wait=True)
+
+
+# -----------------------------
+# 流式 API：逐条产出记录
+# -----------------------------
+def is_msg_file(fn: str, skip_keywords) -> bool:
+    return fn.lower().endswith(".msg") and not any(k in fn.upper() for k in skip_keywords)
+
+
+def list_msg_files(input_dir: str, skip_keywords=None) -> list[str]:
+    """input_dir 下待处理的 .msg 文件名（已排序，已按关键字排除 FFD/MT199 等）。"""
+    if skip_keywords is None:
+        skip_keywords = DEFAULT_SKIP_KEYWORDS
+    return sorted(fn for fn in os.listdir(input_dir) if is_msg_file(fn, skip_keywords))
+
+
+def lookup_prim_id(map_by_acct_ccy: dict, map_by_acct_only: dict, acct: str, ccy: str) -> str:
+    """先按 (账号, 币种) 查，查不到再只按账号查。"""
+    prim = map_by_acct_ccy.get((acct, ccy), "")
+    if not prim and acct:
+        prim = map_by_acct_only.get(acct, "")
+    return prim
+
+
+def _error_record(fn: str, err: str) -> dict:
+    rec = {c: "" for c in STEP3_COLS}
+    rec["FILE"] = fn
+    rec["ERROR"] = err
+    return rec
+
+
+def iter_swift_records(
+    input_dir: str,
+    mapping=None,            # load_acct_mapping 的返回值；None 时 PRIM ID 为空
+    files: list[str] = None, # 默认 list_msg_files(input_dir)
+    workers: int = 1,
+    cache: ParseCache = None,
+    ordered: bool = True,    # True: 按文件顺序产出；False: 按解析完成顺序产出
+    metrics: RunMetrics = None,
+    pool_callback=None       # pool_callback(workers)：启动解析进程池时调用
+):
+    """
+    逐条 yield 记录 dict：FILE + STEP3_COLS + ERROR（成功时 ERROR 为空串）。
+    解析完一条就产出一条，调用方可边读边写，内存不随文件数增长。
+    并行 + ordered 时只暂存“乱序先到”的记录（最多一个派发窗口，见 iter_parsed_files），前缀连续后立即放出。
+    """
+    if files is None:
+        files = list_msg_files(input_dir)
+    map_by_acct_ccy, map_by_acct_only = mapping if mapping is not None else ({}, {})
+    paths = [os.path.join(input_dir, fn) for fn in files]
+
+    pending = {}
+    next_idx = 0
+
+    for idx, rec, err in iter_parsed_files(paths, workers, cache, metrics, pool_callback):
+        fn = files[idx]
+        if err is None:
+            if metrics is None:
+                rec["PRIM ID"] = lookup_prim_id(map_by_acct_ccy, map_by_acct_only, rec["Client Acct"], rec["CCY"])
+            else:
+                with metrics.stage("map", records=1):
+                    rec["PRIM ID"] = lookup_prim_id(map_by_acct_ccy, map_by_acct_only, rec["Client Acct"], rec["CCY"])
+            rec["FILE"] = fn
+            rec["ERROR"] = ""
+        else:
+            rec = _error_record(fn, err)
+
+        if not ordered:
+            yield rec
+            continue
+
+        pending[idx] = rec
+        while next_idx in pending:
+            yield pending.pop(next_idx)
+            next_idx += 1
+
+
+# =========================
+# 运行控制：取消 / 暂停（GUI 线程操作，解析循环在每条记录之间检查）
+# =========================
+class RunCancelled(Exception):
+    """run_swift_batch 被 RunControl.cancel() 中止；未完成的输出文件已丢弃，已解析的结果留在缓存里"""
+
+
+class RunControl:
+    """
+    线程安全的协作式取消/暂停开关：
+        control = RunControl()
+        run_swift_batch(..., control=control)   # 工作线程
+        control.pause() / control.resume() / control.cancel()   # 其他线程随时调用
+    解析循环每处理完一条调用 checkpoint()：暂停时在这里等待，取消时抛 RunCancelled。
+    """
+
+    def __init__(self):
+        self._cancel = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._lock = threading.Lock()
+        self._paused_at = None
+        self._paused_total = 0.0
+
+    def pause(self):
+        with self._lock:
+            if self._paused_at is None:
+                self._paused_at = time.perf_counter()
+                self._running.clear()
+
+    def resume(self):
+        with self._lock:
+            if self._paused_at is not None:
+                self._paused_total += time.perf_counter() - self._paused_at
+                self._paused_at = None
+            self._running.set()
+
+    def cancel(self):
+        self._cancel.set()
+        self.resume()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def paused_seconds(self) -> float:
+        """累计暂停时长（含正在进行的这次），算速率/剩余时间时扣掉"""
+        with self._lock:
+            extra = 0.0 if self._paused_at is None else time.perf_counter() - self._paused_at
+            return self._paused_total + extra
+
+    def checkpoint(self):
+        self._running.wait()
+        if self._cancel.is_set():
+            raise RunCancelled("已取消")
+
+    def sleep(self, seconds: float):
+        """等待 seconds 秒；期间被取消立即返回（监视模式两轮之间用）"""
+        self._cancel.wait(seconds)
+
+
+# =========================
+# 输出表：Step3_Final + Debug，各格式同一遍写
+# =========================
+def output_paths(output_dir: str, formats: list[str]) -> tuple[str, str]:
+    """(输出前缀, 主输出路径)：YYYYMMDD_Swift + .xlsx / _Step3_Final.<fmt>（日期取写出当天）"""
+    today_str = datetime.now().strftime("%Y%m%d")
+    output_base = os.path.join(output_dir, f"{today_str}_Swift")
+    if "xlsx" in formats:
+        return output_base, output_base + ".xlsx"
+    return output_base, f"{output_base}_Step3_Final.{formats[0]}"
+
+
+def _open_output_tables(stack: ExitStack, output_base: str, formats: list[str]):
+    """在 stack 里打开所有输出表，返回 (finals, debugs, Excel 的 Debug 表或 None)；出错退出时未完成的文件自动丢弃"""
+    finals, debugs = [], []
+    ws_debug = None
+    if "xlsx" in formats:
+        wb = stack.enter_context(StreamingXlsxWriter(output_base + ".xlsx"))
+        finals.append(wb.add_sheet("Step3_Final", STEP3_COLS))
+        ws_debug = wb.add_sheet("Debug", DEBUG_XLSX_COLS)
+        debugs.append(ws_debug)
+    for fmt in formats:
+        if fmt == "xlsx":
+            continue
+        finals.append(stack.enter_context(
+            open_table_writer(fmt, f"{output_base}_Step3_Final.{fmt}", STEP3_COLS)))
+        debugs.append(stack.enter_context(
+            open_table_writer(fmt, f"{output_base}_Debug.{fmt}", DEBUG_EXPORT_COLS)))
+    return finals, debugs, ws_debug
+
+
+def _append_record(rec: dict, finals: list, debugs: list) -> bool:
+    """写一条记录：有效的进 Step3_Final，全部进 Debug；返回是否进了 Step3_Final"""
+    valid = is_step3_valid(rec)
+    if valid:
+        values = [rec[c] for c in STEP3_COLS]
+        for t in finals:
+            t.append(values)
+    for t in debugs:
+        t.append([rec[c] for c in t.columns])
+    return valid
 
 
 # =========================
@@ -443,106 +1061,465 @@ def run_swift_batch(
     mapping_sheet: str = DEFAULT_MAPPING_SHEET,
     skip_keywords=None,
     progress_callback=None,   # progress_callback(done:int, total:int, filename:str)
-    status_callback=None      # status_callback(message:str)
+    status_callback=None,     # status_callback(message:str)
+    workers: int = 1,         # >1 时用进程池并行解析
+    use_cache: bool = True,   # 增量解析：未变化的文件直接用缓存结果
+    cache_path: str = None,   # 默认 <output_dir>/.swift_parse_cache.sqlite
+    output_formats=("xlsx",), # 可组合 "xlsx" / "csv" / "parquet"
+    metrics: RunMetrics = None,  # 传入时由调用方读取分阶段指标（GUI 完成后显示摘要）
+    step3_callback=None,      # step3_callback(rec:dict)：每条进入 Step3_Final 的记录按输出顺序回调（内存交给 DW 回写）
+    record_callback=None,     # record_callback(rec:dict)：每条记录（含解析失败的，即 Debug 行）按输出顺序回调（GUI 实时结果表）
+    control: RunControl = None,    # 协作式取消/暂停；取消时抛 RunCancelled
+    progress_interval: float = 0.0 # 进度/“解析中”状态回调的最小间隔（秒）；0 = 每个文件都回调
 ) -> str:
-    if skip_keywords is None:
-        skip_keywords = ["FFD", "MT199"]
+    """
+    返回主输出文件路径：有 xlsx 时为 YYYYMMDD_Swift.xlsx，
+    否则为第一种格式的 YYYYMMDD_Swift_Step3_Final.<fmt>。
+    分阶段耗时写入 YYYYMMDD_Swift_metrics.json，并通过 status_callback 输出一行摘要。
+    progress_interval > 0 时逐文件的进度合并成按时间间隔回调（最后一个文件一定回调），避免刷爆 GUI 事件循环。
+    """
+    formats = normalize_formats(output_formats)
+    if metrics is None:
+        metrics = RunMetrics("swift_batch")
 
     if not os.path.exists(input_dir):
         raise FileNotFoundError(f"找不到 msg 文件夹：{input_dir}")
     if not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
 
-    map_by_acct_ccy, map_by_acct_only = load_acct_mapping(mapping_file, mapping_sheet)
+    with metrics.stage("mapping", files=1):
+        mapping = load_acct_mapping(mapping_file, mapping_sheet)
 
-    # 动态输出名：YYYYMMDD_Swift.xlsx
-    today_str = datetime.now().strftime("%Y%m%d")
-    output_path = os.path.join(output_dir, f"{today_str}_Swift.xlsx")
+    # 动态输出名：YYYYMMDD_Swift.xlsx / YYYYMMDD_Swift_Step3_Final.csv ...
+    output_base, output_path = output_paths(output_dir, formats)
 
-    files_all = [fn for fn in os.listdir(input_dir) if fn.lower().endswith(".msg")]
-    files = [fn for fn in files_all if not any(k in fn.upper() for k in skip_keywords)]
+    with metrics.stage("list"):
+        files = list_msg_files(input_dir, skip_keywords)
     total = len(files)
     done = 0
+    metrics.count("files", total)
 
-    rows = []
+    cache = None
+    if use_cache:
+        cache = ParseCache(cache_path or os.path.join(output_dir, CACHE_FILENAME), PARSER_VERSION)
 
-    for fn in files:
-        path = os.path.join(input_dir, fn)
-        try:
-            if status_callback:
-                status_callback(f"解析中：{fn}")
+    has_error = False
 
-            text = read_msg_text(path)
-            rec = extract_step3_record(text)
+    try:
+        # Step3_Final 与 Debug 同一遍流式写入所有格式，列宽边写边统计
+        with ExitStack() as stack:
+            finals, debugs, ws_debug = _open_output_tables(stack, output_base, formats)
 
-            acct = rec["Client Acct"]
-            ccy  = rec["CCY"]
+            # 取消时先关掉记录生成器（撤销进程池里排队的块），再丢弃未完成的输出
+            # 进程池只在有文件要解析时才启动：全部命中缓存时不提示“并行解析中”
+            pool_callback = None
+            if status_callback:
+                pool_callback = lambda n: status_callback(f"并行解析中（{n} 进程）...")
+            records = iter_swift_records(input_dir, mapping, files, workers, cache,
+                                         metrics=metrics, pool_callback=pool_callback)
+            stack.callback(records.close)
+            last_report = 0.0
+
+            for rec in records:
+                fn = rec["FILE"]
+
+                with metrics.stage("write", records=1):
+                    is_step3 = _append_record(rec, finals, debugs)
+                # 调用方的回调（DW 回写攒记录、GUI 结果表）单独计时，不算进写出
+                if (is_step3 and step3_callback) or record_callback:
+                    with metrics.stage("callback", records=1):
+                        if is_step3 and step3_callback:
+                            step3_callback(rec)
+                        if record_callback:
+                            record_callback(rec)
+                has_error = has_error or bool(rec["ERROR"])
+
+                done += 1
+                now = time.perf_counter()
+                if done == total or now - last_report >= progress_interval:
+                    last_report = now
+                    if status_callback:
+                        status_callback(f"解析中：{fn}")
+                    if progress_callback:
+                        progress_callback(done, total, fn)
+
+                if control is not None:
+                    control.checkpoint()
+
+            # 没有任何错误时 Excel 的 Debug 不输出 ERROR 列
+            if ws_debug is not None and not has_error:
+                ws_debug.columns = DEBUG_XLSX_COLS[:-1]
 
-            prim = map_by_acct_ccy.get((acct, ccy), "")
-            if not prim and acct:
-                prim = map_by_acct_only.get(acct, "")
+            if status_callback:
+                hits = metrics.counters.get("cache_hits", 0)
+                if hits:
+                    status_callback(f"缓存命中 {hits}/{total} 个文件")
+                status_callback(f"写入 {'/'.join(formats)} 中...")
+            # 关闭即落盘（xlsx 在这里拼装 zip），计入写出阶段
+            with metrics.stage("write"):
+                stack.close()
+    finally:
+        if cache is not None:
+            cache.close()
+
+    metrics.finish(records=done)
+    metrics.write_json(metrics_path_for(output_base))
+    if status_callback:
+        status_callback(f"耗时：{metrics.summary()}")
+        status_callback(f"完成 ✅ 输出：{output_path}")
 
-            rec["PRIM ID"] = prim
-            rec["FILE"] = fn
-            rows.append(rec)
+    return output_path
 
-        except Exception as e:
-            rows.append({
-                "FILE": fn,
-                "Client Acct": "",
-                "PRIM ID": "",
-                "DATE": "",
-                "CCY": "",
-                "AMT": "",
-                "CP NAME": "",
-                "CP A/C": "",
-                "CP SWIFT": "",
-                "CP BANK NAME": "",
-                "DIRECTION": "",
-                "ERROR": str(e)
-            })
-
-        done += 1
-        if progress_callback:
-            progress_callback(done, total, fn)
-
-    df = pd.DataFrame(rows)
-
-    step3_cols = [
-        "Client Acct","PRIM ID","DATE","CCY","AMT",
-        "CP NAME","CP A/C","CP SWIFT","CP BANK NAME","DIRECTION"
-    ]
-    step3 = df.reindex(columns=step3_cols)
-
-    key_cols = ["Client Acct", "DATE", "CCY", "AMT", "CP A/C", "CP SWIFT"]
-    mask_valid = step3[key_cols].apply(lambda s: s.astype(str).str.strip().ne("")).any(axis=1)
-    step3_final = step3[mask_valid].copy()
-
-    debug_cols = ["FILE","DIRECTION"] + step3_cols + (["ERROR"] if "ERROR" in df.columns else [])
-    debug = df.reindex(columns=debug_cols)
+
+def run_swift_pipeline(
+    input_dir: str,
+    output_dir: str,
+    mapping_file: str,
+    dw_file: str,
+    mapping_sheet: str = DEFAULT_MAPPING_SHEET,
+    dw_output_file: str = None,  # 默认 DW 文件旁的 <DW文件名>_updated.xlsx
+    status_callback=None,
+    control: RunControl = None,  # 解析阶段可取消/暂停；开始回写前再检查一次
+    dw_metrics: RunMetrics = None,  # DW 回写的耗时和匹配/未匹配/冲突计数（counters）
+    **batch_kwargs            # 其余参数原样传给 run_swift_batch（进度回调、并行、缓存、输出格式、指标...）
+) -> tuple[str, str]:
+    """
+    解析 + DW 回写一条龙：run_swift_batch 照常输出 Step3_Final，
+    同时把 Step3_Final 记录（含金额数值）在内存里直接交给 update_cp_swift 匹配回写，
+    不再把 YYYYMMDD_Swift.xlsx 用 pandas 读回来、再解析一遍 AMT 文本。
+    返回 (Swift 输出路径, DW 新文件路径)。
+    """
+    # update_cp_swift 依赖 pandas / openpyxl，只在需要回写时才导入
+    import update_cp_swift
+
+    if not os.path.exists(dw_file):
+        raise FileNotFoundError(f"找不到 DW 文件：{dw_file}")
+    if dw_output_file is None:
+        dw_output_file = update_cp_swift.updated_output_path(dw_file)
+
+    step3 = update_cp_swift.Step3Rows()
+    swift_out = run_swift_batch(
+        input_dir, output_dir, mapping_file, mapping_sheet,
+        status_callback=status_callback, step3_callback=step3.append_record, control=control, **batch_kwargs
+    )
+    if control is not None:
+        control.checkpoint()
 
     if status_callback:
-        status_callback("写入 Excel 中...")
+        status_callback(f"DW 回写中（{len(step3)} 条 Step3_Final）...")
+    dw_out = update_cp_swift.write_back_step3(
+        step3, dw_file=dw_file, output_file=dw_output_file, status_callback=status_callback,
+        metrics=dw_metrics
+    )
+    if status_callback:
+        status_callback(f"完成 ✅ DW 输出：{dw_out}")
+    return swift_out, dw_out
 
-    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-        step3_final.to_excel(writer, sheet_name="Step3_Final", index=False)
-        debug.to_excel(writer, sheet_name="Debug", index=False)
 
-        ws_final = writer.sheets["Step3_Final"]
-        ws_debug = writer.sheets["Debug"]
-        autofit_worksheet(ws_final, step3_final)
-        autofit_worksheet(ws_debug, debug)
+# =========================
+# 监视模式：持续收取新报文
+# =========================
+# 只用轮询（os.scandir 一次列目录就带回大小/修改时间）：Z: 盘是网络共享，
+# 目录变更通知在 SMB 上不可靠，也不想为此多装依赖
+WATCH_INTERVAL = 2.0   # 两轮之间的间隔（秒）
+WATCH_SETTLE = 3.0     # 文件大小和修改时间连续这么久不变、且能打开读取，才当作写完
+WATCH_XLSX_INTERVAL = 30.0  # Excel 输出整本重写的最短间隔（秒）；一轮没有新变化（空闲）或停止监视时也会写
 
-    if status_callback:
-        status_callback(f"完成 ✅ 输出：{output_path}")
 
+def _readable(path: str) -> bool:
+    """还在被写入的文件（Windows 上常被独占）打不开，下轮再试"""
+    try:
+        with open(path, "rb"):
+            return True
+    except OSError:
+        return False
+
+
+class FolderWatcher:
+    """
+    轮询式目录监视 + 去抖：
+        watcher = FolderWatcher(input_dir)
+        ready, removed = watcher.poll()   # 每轮调用一次
+    ready：新增或内容有变化、且已稳定 settle 秒的文件名；removed：上次交出去之后被删掉的文件名。都按文件名排序。
+    """
+
+    def __init__(self, input_dir: str, skip_keywords=None, settle: float = WATCH_SETTLE, clock=time.monotonic):
+        self.input_dir = input_dir
+        self.skip_keywords = DEFAULT_SKIP_KEYWORDS if skip_keywords is None else skip_keywords
+        self.settle = settle
+        self.clock = clock
+        self.done: dict[str, tuple] = {}      # 文件名 -> 已交出去解析的 (size, mtime_ns)
+        self._pending: dict[str, tuple] = {}  # 文件名 -> ((size, mtime_ns), 首次看到这个状态的时间)
+
+    def poll(self) -> tuple[list[str], list[str]]:
+        now = self.clock()
+        seen = {}
+        with os.scandir(self.input_dir) as it:
+            for entry in it:
+                if is_msg_file(entry.name, self.skip_keywords) and entry.is_file():
+                    st = entry.stat()
+                    seen[entry.name] = (st.st_size, st.st_mtime_ns)
+
+        ready = []
+        for fn, sig in seen.items():
+            if self.done.get(fn) == sig:
+                continue
+            first = self._pending.get(fn)
+            if first is None or first[0] != sig:
+                self._pending[fn] = (sig, now)   # 新出现或还在变：从现在起重新计时
+                continue
+            if now - first[1] < self.settle or not _readable(os.path.join(self.input_dir, fn)):
+                continue
+            del self._pending[fn]
+            self.done[fn] = sig
+            ready.append(fn)
+
+        removed = [fn for fn in self.done if fn not in seen]
+        for fn in removed:
+            del self.done[fn]
+        for fn in [fn for fn in self._pending if fn not in seen]:
+            del self._pending[fn]
+        return sorted(ready), sorted(removed)
+
+
+def watch_swift_folder(
+    input_dir: str,
+    output_dir: str,
+    mapping_file: str,
+    mapping_sheet: str = DEFAULT_MAPPING_SHEET,
+    skip_keywords=None,
+    status_callback=None,     # status_callback(message:str)
+    update_callback=None,     # update_callback(output_path, new_records:list, all_records:list)：每次输出更新后回调
+    control: RunControl = None,  # control.cancel() 结束监视；pause() 暂停轮询
+    interval: float = WATCH_INTERVAL,
+    settle: float = WATCH_SETTLE,
+    workers: int = 1,
+    use_cache: bool = True,
+    cache_path: str = None,
+    output_formats=("xlsx",),
+    xlsx_interval: float = WATCH_XLSX_INTERVAL
+):
+    """
+    监视模式：一直运行到 control.cancel()（或 Ctrl+C），返回最后一次写出的主输出路径（没写过为 None）。
+    每 interval 秒轮询一次：新增/变更的 .msg 写完（settle 秒不变）后只解析这些文件，
+    已有记录留在内存里，然后更新当天的输出（文件名、内容与 run_swift_batch 对同一文件夹的结果相同，见 _WatchOutput）：
+    csv / parquet 只追加新记录；Excel 整本重写，最多每 xlsx_interval 秒一次，文件夹空闲一轮或停止监视时补写。
+    文件被删除、或 mapping 文件有更新（重新查 PRIM ID）时整体重写。
+    输出被占用（例如正在 Excel 里打开）或网络盘暂时不可用时只提示，下一轮自动重试。
+    """
+    formats = normalize_formats(output_formats)
+    if not os.path.exists(input_dir):
+        raise FileNotFoundError(f"找不到 msg 文件夹：{input_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    def emit(msg):
+        if status_callback:
+            status_callback(msg)
+
+    mapping_key = mapping_cache_key(mapping_file, mapping_sheet)
+    mapping = load_acct_mapping(mapping_file, mapping_sheet)
+
+    watcher = FolderWatcher(input_dir, skip_keywords, settle)
+    output = _WatchOutput(output_dir, formats, xlsx_interval)
+    records: dict[str, dict] = {}
+    output_path = None
+    dirty = False
+
+    cache = None
+    if use_cache:
+        cache = ParseCache(cache_path or os.path.join(output_dir, CACHE_FILENAME), PARSER_VERSION)
+
+    emit(f"监视中：{input_dir}（每 {interval:g} 秒检查一次）")
+    try:
+        while True:
+            if control is not None:
+                control.checkpoint()
+            t0 = time.perf_counter()
+            new = []
+            busy = False   # 这一轮有没有新变化；没有时补写推迟的 Excel
+            try:
+                # mapping 更新过就重新载入，已有记录重查 PRIM ID；新文件有问题时继续用旧的
+                key = mapping_cache_key(mapping_file, mapping_sheet)
+                if key != mapping_key:
+                    try:
+                        mapping = load_acct_mapping(mapping_file, mapping_sheet)
+                    except ValueError as e:
+                        emit(f"Mapping 载入失败（{e}），继续使用旧的 Mapping")
+                    else:
+                        for rec in records.values():
+                            if not rec["ERROR"]:
+                                rec["PRIM ID"] = lookup_prim_id(*mapping, rec["Client Acct"], rec["CCY"])
+                        if records:
+                            output.invalidate()
+                            dirty = busy = True
+                    mapping_key = key   # 读不到文件（OSError）时不更新，下一轮重试
+
+                ready, removed = watcher.poll()
+                if ready:
+                    new = list(iter_swift_records(input_dir, mapping, ready, workers, cache))
+                    for rec in new:
+                        if rec["FILE"] in records:
+                            output.invalidate()   # 已写出的文件内容变了：不能只追加
+                        records[rec["FILE"]] = rec
+                    if cache is not None:
+                        cache.commit()
+                for fn in removed:
+                    records.pop(fn, None)
+                if ready or removed:
+                    dirty = busy = True
+            except OSError as e:
+                emit(f"读取失败（{e}），{interval:g} 秒后重试")
+
+            if dirty:
+                ordered = [records[fn] for fn in sorted(records)]
+                try:
+                    output_path = output.update(ordered)
+                except OSError as e:
+                    emit(f"输出写入失败（{e}），下一轮重试")
+                else:
+                    dirty = False
+                    _flush_watch_xlsx(output, ordered, emit)
+                    later = "，Excel 稍后重写" if output.xlsx_pending else ""
+                    emit(f"已更新（新增/变更 {len(new)}，共 {len(ordered)} 条，"
+                         f"{time.perf_counter() - t0:.2f}s{later}）：{output_path}")
+                    if update_callback:
+                        update_callback(output_path, new, ordered)
+            elif output.xlsx_pending and not busy:
+                # 空闲的一轮：补写推迟的 Excel
+                ordered = [records[fn] for fn in sorted(records)]
+                if _flush_watch_xlsx(output, ordered, emit, force=True):
+                    emit(f"Excel 已重写（共 {len(ordered)} 条，{time.perf_counter() - t0:.2f}s）：{output_path}")
+
+            if control is not None:
+                control.sleep(interval)
+            else:
+                time.sleep(interval)
+    except RunCancelled:
+        pass
+    finally:
+        if cache is not None:
+            cache.close()
+        if output.xlsx_pending:   # 停止前补写推迟的 Excel（Ctrl+C 也一样）
+            _flush_watch_xlsx(output, [records[fn] for fn in sorted(records)], emit, force=True)
+    emit("监视已停止")
+    return output_path
+
+
+def _write_watch_output(output_dir: str, formats: list[str], records: list[dict]) -> str:
+    """把内存里的全部记录按 run_swift_batch 的格式重写当天输出，返回主输出路径"""
+    output_base, output_path = output_paths(output_dir, formats)
+    has_error = False
+    with ExitStack() as stack:
+        finals, debugs, ws_debug = _open_output_tables(stack, output_base, formats)
+        for rec in records:
+            _append_record(rec, finals, debugs)
+            has_error = has_error or bool(rec["ERROR"])
+        if ws_debug is not None and not has_error:
+            ws_debug.columns = DEBUG_XLSX_COLS[:-1]
     return output_path
 
 
+class _WatchOutput:
+    """
+    监视模式的当天输出，每轮 update(全部记录) 一次：
+    - csv / parquet：已写出的文件名正好是当前记录（按文件名排序）的前缀时只追加后面的新记录；
+      删除、插到中间的新文件、跨天换文件名，或 invalidate()（已写出的记录内容变了）时整表重写
+    - xlsx：只记下需要重写（xlsx_pending），由 write_xlsx 按间隔/空闲整本重写
+    """
+
+    def __init__(self, output_dir: str, formats: list[str], xlsx_interval: float, clock=time.monotonic):
+        self.output_dir = output_dir
+        self.formats = formats
+        self.tables = [f for f in formats if f != "xlsx"]
+        self.xlsx_interval = xlsx_interval
+        self.clock = clock
+        self.xlsx_pending = False
+        self._xlsx_at = float("-inf")
+        self._written: list[str] = None   # csv / parquet 里已有的文件名（按顺序）；None = 需要整表重写
+        self._base = None
+
+    def invalidate(self):
+        self._written = None
+
+    def update(self, records: list[dict]) -> str:
+        """csv / parquet 立即更新，返回主输出路径"""
+        output_base, output_path = output_paths(self.output_dir, self.formats)
+        self.xlsx_pending = "xlsx" in self.formats
+        if not self.tables:
+            return output_path
+        names = [rec["FILE"] for rec in records]
+        done, self._written = self._written, None   # 写到一半失败时下一轮整表重写
+        if done is not None and output_base == self._base and names[:len(done)] == done:
+            new = records[len(done):]
+            valid = [rec for rec in new if is_step3_valid(rec)]
+            for fmt in self.tables:
+                append_table_rows(fmt, f"{output_base}_Step3_Final.{fmt}", STEP3_COLS,
+                                  [[rec[c] for c in STEP3_COLS] for rec in valid])
+                append_table_rows(fmt, f"{output_base}_Debug.{fmt}", DEBUG_EXPORT_COLS,
+                                  [[rec[c] for c in DEBUG_EXPORT_COLS] for rec in new])
+        else:
+            _write_watch_output(self.output_dir, self.tables, records)
+        self._written, self._base = names, output_base
+        return output_path
+
+    def write_xlsx(self, records: list[dict], force: bool = False) -> bool:
+        """距上次重写不到 xlsx_interval 秒时跳过（force 除外），返回是否写了"""
+        if not force and self.clock() - self._xlsx_at < self.xlsx_interval:
+            return False
+        _write_watch_output(self.output_dir, ["xlsx"], records)
+        self._xlsx_at = self.clock()
+        self.xlsx_pending = False
+        return True
+
+
+def _flush_watch_xlsx(output: _WatchOutput, records: list[dict], emit, force: bool = False) -> bool:
+    """按 _WatchOutput.write_xlsx 的间隔规则重写 Excel；写失败只提示（下一轮再试），返回是否写了"""
+    try:
+        return output.write_xlsx(records, force)
+    except OSError as e:
+        emit(f"Excel 输出写入失败（{e}），稍后重试")
+        return False
+
+
 if __name__ == "__main__":
-    out = run_swift_batch(
+    import multiprocessing
+    import sys
+    multiprocessing.freeze_support()
+
+    from swift_profile import profiling_enabled, run_profiled
+
+    kwargs = dict(
         input_dir=DEFAULT_MSG_FOLDER,
         output_dir=DEFAULT_OUTPUT_FOLDER,
-        mapping_file=DEFAULT_MAPPING_FILE
+        mapping_file=DEFAULT_MAPPING_FILE,
+        workers=os.cpu_count() or 1
     )
+
+    # python swift_core.py --update-dw：解析完直接在内存里回写 DW（DW 路径取 update_cp_swift 的配置）
+    # python swift_core.py --watch：监视模式，新报文写完后几秒内更新当天输出，Ctrl+C 结束
+    run = run_swift_batch
+    if "--watch" in sys.argv:
+        run = watch_swift_folder
+        kwargs["status_callback"] = print
+    elif "--update-dw" in sys.argv:
+        import update_cp_swift
+        run = run_swift_pipeline
+        kwargs.update(dw_file=update_cp_swift.DW_FILE, dw_output_file=update_cp_swift.OUTPUT_FILE,
+                      status_callback=print)
+
+    # python swift_core.py --profile（或 SWIFT_PROFILE=1）：单进程跑并输出 pstats + 热点报告
+    if profiling_enabled(sys.argv):
+        kwargs["workers"] = 1
+        out, (pstats_path, report_path) = run_profiled(
+            run, DEFAULT_OUTPUT_FOLDER, **kwargs
+        )
+        print("性能剖析：", pstats_path)
+        print("热点报告：", report_path)
+    else:
+        try:
+            out = run(**kwargs)
+        except KeyboardInterrupt:
+            if run is not watch_swift_folder:
+                raise
+            out = None   # 监视模式用 Ctrl+C 结束
     print("输出文件：", out)
@@ -0,0 +1,370 @@
+
+# swift_corpus.py
+import os
+import random
+import struct
+
+
+# =========================
+# 合成 SWIFT 报文语料（性能基准 / 回归对比用）
+# =========================
+# 模板按 报文1（IN）/ 报文2（OUT）的排版生成：头部 + tag 段 + MESSAGE HISTORY [+ AUDIT]。
+# 同一个 seed 生成的语料完全一致，不同机器、不同版本之间的基准结果可以直接对比。
+CURRENCIES = ("USD", "EUR")
+ORDERING_TAGS = ("50K", "50F")
+BENEFICIARY_TAGS = ("59", "59F", "59K")
+
+BANKS = [
+    ("SCBL-HK-HH", ["STANDARD CHARTERED BANK HONG KONG", "LTD", "4 4A DES VOEUX ROAD", "HONG KONG HONG KONG"]),
+    ("SGAB-CH-ZZ", ["SOCIETE GENERALE", "ZURICH BRANCH", "PO BOX 1928 TALACKER 50", "CH 8021 ZURICH"]),
+    ("INGB-CN-SH", ["ING BANK NV SHANGHAI BRANCH", "SHANGHAI WORLD FINANCIAL CENTER F19",
+                    "100 CENTURY AVE PUDONG NA", "CHINA 200120 SHANGHAI"]),
+    ("CHAS-US-33", ["JPMORGAN CHASE BANK, N.A.", "383 MADISON AVENUE", "USA NY 10179 NEW YORK"]),
+    ("DEUT-DE-FF", ["DEUTSCHE BANK AG", "TAUNUSANLAGE 12", "DE 60325 FRANKFURT AM MAIN"]),
+    ("BNPA-FR-PP", ["BNP PARIBAS", "16 BOULEVARD DES ITALIENS", "FR 75009 PARIS"]),
+]
+
+CUSTOMERS = [
+    ("TRAFIGURA PTE LTD", "10 COLLYER QUAY", "SG 049315 SINGAPORE"),
+    ("GLENCORE CHINA LTD", "1 HUAIHAI ROAD", "CN 200021 SHANGHAI"),
+    ("JIANGXI COPPER LOYAL SKY INDUSTRIA+", "Room 4501, Floor 45, Convention", "/HK,Hong Kong"),
+    ("MERCURIA ENERGY TRADING SA", "RUE DU RHONE 50", "CH 1204 GENEVA"),
+    ("VITOL ASIA PTE LTD", "260 ORCHARD ROAD", "SG 238855 SINGAPORE"),
+    ("COSCO SHIPPING LINES CO LTD", "378 DONG DA MING ROAD", "CN 200080 SHANGHAI"),
+]
+
+HISTORY_ENTRIES = [
+    ("INFO", "99999100 Swift Translator Call Success.", "IRM209003;0001",
+     "CBPR_FinPlus;MX_to_MT;Pacs008_to_MT103_EMS."),
+    ("INFO", "20901000 BO - IRM --> Correct", "IASA : BO - IRM -> CORRECT", ""),
+    ("WARN", "04808133 Validation of the MX message", " REVISION Upd:  to 2.0.10", "successfully."),
+    ("INFO", "10901000 LAU KEY is correct.", "CORRECT", ""),
+]
+
+
+def _amount_text(rnd: random.Random) -> str:
+    """欧式金额格式：6.670.684,07"""
+    value = rnd.randint(100, 999_999_999) / 100
+    whole, frac = f"{value:,.2f}".split(".")
+    return whole.replace(",", ".") + "," + frac
+
+
+def _account(rnd: random.Random, ccy: str) -> str:
+    if ccy == "EUR" or rnd.random() < 0.3:
+        return "CH" + "".join(rnd.choice("0123456789") for _ in range(19))
+    return "".join(rnd.choice("0123456789") for _ in range(rnd.randint(8, 12)))
+
+
+def _bank_block(tag: str, title: str, bank) -> list[str]:
+    bic, lines = bank
+    return [f" {tag:<4}:    {title}", f"          {bic}"] + [f"          * {s}" for s in lines]
+
+
+def _ordering_block(tag: str, acct: str, customer) -> list[str]:
+    name, street, city = customer
+    out = [f" {tag:<4}:    Ordering Customer"]
+    if tag == "50F":
+        out += [f"          /{acct}", f"          1/{name}", f"          2/{street}", f"          3/{city}"]
+    else:
+        out += [f"          {acct}", f"          {name}", f"          {street}", f"          {city}"]
+    return out
+
+
+def _beneficiary_block(rnd, tag: str, acct: str, customer) -> list[str]:
+    name, street, city = customer
+    out = [f" {tag:<4}:    Beneficiary"]
+    if tag == "59F":
+        out += [f"          /{acct}", f"          1/{name}", f"          2/{street}", f"          3/{city}"]
+    elif tag == "59K":
+        out += [f"          /{acct}", f"          {name}", f"          {street}", f"          {city}"]
+    else:
+        out += [f"          {acct}", f"          {name}"]
+        if acct.startswith("CH") and rnd.random() < 0.5:
+            out.append(f"          IBAN: {acct}")
+        else:
+            out.append(f"          {city}")
+    return out
+
+
+def _history(rnd: random.Random, date: str, n_entries: int, with_audit: bool) -> list[str]:
+    sep = " " + "-" * 71
+    out = ["", "-- MESSAGE HISTORY", sep]
+    for i in range(n_entries):
+        typ, info, extra, more = HISTORY_ENTRIES[i % len(HISTORY_ENTRIES)]
+        out += [
+            f"          Start Date : {date}  Time : {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{i % 60:02d}",
+            f"          Type of history : {typ}",
+            "          Msg : MX1031   Block : @HDRMX",
+            f"          Error/Info : {info}",
+            f"          Additional info. : {extra}",
+        ]
+        if more:
+            out.append(f"          {more}")
+        out.append(sep)
+    if with_audit:
+        out += [
+            "", "-- MESSAGE AUDIT AND/OR NOTES", sep,
+            f"          Start Date : {date}  Time : 12:08:47",
+            "          Operator Identification : CNUJ65XY - Operator",
+            "          Operator Branch : 399",
+            "          Text Intervention : Message Approval",
+            sep,
+        ]
+    return out
+
+
+def generate_message(
+    rnd: random.Random,
+    direction: str,        # "IN" / "OUT"
+    ccy: str,              # "USD" / "EUR"
+    ordering_tag: str,     # "50K" / "50F"
+    beneficiary_tag: str,  # "59" / "59F" / "59K"
+    history_entries: int = 5,
+    with_audit: bool = False,
+) -> str:
+    day = f"{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/2025"
+    amount = _amount_text(rnd)
+    ord_cust, bene_cust = rnd.sample(CUSTOMERS, 2)
+    ord_bank, bene_bank = rnd.sample(BANKS, 2)
+    ord_acct = _account(rnd, ccy)
+    bene_acct = _account(rnd, ccy)
+    ref = f"{rnd.randint(10**11, 10**12 - 1)}"
+
+    lines = [
+        f" Message          : {ref}",
+        f" Reference/Ver    : {rnd.randint(100000, 999999)}_1-00",
+        " Message Type     : pacs.008.001.08 (MX1031)",
+        "                     Customer payment",
+        " Priority         : Normal  01",
+    ]
+    if direction == "OUT":
+        lines += [
+            " Input Seq No     : 000000001",
+            " Service code     : swift.finplus",
+            f" Status Of Msg    : Acked By S.W.I.F.T. FIN  at 12:09 {day}",
+            " DESTINATION : " + bene_bank[1][0],
+        ]
+    else:
+        lines += [
+            f" Output Seq No    : {rnd.randint(1, 999999):09d}",
+            " Service code     : swift.finplus",
+            f" Status Of Msg    : Sent To GBS 399 PAY at 16:03 {day}",
+            " Sender : " + ord_bank[1][0],
+        ]
+    lines += ["          " + s for s in ord_bank[1][1:3]]
+
+    lines += [
+        " 20  :    Sender's Reference",
+        f"          TFS{rnd.randint(10**9, 10**10 - 1)}",
+        " 23B :    Identification Of The Option",
+        "          CRED",
+        " 32A :    Date and Amount",
+        f"          {day}",
+        f"          {ccy} {amount}  (011)",
+        " 33B :    Currency/instructed Amount",
+        f"          {ccy} {amount}  (011)",
+    ]
+    lines += _ordering_block(ordering_tag, ord_acct, ord_cust)
+    lines += _bank_block("52A", "Ordering Institution", ord_bank)
+    if rnd.random() < 0.5:
+        lines += _bank_block("56A", "Intermediary Institution", rnd.choice(BANKS))
+    lines += _bank_block("57A", "Account With Institution", bene_bank)
+    lines += _beneficiary_block(rnd, beneficiary_tag, bene_acct, bene_cust)
+    lines += [
+        " 70  :    Remittance Information",
+        f"          /ROC/{rnd.randint(10**5, 10**6 - 1)}",
+        " 71A :    Details Of Charges",
+        "          SHA",
+        " 72  :    Sender To Receiver Information",
+        f"          /BNF/REF{rnd.randint(10**6, 10**7 - 1)}",
+        " " + "-" * 71,
+    ]
+    lines += _history(rnd, day, history_entries, with_audit)
+    return "\n".join(lines) + "\n"
+
+
+def generate_corpus(
+    folder: str,
+    n_files: int,
+    seed: int = 0,
+    ole_ratio: float = 0.0,     # 多少比例写成 Outlook .msg（OLE），其余为文本导出
+    max_history: int = 40,      # MESSAGE HISTORY 条数在 0..max_history 之间随机
+) -> list[str]:
+    """
+    在 folder 下生成 n_files 个 .msg，方向/币种/50K-50F/59-59F-59K 组合轮流覆盖，
+    返回文件路径（按文件名排序）。
+    """
+    rnd = random.Random(seed)
+    combos = [
+        (d, c, o, b)
+        for d in ("IN", "OUT") for c in CURRENCIES
+        for o in ORDERING_TAGS for b in BENEFICIARY_TAGS
+    ]
+    os.makedirs(folder, exist_ok=True)
+
+    paths = []
+    for i in range(n_files):
+        direction, ccy, o_tag, b_tag = combos[i % len(combos)]
+        text = generate_message(
+            rnd, direction, ccy, o_tag, b_tag,
+            history_entries=rnd.randint(0, max_history),
+            with_audit=rnd.random() < 0.3,
+        )
+        path = os.path.join(folder, f"{i:06d}_{direction}_{ccy}.msg")
+        if rnd.random() < ole_ratio:
+            data = build_ole_msg(text, f"SWIFT {direction} {ccy} {i}")
+        else:
+            data = text.encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+# =========================
+# 生成 Outlook .msg（OLE 复合文档，v3 / 512 字节扇区）
+# =========================
+_ENDOFCHAIN = 0xFFFFFFFE
+_FREESECT = 0xFFFFFFFF
+_FATSECT = 0xFFFFFFFD
+_NOSTREAM = 0xFFFFFFFF
+
+
+def _prop_stream(tag: int, data: bytes) -> tuple:
+    return (f"__substg1.0_{tag:08X}", data)
+
+
+def build_ole_msg(body: str, subject: str, attachment_size: int = 0) -> bytes:
+    """
+    生成最小可用的 Outlook .msg：正文/主题/消息类型属性流 + 属性表，
+    attachment_size>0 时再加一个附件存储（模拟带附件的邮件，读取器应跳过它）。
+    """
+    def props(entries):
+        out = b""
+        for tag, size in entries:
+            out += struct.pack("<IIQ", tag, 0x6, size)
+        return out
+
+    # 字符串流本身不带结尾 \x00，属性表里的长度含结尾 2 字节（与 Outlook 一致）
+    body_b = body.encode("utf-16-le")
+    subj_b = subject.encode("utf-16-le")
+    cls_b = "IPM.Note".encode("utf-16-le")
+    root = [
+        _prop_stream(0x1000001F, body_b),
+        _prop_stream(0x0037001F, subj_b),
+        _prop_stream(0x001A001F, cls_b),
+        ("__properties_version1.0",
+         bytes(32) + props([(0x1000001F, len(body_b) + 2), (0x0037001F, len(subj_b) + 2),
+                            (0x001A001F, len(cls_b) + 2)])),
+        ("__nameid_version1.0", [
+            ("__substg1.0_00020102", b""),
+            ("__substg1.0_00030102", b""),
+            ("__substg1.0_00040102", b""),
+        ]),
+    ]
+    if attachment_size:
+        blob = bytes(range(256)) * (attachment_size // 256 + 1)
+        root.append(("__attach_version1.0_#00000000", [
+            _prop_stream(0x37010102, blob[:attachment_size]),
+            ("__properties_version1.0", bytes(8) + props([(0x37010102, attachment_size)])),
+        ]))
+    return _build_cfb(root)
+
+
+def _build_cfb(tree: list) -> bytes:
+    sector, mini, cutoff = 512, 64, 4096
+
+    # 目录项扁平化：(name, type, data, children_ids)
+    entries = [["Root Entry", 5, b"", []]]
+
+    def add(items, parent):
+        for name, val in items:
+            idx = len(entries)
+            if isinstance(val, list):
+                entries.append([name, 1, b"", []])
+                add(val, idx)
+            else:
+                entries.append([name, 2, val, []])
+            entries[parent][3].append(idx)
+    add(tree, 0)
+
+    # 小流进 mini stream，大流占普通扇区
+    ministream = bytearray()
+    minifat = []
+    starts = {}
+    big_streams = []
+    for i, (name, typ, data, _) in enumerate(entries):
+        if typ != 2 or not data:
+            starts[i] = _ENDOFCHAIN
+            continue
+        if len(data) < cutoff:
+            first = len(ministream) // mini
+            n = (len(data) + mini - 1) // mini
+            minifat.extend(range(first + 1, first + n))
+            minifat.append(_ENDOFCHAIN)
+            ministream += data + bytes(n * mini - len(data))
+            starts[i] = first
+        else:
+            big_streams.append(i)
+
+    fat = []
+    blobs = []
+
+    def alloc(data: bytes) -> int:
+        n = max(1, (len(data) + sector - 1) // sector)
+        first = len(fat)
+        fat.extend(range(first + 1, first + n))
+        fat.append(_ENDOFCHAIN)
+        blobs.append(data + bytes(n * sector - len(data)))
+        return first
+
+    for i in big_streams:
+        starts[i] = alloc(entries[i][2])
+    root_start = alloc(bytes(ministream)) if ministream else _ENDOFCHAIN
+    minifat_raw = struct.pack(f"<{len(minifat)}I", *minifat)
+    minifat_start = alloc(minifat_raw) if minifat else _ENDOFCHAIN
+    n_minifat = (len(minifat_raw) + sector - 1) // sector
+
+    def sort_key(i):
+        name = entries[i][0]
+        return (len(name), name.upper())
+
+    # 兄弟节点串成右链（读取方只需遍历，不校验红黑平衡）
+    child, right = {}, {}
+    for i, (_, _, _, children) in enumerate(entries):
+        kids = sorted(children, key=sort_key)
+        child[i] = kids[0] if kids else _NOSTREAM
+        for a, b in zip(kids, kids[1:]):
+            right[a] = b
+
+    dir_raw = bytearray()
+    for i, (name, typ, data, _) in enumerate(entries):
+        name_b = (name.encode("utf-16-le") + b"\x00\x00")[:64]
+        if typ == 5:
+            start, size = root_start, len(ministream)
+        elif typ == 2:
+            start, size = starts[i], len(data)
+        else:
+            start, size = 0, 0
+        dir_raw += name_b + bytes(64 - len(name_b))
+        dir_raw += struct.pack("<HBB3I", len(name_b), typ, 1, _NOSTREAM, right.get(i, _NOSTREAM), child[i])
+        dir_raw += bytes(16 + 4 + 16) + struct.pack("<IQ", start, size)
+    dir_start = alloc(bytes(dir_raw))
+
+    # FAT 扇区本身也要占位
+    n_fat = 1
+    while (len(fat) + n_fat) > n_fat * (sector // 4):
+        n_fat += 1
+    fat_first = len(fat)
+    fat.extend([_FATSECT] * n_fat)
+    fat.extend([_FREESECT] * (n_fat * (sector // 4) - len(fat)))
+    fat_raw = struct.pack(f"<{len(fat)}I", *fat)
+
+    difat = list(range(fat_first, fat_first + n_fat)) + [_FREESECT] * (109 - n_fat)
+    header = (
+        b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1" + bytes(16)
+        + struct.pack("<HHHHH", 0x3E, 3, 0xFFFE, 9, 6) + bytes(6)
+        + struct.pack("<9I", 0, n_fat, dir_start, 0, cutoff, minifat_start, n_minifat, _ENDOFCHAIN, 0)
+        + struct.pack("<109I", *difat)
+    )
+    return header + b"".join(blobs) + fat_raw
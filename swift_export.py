@@ -0,0 +1,175 @@
+
+# swift_export.py
+import csv
+import os
+
+
+# =========================
+# 列式/文本输出：CSV、Parquet
+# =========================
+# 所有列固定为字符串（空值写空串），每次运行 schema 一致，下游可直接按固定 dtype 读取。
+SUPPORTED_FORMATS = ("xlsx", "csv", "parquet")
+
+# Parquet 每攒多少行写一个 row group（内存只保留这一批）
+PARQUET_BATCH_ROWS = 10000
+
+
+def normalize_formats(formats) -> list[str]:
+    """'xlsx,csv' / ['xlsx', 'parquet'] -> 去重后的小写列表；不支持的格式直接报错。"""
+    if isinstance(formats, str):
+        formats = formats.split(",")
+    out = []
+    for f in formats:
+        f = f.strip().lower().lstrip(".")
+        if not f:
+            continue
+        if f not in SUPPORTED_FORMATS:
+            raise ValueError(f"不支持的输出格式：{f}；可选：{', '.join(SUPPORTED_FORMATS)}")
+        if f not in out:
+            out.append(f)
+    if not out:
+        raise ValueError("至少需要一种输出格式")
+    return out
+
+
+def _as_text(v) -> str:
+    return "" if v is None else str(v)
+
+
+class CsvTableWriter:
+    """逐行写 CSV（utf-8-sig，Excel 直接打开不乱码）。"""
+
+    def __init__(self, path: str, columns: list[str]):
+        self.path = path
+        self.columns = list(columns)
+        self._tmp = path + ".tmp"
+        self._f = open(self._tmp, "w", newline="", encoding="utf-8-sig")
+        self._w = csv.writer(self._f)
+        self._w.writerow(self.columns)
+
+    def append(self, values):
+        self._w.writerow([_as_text(v) for v in values])
+
+    def close(self):
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+    def discard(self):
+        self._f.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class ParquetTableWriter:
+    """按批写 Parquet，schema 全部为 string。需要 pyarrow（pip install pyarrow）。"""
+
+    def __init__(self, path: str, columns: list[str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("输出 Parquet 需要 pyarrow：pip install pyarrow")
+
+        self._pa = pa
+        self.path = path
+        self.columns = list(columns)
+        self._tmp = path + ".tmp"
+        self._schema = pa.schema([(c, pa.string()) for c in self.columns])
+        self._writer = pq.ParquetWriter(self._tmp, self._schema)
+        self._batch = [[] for _ in self.columns]
+
+    def append(self, values):
+        for col, v in zip(self._batch, values):
+            col.append(_as_text(v))
+        if len(self._batch[0]) >= PARQUET_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self._batch[0]:
+            return
+        arrays = [self._pa.array(col, type=self._pa.string()) for col in self._batch]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+        self._batch = [[] for _ in self.columns]
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        os.replace(self._tmp, self.path)
+
+    def discard(self):
+        self._writer.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def open_table_writer(fmt: str, path: str, columns: list[str]):
+    if fmt == "csv":
+        return CsvTableWriter(path, columns)
+    if fmt == "parquet":
+        return ParquetTableWriter(path, columns)
+    raise ValueError(f"不支持的表格输出格式：{fmt}")
+
+
+def append_table_rows(fmt: str, path: str, columns: list[str], rows: list):
+    """
+    在已有的输出表末尾追加行，不重写已有记录（监视模式用）：
+    - csv：直接续写；写到一半出错时截回原来的长度
+    - parquet：文件尾部是元数据，不能原地续写；已有数据按列整块读回（Arrow，不逐行转换），
+      接上新的一批后写到临时文件再替换
+    文件不存在（例如被手动删除）时抛 FileNotFoundError，由调用方改为整表重写。
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    if not rows:
+        return
+    if fmt == "csv":
+        size = os.path.getsize(path)
+        try:
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                for values in rows:
+                    w.writerow([_as_text(v) for v in values])
+        except BaseException:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+            raise
+        return
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(c, pa.string()) for c in columns])
+        old = pq.read_table(path, schema=schema)
+        new = pa.Table.from_arrays(
+            [pa.array([_as_text(values[i]) for values in rows], type=pa.string()) for i in range(len(columns))],
+            schema=schema,
+        )
+        tmp = path + ".tmp"
+        try:
+            with pq.ParquetWriter(tmp, schema) as writer:
+                writer.write_table(old)
+                writer.write_table(new)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return
+    raise ValueError(f"不支持的表格输出格式：{fmt}")
@@ -0,0 +1,148 @@
+
+# swift_metrics.py
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+# =========================
+# 运行指标：分阶段墙钟/CPU 时间、文件数、字节数、吞吐
+# =========================
+# 并行解析时 read / parse 由各 worker 逐文件计时后汇总，
+# 因此这两个阶段的时间是“所有进程合计”，可能大于整体墙钟时间。
+STAGE_LABELS = {
+    "list": "列目录",
+    "mapping": "Mapping",
+    "cache": "缓存",
+    "read": "读取",
+    "parse": "解析",
+    "map": "PRIM ID",
+    "write": "写出",
+    "callback": "回调",
+    "read_step3": "读Step3",
+    "read_dw": "读DW",
+    "load_dw_index": "载入DW索引",
+    "index": "建索引",
+    "match": "匹配",
+    "write_unmatched": "未匹配表",
+    "save": "保存",
+}
+
+
+class StageStats:
+    __slots__ = ("wall", "cpu", "calls", "files", "bytes", "records")
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.calls = 0
+        self.files = 0
+        self.bytes = 0
+        self.records = 0
+
+    def to_dict(self) -> dict:
+        d = {
+            "wall_s": round(self.wall, 4),
+            "cpu_s": round(self.cpu, 4),
+            "calls": self.calls,
+        }
+        if self.files:
+            d["files"] = self.files
+        if self.bytes:
+            d["bytes"] = self.bytes
+        if self.records:
+            d["records"] = self.records
+            d["records_per_s"] = round(self.records / self.wall, 1) if self.wall > 0 else 0.0
+        return d
+
+
+class RunMetrics:
+    """
+    一次运行的指标：
+        m = RunMetrics("swift_batch")
+        with m.stage("mapping"):
+            ...
+        m.add("read", wall=0.01, cpu=0.01, files=1, nbytes=4096)
+        m.finish(records=n)
+        m.write_json(path)
+    同名阶段多次计时会累加（例如逐文件的写出）。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: dict[str, StageStats] = {}
+        self.counters: dict[str, int] = {}
+        self.records = 0
+        self._t0 = time.perf_counter()
+        self._c0 = time.process_time()
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def _get(self, name: str) -> StageStats:
+        st = self.stages.get(name)
+        if st is None:
+            st = self.stages[name] = StageStats()
+        return st
+
+    def add(self, name: str, wall: float = 0.0, cpu: float = 0.0,
+            files: int = 0, nbytes: int = 0, records: int = 0, calls: int = 1):
+        st = self._get(name)
+        st.wall += wall
+        st.cpu += cpu
+        st.calls += calls
+        st.files += files
+        st.bytes += nbytes
+        st.records += records
+
+    @contextmanager
+    def stage(self, name: str, files: int = 0, nbytes: int = 0, records: int = 0):
+        t0 = time.perf_counter()
+        c0 = time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0, time.process_time() - c0, files, nbytes, records)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self, records: int = 0):
+        self.records = records
+        self.wall = time.perf_counter() - self._t0
+        self.cpu = time.process_time() - self._c0
+
+    def to_dict(self) -> dict:
+        return {
+            "run": self.name,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "wall_s": round(self.wall, 4),
+            "cpu_s": round(self.cpu, 4),
+            "records": self.records,
+            "records_per_s": round(self.records / self.wall, 1) if self.wall > 0 else 0.0,
+            "counters": dict(self.counters),
+            "stages": {k: v.to_dict() for k, v in self.stages.items()},
+        }
+
+    def summary(self) -> str:
+        """单行摘要：总耗时 | 各阶段耗时 | 条/秒"""
+        parts = [f"总耗时 {self.wall:.2f}s"]
+        for name, st in self.stages.items():
+            parts.append(f"{STAGE_LABELS.get(name, name)} {st.wall:.2f}s")
+        if self.records and self.wall > 0:
+            parts.append(f"{self.records / self.wall:.0f} 条/秒")
+        return " | ".join(parts)
+
+    def write_json(self, path: str):
+        """写入失败（例如输出目录只读）不影响主流程，返回是否写入成功。"""
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            return True
+        except OSError:
+            return False
+
+
+def metrics_path_for(output_path: str) -> str:
+    """输出文件旁边的指标文件：xxx.xlsx -> xxx_metrics.json（传不带扩展名的输出前缀 xxx 同样得到 xxx_metrics.json）"""
+    return os.path.splitext(output_path)[0] + "_metrics.json"
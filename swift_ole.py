@@ -0,0 +1,166 @@
+
+# swift_ole.py
+import io
+import struct
+
+
+# =========================
+# 极简 OLE 复合文档（CFB）读取：只取 Outlook .msg 顶层的正文/主题流
+# =========================
+# extract_msg 会解析整个属性树、附件和收件人；这里只按需读几个扇区：
+# 文件头 -> FAT -> 目录 -> 正文/主题流。读不到时返回 None，由调用方回退到 extract_msg。
+OLE_MAGIC = b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1"
+
+ENDOFCHAIN = 0xFFFFFFFE
+FREESECT = 0xFFFFFFFF
+NOSTREAM = 0xFFFFFFFF
+
+# MAPI 属性流：PR_BODY / PR_SUBJECT，001F = Unicode，001E = ANSI
+BODY_STREAMS = ("__substg1.0_1000001F", "__substg1.0_1000001E")
+SUBJECT_STREAMS = ("__substg1.0_0037001F", "__substg1.0_0037001E")
+
+ANSI_ENCODING = "cp1252"
+
+
+class OleFormatError(Exception):
+    pass
+
+
+class _CompoundFile:
+    def __init__(self, f):
+        self.f = f
+        hdr = f.read(512)
+        if len(hdr) < 512 or not hdr.startswith(OLE_MAGIC):
+            raise OleFormatError("不是 OLE 复合文档")
+
+        (self.sector_shift, self.mini_shift) = struct.unpack_from("<HH", hdr, 0x1E)
+        self.sector_size = 1 << self.sector_shift
+        self.mini_size = 1 << self.mini_shift
+        (n_fat, self.dir_start, _, self.mini_cutoff,
+         self.minifat_start, n_minifat, difat_start, n_difat) = struct.unpack_from("<8I", hdr, 0x2C)
+
+        # DIFAT：头部 109 项 + 后续 DIFAT 扇区链
+        fat_sectors = [s for s in struct.unpack_from("<109I", hdr, 0x4C) if s not in (FREESECT, ENDOFCHAIN)]
+        per = self.sector_size // 4 - 1
+        sect = difat_start
+        for _ in range(n_difat):
+            if sect in (FREESECT, ENDOFCHAIN):
+                break
+            entries = struct.unpack(f"<{per + 1}I", self._sector(sect))
+            fat_sectors.extend(s for s in entries[:per] if s not in (FREESECT, ENDOFCHAIN))
+            sect = entries[per]
+        fat_sectors = fat_sectors[:n_fat]
+
+        fat = bytearray()
+        for s in fat_sectors:
+            fat += self._sector(s)
+        self.fat = struct.unpack(f"<{len(fat) // 4}I", fat)
+
+        self.entries = self._read_directory()
+        self._minifat = None
+        self._ministream_chain = None
+        self._ministream_cache = {}
+
+    def _sector(self, sect: int) -> bytes:
+        self.f.seek((sect + 1) << self.sector_shift)
+        return self.f.read(self.sector_size)
+
+    def _chain(self, start: int, table) -> list[int]:
+        out = []
+        sect = start
+        limit = len(table)
+        while sect != ENDOFCHAIN:
+            if sect >= limit or len(out) > limit:
+                raise OleFormatError("扇区链损坏")
+            out.append(sect)
+            sect = table[sect]
+        return out
+
+    def _read_directory(self) -> list[tuple]:
+        raw = b"".join(self._sector(s) for s in self._chain(self.dir_start, self.fat))
+        entries = []
+        for off in range(0, len(raw) - 127, 128):
+            name_len, obj_type = struct.unpack_from("<HB", raw, off + 0x40)
+            left, right, child = struct.unpack_from("<3I", raw, off + 0x44)
+            start, size = struct.unpack_from("<IQ", raw, off + 0x74)
+            if self.sector_size == 512:
+                size &= 0xFFFFFFFF   # v3 文件高 32 位无意义
+            name = raw[off:off + max(name_len - 2, 0)].decode("utf-16-le", errors="ignore")
+            entries.append((name, obj_type, left, right, child, start, size))
+        if not entries:
+            raise OleFormatError("目录为空")
+        return entries
+
+    def root_streams(self) -> dict[str, tuple]:
+        """根存储下的直接子项（不进入附件/收件人子存储）：name -> entry"""
+        out = {}
+        stack = [self.entries[0][4]]
+        seen = set()
+        while stack:
+            i = stack.pop()
+            if i == NOSTREAM or i in seen or i >= len(self.entries):
+                continue
+            seen.add(i)
+            e = self.entries[i]
+            if e[1] == 2:
+                out[e[0]] = e
+            stack.append(e[2])
+            stack.append(e[3])
+        return out
+
+    def read_stream(self, entry) -> bytes:
+        start, size = entry[5], entry[6]
+        if size == 0:
+            return b""
+        if size < self.mini_cutoff:
+            return self._read_mini(start, size)
+        data = b"".join(self._sector(s) for s in self._chain(start, self.fat))
+        return data[:size]
+
+    def _read_mini(self, start: int, size: int) -> bytes:
+        if self._minifat is None:
+            raw = b"".join(self._sector(s) for s in self._chain(self.minifat_start, self.fat))
+            self._minifat = struct.unpack(f"<{len(raw) // 4}I", raw)
+            self._ministream_chain = self._chain(self.entries[0][5], self.fat)
+
+        out = bytearray()
+        per_sector = self.sector_size // self.mini_size
+        for ms in self._chain(start, self._minifat):
+            # 同一个大扇区里的多个 mini 扇区只读一次
+            big = self._ministream_chain[ms // per_sector]
+            data = self._ministream_cache.get(big)
+            if data is None:
+                data = self._ministream_cache[big] = self._sector(big)
+            off = (ms % per_sector) * self.mini_size
+            out += data[off:off + self.mini_size]
+        return bytes(out[:size])
+
+
+def _decode_prop(name: str, data: bytes) -> str:
+    if name.endswith("001F"):
+        return data.decode("utf-16-le", errors="ignore").rstrip("\x00")
+    return data.decode(ANSI_ENCODING, errors="ignore").rstrip("\x00")
+
+
+def read_msg_body_subject(path: str, data: bytes = None):
+    """
+    返回 (body, subject)；文件不是 OLE、没有正文流或结构损坏时返回 None。
+    Unicode 流优先，ANSI 次之。data 为已读进内存的文件内容时直接从内存取，不再打开 path。
+    """
+    try:
+        with open(path, "rb") if data is None else io.BytesIO(data) as f:
+            cf = _CompoundFile(f)
+            streams = cf.root_streams()
+
+            def first(names):
+                for n in names:
+                    if n in streams:
+                        return _decode_prop(n, cf.read_stream(streams[n]))
+                return None
+
+            body = first(BODY_STREAMS)
+            if body is None:
+                return None
+            return body, first(SUBJECT_STREAMS) or ""
+    except (OleFormatError, struct.error, OSError, IndexError):
+        return None
@@ -0,0 +1,109 @@
+
+# swift_profile.py
+import io
+import os
+import sys
+from datetime import datetime
+
+
+# =========================
+# 性能剖析（cProfile）：慢文件夹时把 pstats + 热点报告发给开发
+# =========================
+# 开启方式：swift_core.py --profile / 环境变量 SWIFT_PROFILE=1（GUI 同样适用）。
+# 未开启时只做一次开关判断，cProfile / pstats 都不会被导入。
+PROFILE_ENV = "SWIFT_PROFILE"
+PROFILE_FLAG = "--profile"
+DEFAULT_TOP_N = 30
+
+# 报告里单独列出的本项目模块（其余是标准库 / 第三方）：按本文件所在目录取，新增模块不用再改名单
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def profiling_enabled(argv=None) -> bool:
+    argv = sys.argv if argv is None else argv
+    return PROFILE_FLAG in argv or os.environ.get(PROFILE_ENV, "").strip() not in ("", "0")
+
+
+def project_modules() -> set:
+    """
+    本项目模块名：目录里的 .py 文件，加上已导入、且从这个目录加载的模块。
+    打包成 exe 后目录里没有 .py，只能靠后者。
+    """
+    try:
+        names = {os.path.splitext(fn)[0] for fn in os.listdir(PROJECT_DIR) if fn.endswith(".py")}
+    except OSError:
+        names = set()
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) == PROJECT_DIR:
+            names.add(name)
+    return names
+
+
+def _is_project_func(key, modules) -> bool:
+    filename = os.path.basename(key[0])
+    return os.path.splitext(filename)[0] in modules
+
+
+def _stats_text(stats, sort_key: str, top_n: int) -> str:
+    buf = io.StringIO()
+    stats.stream = buf
+    stats.sort_stats(sort_key).print_stats(top_n)
+    return buf.getvalue()
+
+
+def write_profile_report(profiler, output_dir: str, top_n: int = DEFAULT_TOP_N) -> tuple:
+    """写出 .pstats（可用 snakeviz / pstats 打开）和文本热点报告，返回两个路径。"""
+    import pstats
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(output_dir, f"{stamp}_swift_profile")
+    pstats_path = base + ".pstats"
+    report_path = base + ".txt"
+
+    profiler.dump_stats(pstats_path)
+    stats = pstats.Stats(pstats_path)
+
+    # 本项目函数按自身耗时排序：正则 / 切分 / 写出等热点一眼可见
+    modules = project_modules()
+    project = sorted(
+        ((k, v) for k, v in stats.stats.items() if _is_project_func(k, modules)),
+        key=lambda kv: kv[1][2], reverse=True,
+    )[:top_n]
+    lines = [
+        f"SWIFT 批处理性能剖析  {stamp}",
+        f"总耗时 {stats.total_tt:.3f}s，函数调用 {stats.total_calls} 次",
+        "",
+        f"== 本项目函数 Top {top_n}（按自身耗时 tottime）==",
+        f"{'tottime':>9} {'cumtime':>9} {'calls':>10}  function",
+    ]
+    for (filename, lineno, func), (cc, nc, tt, ct, _) in project:
+        lines.append(f"{tt:>9.3f} {ct:>9.3f} {nc:>10}  {os.path.basename(filename)}:{lineno}({func})")
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n\n")
+        f.write(f"== 全部函数 Top {top_n}（按累计耗时 cumulative）==\n")
+        f.write(_stats_text(stats, "cumulative", top_n))
+        f.write(f"\n== 全部函数 Top {top_n}（按自身耗时 tottime）==\n")
+        f.write(_stats_text(stats, "tottime", top_n))
+
+    return pstats_path, report_path
+
+
+def run_profiled(func, output_dir: str, *args, top_n: int = DEFAULT_TOP_N, **kwargs):
+    """
+    在 cProfile 下执行 func(*args, **kwargs)，返回 (结果, (pstats 路径, 报告路径))。
+    只统计当前进程：多进程解析时 worker 内的耗时不可见，剖析时应使用 workers=1。
+    func 抛异常时也会写出已采集的部分，再把异常继续抛出。
+    """
+    import cProfile
+
+    os.makedirs(output_dir, exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        paths = write_profile_report(profiler, output_dir, top_n)
+    return result, paths
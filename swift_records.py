@@ -0,0 +1,310 @@
+
+# swift_records.py
+import heapq
+from array import array
+
+
+# =========================
+# 列式记录存储：批量持有解析结果时替代“每条一个 dict”
+# =========================
+# 每列一个数组；取值重复度高的列（币种、方向、SWIFT、银行名、PRIM ID、日期、客户账号、错误）
+# 存成“分类编码 + 类别表”，同一个值只保留一份字符串，每条记录只占 4 字节编码。
+# 流式写出（run_swift_batch）逐条写、不留记录，所以不用它；需要把整批记录留在内存里时使用（GUI 结果表）。
+RECORD_COLS = [
+    "FILE", "Client Acct", "PRIM ID", "DATE", "CCY", "AMT",
+    "CP NAME", "CP A/C", "CP SWIFT", "CP BANK NAME", "DIRECTION", "ERROR",
+]
+
+CATEGORICAL_COLS = {
+    "Client Acct", "PRIM ID", "DATE", "CCY", "CP SWIFT", "CP BANK NAME", "DIRECTION", "ERROR",
+}
+
+# Step3_Final 规则的唯一定义（swift_core 从这里导入）：关键列任一非空才进入 Step3_Final；
+# 逐条（is_step3_valid）和按列（RecordStore.valid_mask，追加时维护的非空标记）都用 _nonblank 判断
+STEP3_KEY_COLS = ["Client Acct", "DATE", "CCY", "AMT", "CP A/C", "CP SWIFT"]
+
+
+def _nonblank(v) -> bool:
+    """None / 空串 / 纯空格都算空（RecordStore 把 None 存成 ""）"""
+    return v is not None and str(v).strip() != ""
+
+
+def is_step3_valid(rec: dict) -> bool:
+    """关键列至少有一个非空，才进入 Step3_Final（逐条；整批见 RecordStore.valid_mask）。"""
+    return any(_nonblank(rec.get(c)) for c in STEP3_KEY_COLS)
+
+
+class _CategoricalColumn:
+    __slots__ = ("codes", "categories", "_lookup", "_cat_nonblank", "mask")
+
+    def __init__(self):
+        self.codes = array("I")
+        self.categories: list[str] = []
+        self._lookup: dict[str, int] = {}
+        self._cat_nonblank = bytearray()   # 每个类别是否非空（新类别出现时判断一次）
+        self.mask = bytearray()            # 每条记录是否非空，追加时维护
+
+    def append(self, v: str):
+        code = self._lookup.get(v)
+        if code is None:
+            code = self._lookup[v] = len(self.categories)
+            self.categories.append(v)
+            self._cat_nonblank.append(_nonblank(v))
+        self.codes.append(code)
+        self.mask.append(self._cat_nonblank[code])
+
+    def __getitem__(self, i: int) -> str:
+        return self.categories[self.codes[i]]
+
+    def values(self) -> list[str]:
+        cats = self.categories
+        return [cats[c] for c in self.codes]
+
+    def nonblank(self) -> bytes:
+        """每条记录是否非空（追加时已记下，这里只是拷贝）"""
+        return bytes(self.mask)
+
+
+class _TextColumn:
+    __slots__ = ("data", "mask")
+
+    def __init__(self):
+        self.data: list[str] = []
+        self.mask = bytearray()
+
+    def append(self, v: str):
+        self.data.append(v)
+        self.mask.append(_nonblank(v))
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[i]
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def values(self) -> list[str]:
+        return list(self.data)
+
+    def nonblank(self) -> bytes:
+        return bytes(self.mask)
+
+
+def _or_masks(masks: list[bytes], n: int) -> bytes:
+    """逐字节 OR：转成大整数整体运算，不逐条循环。"""
+    acc = 0
+    for m in masks:
+        acc |= int.from_bytes(m, "big")
+    return acc.to_bytes(n, "big") if n else b""
+
+
+class RecordStore:
+    """
+    列式记录表：
+        store = RecordStore()
+        for rec in iter_swift_records(...):
+            store.append(rec)
+        final = store.select(store.valid_mask())   # Step3_Final
+        for row in final: ...                      # 逐行仍是 dict
+    值统一按字符串保存（None -> ""）。
+    """
+
+    def __init__(self, columns: list[str] = None):
+        self.columns = list(columns or RECORD_COLS)
+        self._cols = {
+            c: (_CategoricalColumn() if c in CATEGORICAL_COLS else _TextColumn())
+            for c in self.columns
+        }
+        self._n = 0
+
+    @classmethod
+    def from_records(cls, records, columns: list[str] = None) -> "RecordStore":
+        store = cls(columns)
+        store.extend(records)
+        return store
+
+    def append(self, rec: dict):
+        get = rec.get
+        for c, col in self._cols.items():
+            v = get(c)
+            col.append("" if v is None else str(v))
+        self._n += 1
+
+    def extend(self, records):
+        for rec in records:
+            self.append(rec)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        return {c: col[i] for c, col in self._cols.items()}
+
+    def __iter__(self):
+        names = self.columns
+        for values in zip(*(self._cols[c].values() for c in names)):
+            yield dict(zip(names, values))
+
+    def column(self, name: str) -> list[str]:
+        return self._cols[name].values()
+
+    def cell(self, i: int, name: str) -> str:
+        """第 i 条记录的一个字段（表格按需取值用，不构造 dict）"""
+        return self._cols[name][i]
+
+    def categories(self, name: str) -> list[str]:
+        """分类列出现过的取值（按首次出现顺序）；非分类列返回空列表"""
+        col = self._cols[name]
+        return list(col.categories) if isinstance(col, _CategoricalColumn) else []
+
+    def rows(self, columns: list[str]):
+        """按指定列顺序逐行产出 list（写表格用，不构造 dict）。"""
+        yield from zip(*(self._cols[c].values() for c in columns))
+
+    def valid_mask(self, key_cols: list[str] = None) -> bytes:
+        """Step3_Final 过滤：关键列至少一个非空 -> 1，否则 0（各列追加时维护的非空标记，用大整数合并）。"""
+        cols = [self._cols[c] for c in (key_cols or STEP3_KEY_COLS) if c in self._cols]
+        return _or_masks([col.nonblank() for col in cols], self._n)
+
+    def select(self, mask: bytes) -> "RecordStore":
+        out = RecordStore(self.columns)
+        keep = [i for i, m in enumerate(mask) if m]
+        for c, col in self._cols.items():
+            dst = out._cols[c]
+            for i in keep:
+                dst.append(col[i])
+        out._n = len(keep)
+        return out
+
+
+# =========================
+# 筛选 + 排序索引：只保存行号，不复制记录（GUI 表格按行号回 RecordStore 取值）
+# =========================
+def _amount_key(s: str) -> float:
+    """AMT 文本（'4,772,159.07'）按数值排序；空/无法解析的排在最前"""
+    try:
+        return float(s.replace(",", ""))
+    except ValueError:
+        return float("-inf")
+
+
+class RecordView:
+    """
+    RecordStore 上的一层视图：
+        view = RecordView(store)
+        view.set_filter(direction="IN", ccy="USD", missing_prim=True, errors_only=False)
+        view.set_sort("AMT", descending=True)
+        store.extend(batch); view.extend()     # 流式追加：只判断新来的记录
+        for r in range(len(view)): store.cell(view.rows[r], "FILE")
+    分类列的筛选先把条件换算成“允许的编码集合”，逐条只比较 4 字节编码；
+    排序键按类别只算一次（分类列），AMT 按数值逐条解析并随追加缓存，相同键保持到达顺序。
+    """
+
+    def __init__(self, store: RecordStore):
+        self.store = store
+        self.rows = array("I")
+        self._seen = 0
+        self.direction = None
+        self.ccy = None
+        self.missing_prim = False
+        self.errors_only = False
+        self.sort_col = None
+        self.descending = False
+        self._amount_keys: list[float] = []   # AMT 数值键，随记录追加增量计算
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def sorted(self) -> bool:
+        return self.sort_col is not None
+
+    def set_filter(self, direction: str = None, ccy: str = None,
+                   missing_prim: bool = False, errors_only: bool = False):
+        """direction / ccy 为 None 表示不限；空串表示该字段为空的记录"""
+        self.direction = direction
+        self.ccy = ccy
+        self.missing_prim = missing_prim
+        self.errors_only = errors_only
+        self.rebuild()
+
+    def set_sort(self, col: str = None, descending: bool = False):
+        """col 为 None 时取消排序，恢复到达顺序（行号即到达顺序）"""
+        self.sort_col = col
+        self.descending = descending
+        if col is None:
+            self.rows = array("I", sorted(self.rows))
+        else:
+            self._sort(self.rows)
+
+    def rebuild(self):
+        self.rows = array("I")
+        self._seen = 0
+        self.extend()
+
+    def extend(self) -> int:
+        """把 store 里新增的记录按当前筛选加入视图，返回加入的条数"""
+        new = self.take_new()
+        self.add(new)
+        return len(new)
+
+    def take_new(self) -> array:
+        """store 里新增、且通过当前筛选的行号（还没加入视图；表格模型先据此通知插入位置再 add）"""
+        start, end = self._seen, len(self.store)
+        self._seen = end
+        return self._matching(start, end) if start < end else array("I")
+
+    def add(self, new: array):
+        """排序时只把新来的一批排好，再与已有结果归并（每批一次线性归并），否则追加在末尾"""
+        if new and self.sorted:
+            key = self._sort_key()
+            new = sorted(new, key=key, reverse=self.descending)
+            # 相同键时已有的（先到的）排在前面，保持到达顺序
+            self.rows = array("I", heapq.merge(self.rows, new, key=key, reverse=self.descending))
+        else:
+            self.rows.extend(new)
+
+    def _allowed(self, name: str, pred):
+        col = self.store._cols[name]
+        return col.codes, {code for code, v in enumerate(col.categories) if pred(v)}
+
+    def _matching(self, start: int, end: int) -> array:
+        conds = []
+        if self.direction is not None:
+            conds.append(self._allowed("DIRECTION", lambda v, d=self.direction: v.strip() == d))
+        if self.ccy is not None:
+            conds.append(self._allowed("CCY", lambda v, c=self.ccy: v.strip() == c))
+        if self.missing_prim:
+            conds.append(self._allowed("PRIM ID", lambda v: not v.strip()))
+        if self.errors_only:
+            conds.append(self._allowed("ERROR", lambda v: bool(v.strip())))
+
+        candidates = range(start, end)
+        for codes, allowed in conds:
+            candidates = [i for i in candidates if codes[i] in allowed]
+        return array("I", candidates)
+
+    def _sort_key(self):
+        """行号 -> 排序键"""
+        col = self.store._cols[self.sort_col]
+        if isinstance(col, _CategoricalColumn):
+            # 类别按值排好后的名次就是排序键，逐条只查编码
+            cats, codes = col.categories, col.codes
+            rank = [0] * len(cats)
+            for r, code in enumerate(sorted(range(len(cats)), key=cats.__getitem__)):
+                rank[code] = r
+            return lambda i: rank[codes[i]]
+        if self.sort_col == "AMT":
+            keys = self._amount_keys
+            keys.extend(_amount_key(col[i]) for i in range(len(keys), len(col)))
+            return keys.__getitem__
+        return col.__getitem__
+
+    def _sort(self, rows: array):
+        if not self.sorted or not rows:
+            return
+        order = sorted(rows, key=self._sort_key(), reverse=self.descending)
+        rows[:] = array("I", order)
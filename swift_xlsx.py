@@ -0,0 +1,226 @@
+
+# swift_xlsx.py
+import os
+import re
+import tempfile
+import zipfile
+
+
+# =========================
+# 流式 xlsx 写入（只写、单遍）
+# =========================
+# 数据行先写入临时文件，同时记录每列最大宽度；
+# 关闭时再拼出 <cols> + 表头 + 数据行，不需要第二遍遍历单元格。
+MAX_COL_WIDTH = 80
+
+# Excel 不接受的控制字符（openpyxl 遇到会直接报错）
+_ILLEGAL_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+# 样式 0 = 默认；样式 1 = 表头（加粗 + 细边框 + 居中）
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2">'
+    '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '</fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2">'
+    '<border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>'
+    '</borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="top"/></xf>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def _escape(s: str) -> str:
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _quoteattr(s: str) -> str:
+    return '"' + _escape(s).replace('"', "&quot;") + '"'
+
+
+def col_letter(idx: int) -> str:
+    """1-based 列号 -> Excel 列字母，如 1->A, 27->AA"""
+    s = ""
+    while idx > 0:
+        idx, rem = divmod(idx - 1, 26)
+        s = chr(65 + rem) + s
+    return s
+
+
+def _cell_xml(ref: str, v, style: int = 0) -> str:
+    s_attr = f' s="{style}"' if style else ""
+    if isinstance(v, bool):
+        return f'<c r="{ref}" t="b"{s_attr}><v>{int(v)}</v></c>'
+    if isinstance(v, (int, float)):
+        return f'<c r="{ref}"{s_attr}><v>{v!r}</v></c>'
+    text = _escape(_ILLEGAL_XML_RE.sub("", str(v)))
+    return f'<c r="{ref}" t="inlineStr"{s_attr}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class StreamingSheet:
+    """
+    单个工作表：append() 写数据行，columns 可在 close 前调整
+    （表头在关闭时才写，例如 Debug 的 ERROR 列只在确有错误时保留）。
+    """
+
+    def __init__(self, name: str, columns: list[str]):
+        self.name = name
+        self.columns = list(columns)
+        self.widths: dict[int, int] = {}
+        self.n_rows = 0
+        self._buf = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+
+    def append(self, values):
+        self.n_rows += 1
+        r = self.n_rows + 1   # 第 1 行是表头
+        cells = []
+        for i, v in enumerate(values, start=1):
+            if v is None or v == "":
+                continue
+            n = len(str(v))
+            if n > self.widths.get(i, 0):
+                self.widths[i] = n
+            cells.append(_cell_xml(f"{col_letter(i)}{r}", v))
+        self._buf.write(f'<row r="{r}">{"".join(cells)}</row>')
+
+    def _write_xml(self, out):
+        cols = []
+        for i, name in enumerate(self.columns, start=1):
+            width = min(max(len(str(name)), self.widths.get(i, 0)) + 2, MAX_COL_WIDTH)
+            cols.append(f'<col min="{i}" max="{i}" width="{width}" customWidth="1"/>')
+        header = "".join(
+            _cell_xml(f"{col_letter(i)}1", name, style=1)
+            for i, name in enumerate(self.columns, start=1)
+        )
+
+        out.write((
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<cols>{"".join(cols)}</cols>'
+            f'<sheetData><row r="1">{header}</row>'
+        ).encode("utf-8"))
+
+        self._buf.seek(0)
+        for chunk in iter(lambda: self._buf.read(1 << 20), ""):
+            out.write(chunk.encode("utf-8"))
+        out.write(b"</sheetData></worksheet>")
+
+    def discard(self):
+        self._buf.close()
+
+
+class StreamingXlsxWriter:
+    """
+    只写 xlsx：
+        with StreamingXlsxWriter(path) as wb:
+            ws = wb.add_sheet("Step3_Final", cols)
+            ws.append([...])
+    先写到 path + ".tmp"，完成后再替换目标文件，避免中途失败留下半个文件。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sheets: list[StreamingSheet] = []
+
+    def add_sheet(self, name: str, columns: list[str]) -> StreamingSheet:
+        ws = StreamingSheet(name, columns)
+        self.sheets.append(ws)
+        return ws
+
+    def close(self):
+        tmp_path = self.path + ".tmp"
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            overrides = "".join(
+                f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for i in range(1, len(self.sheets) + 1)
+            )
+            zf.writestr("[Content_Types].xml", _CONTENT_TYPES.format(sheets=overrides))
+            zf.writestr("_rels/.rels", _ROOT_RELS)
+            zf.writestr("xl/workbook.xml", self._workbook_xml())
+            zf.writestr("xl/_rels/workbook.xml.rels", self._workbook_rels())
+            zf.writestr("xl/styles.xml", _STYLES)
+
+            for i, ws in enumerate(self.sheets, start=1):
+                with zf.open(f"xl/worksheets/sheet{i}.xml", "w", force_zip64=True) as out:
+                    ws._write_xml(out)
+
+        self._discard()
+        os.replace(tmp_path, self.path)
+
+    def _workbook_xml(self) -> str:
+        sheets = "".join(
+            f'<sheet name={_quoteattr(ws.name)} sheetId="{i}" r:id="rId{i}"/>'
+            for i, ws in enumerate(self.sheets, start=1)
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheets}</sheets></workbook>'
+        )
+
+    def _workbook_rels(self) -> str:
+        rels = "".join(
+            f'<Relationship Id="rId{i}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, len(self.sheets) + 1)
+        )
+        n = len(self.sheets) + 1
+        rels += (
+            f'<Relationship Id="rId{n}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/>'
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{rels}</Relationships>'
+        )
+
+    def _discard(self):
+        for ws in self.sheets:
+            ws.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
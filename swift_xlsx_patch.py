@@ -0,0 +1,938 @@
+
+# swift_xlsx_patch.py
+import copy
+import os
+import posixpath
+import re
+import shutil
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+from swift_xlsx import _ILLEGAL_XML_RE, _escape, _quoteattr, col_letter
+
+
+# =========================
+# xlsx 定点修改：只改目标单元格 / 填充色，追加一个工作表
+# =========================
+# 目标工作表的 XML 流式读写：未命中的行原样拷贝，只有要改的行才解析；
+# 其余部件（共享字符串、主题、其他工作表……）按压缩后的原始字节直接拷贝，不解压不重压。
+# 遇到处理不了的结构（共享公式主单元格被覆盖等）抛 XlsxPatchError，由调用方回退到 openpyxl。
+READ_CHUNK = 1 << 20
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+REL_WORKSHEET = NS_REL + "/worksheet"
+REL_SHARED_STRINGS = NS_REL + "/sharedStrings"
+REL_STYLES = NS_REL + "/styles"
+REL_CALC_CHAIN = NS_REL + "/calcChain"
+CT_WORKSHEET = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+KEEP = object()   # CellPatch.value 的默认值：不改值，只改样式
+
+_REF_RE = re.compile(rb'\br="([A-Z]+)(\d+)"')
+_ROW_NUM_RE = re.compile(rb'\br="(\d+)"')
+_S_ATTR_RE = re.compile(rb'\ss="(\d+)"')
+_T_ATTR_RE = re.compile(rb'\st="([^"]*)"')
+_V_RE = re.compile(rb"<(?:\w+:)?v>(.*?)</(?:\w+:)?v>", re.S)
+_INLINE_T_RE = re.compile(rb"<(?:\w+:)?t\b[^>]*>(.*?)</(?:\w+:)?t>", re.S)
+_REL_RE = re.compile(r"<(?:\w+:)?Relationship\b[^>]*?/?>")
+_ATTR_RE = re.compile(r'([\w:]+)="([^"]*)"')
+
+
+class XlsxPatchError(Exception):
+    pass
+
+
+class CellPatch:
+    """单元格修改：value=KEEP 表示保留原值；fill 为 ARGB（如 '00FFC000'）或 None。"""
+    __slots__ = ("value", "fill")
+
+    def __init__(self, value=KEEP, fill: str = None):
+        self.value = value
+        self.fill = fill
+
+
+class NewSheet:
+    """追加（或同名覆盖）的工作表：表头加粗，数据单元格统一填充色。"""
+
+    def __init__(self, name: str, header: list, rows: list, row_fill: str = None):
+        self.name = name
+        self.header = header
+        self.rows = rows
+        self.row_fill = row_fill
+
+
+def column_index(letters: str) -> int:
+    """Excel 列字母 -> 1-based 列号"""
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx
+
+
+def _attrs(tag: str) -> dict:
+    return dict(_ATTR_RE.findall(tag))
+
+
+def _resolve_target(base_dir: str, target: str) -> str:
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+# -----------------------------
+# styles.xml：按需克隆 cellXfs，追加填充/粗体
+# -----------------------------
+class _StylePatcher:
+    def __init__(self, xml: str):
+        self.xml = xml
+        self.prefix = self._prefix("styleSheet")
+        self.fills = self._items("fills", "fill")
+        self.fonts = self._items("fonts", "font")
+        self.xfs = self._items("cellXfs", "xf")
+        self.new_fills: list[str] = []
+        self.new_fonts: list[str] = []
+        self.new_xfs: list[str] = []
+        self._fill_ids: dict[str, int] = {}
+        self._cache: dict[tuple, int] = {}
+
+    def _prefix(self, tag: str) -> str:
+        m = re.search(rf"<(\w+:)?{tag}\b", self.xml)
+        if not m:
+            raise XlsxPatchError(f"styles.xml 缺少 {tag}")
+        return m.group(1) or ""
+
+    def _section(self, tag: str):
+        p = self.prefix
+        m = re.search(rf"<{p}{tag}\b[^>]*?(/>|>(.*?)</{p}{tag}>)", self.xml, re.S)
+        return m
+
+    def _items(self, section: str, item: str) -> list[str]:
+        m = self._section(section)
+        if m is None or m.group(1) == "/>":
+            return []
+        p = self.prefix
+        return re.findall(rf"<{p}{item}\b[^>]*?(?:/>|>.*?</{p}{item}>)", m.group(2), re.S)
+
+    def _fill_id(self, rgb: str) -> int:
+        fid = self._fill_ids.get(rgb)
+        if fid is None:
+            p = self.prefix
+            self.new_fills.append(
+                f'<{p}fill><{p}patternFill patternType="solid"><{p}fgColor rgb="{rgb}"/>'
+                f'<{p}bgColor rgb="{rgb}"/></{p}patternFill></{p}fill>'
+            )
+            fid = self._fill_ids[rgb] = len(self.fills) + len(self.new_fills) - 1
+        return fid
+
+    def _bold_font_id(self) -> int:
+        if not self.new_fonts:
+            p = self.prefix
+            self.new_fonts.append(f'<{p}font><{p}b val="1"/></{p}font>')
+        return len(self.fonts)
+
+    @staticmethod
+    def _set_attr(xf: str, name: str, value) -> str:
+        head_end = xf.find(">")
+        if xf[head_end - 1] == "/":
+            head_end -= 1
+        head, rest = xf[:head_end], xf[head_end:]
+        if re.search(rf'\s{name}="[^"]*"', head):
+            head = re.sub(rf'(\s{name}=)"[^"]*"', rf'\g<1>"{value}"', head)
+        else:
+            head += f' {name}="{value}"'
+        return head + rest
+
+    def derive(self, base: int, fill: str = None, bold: bool = False) -> int:
+        """以 cellXfs[base] 为底，换填充色 / 字体，返回新样式号（相同组合只生成一次）。"""
+        key = (base, fill, bold)
+        sid = self._cache.get(key)
+        if sid is not None:
+            return sid
+        if self.xfs:
+            xf = self.xfs[base] if base < len(self.xfs) else self.xfs[0]
+        else:
+            p = self.prefix
+            xf = f'<{p}xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        if fill:
+            xf = self._set_attr(self._set_attr(xf, "fillId", self._fill_id(fill)), "applyFill", 1)
+        if bold:
+            xf = self._set_attr(self._set_attr(xf, "fontId", self._bold_font_id()), "applyFont", 1)
+        self.new_xfs.append(xf)
+        sid = self._cache[key] = len(self.xfs) + len(self.new_xfs) - 1
+        return sid
+
+    def _append(self, xml: str, section: str, items: list[str], total: int) -> str:
+        if not items:
+            return xml
+        p = self.prefix
+        m = self._section(section)
+        body = "".join(items)
+        if m is None:
+            # 缺少整个 section（极少见）：不冒险拼结构
+            raise XlsxPatchError(f"styles.xml 缺少 {section}")
+        if m.group(1) == "/>":
+            new = f'<{p}{section} count="{total}">{body}</{p}{section}>'
+        else:
+            head = xml[m.start():m.start() + xml[m.start():].find(">") + 1]
+            head_new = re.sub(r'\scount="\d+"', f' count="{total}"', head)
+            if head_new == head:
+                head_new = head[:-1] + f' count="{total}">'
+            new = head_new + m.group(2) + body + f"</{p}{section}>"
+        return xml[:m.start()] + new + xml[m.end():]
+
+    def to_bytes(self) -> bytes:
+        xml = self.xml
+        xml = self._append(xml, "fonts", self.new_fonts, len(self.fonts) + len(self.new_fonts))
+        self.xml = xml
+        xml = self._append(xml, "fills", self.new_fills, len(self.fills) + len(self.new_fills))
+        self.xml = xml
+        xml = self._append(xml, "cellXfs", self.new_xfs, len(self.xfs) + len(self.new_xfs))
+        self.xml = xml
+        return xml.encode("utf-8")
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.new_xfs)
+
+
+# -----------------------------
+# 单元格 XML
+# -----------------------------
+def _value_cell(ref: str, v, style: int) -> str:
+    s_attr = f' s="{style}"' if style else ""
+    if v is None or v == "" or (isinstance(v, float) and (v != v or v in (float("inf"), float("-inf")))):
+        return f'<c r="{ref}"{s_attr}/>'
+    if isinstance(v, bool):
+        return f'<c r="{ref}"{s_attr} t="b"><v>{int(v)}</v></c>'
+    if isinstance(v, float) and v.is_integer() and abs(v) < 2 ** 53:
+        v = int(v)   # 与 openpyxl 一致：整数值的 float 写成 100 而不是 100.0
+    if isinstance(v, (int, float)):
+        return f'<c r="{ref}"{s_attr}><v>{v!r}</v></c>'
+    text = _escape(_ILLEGAL_XML_RE.sub("", str(v)))
+    return f'<c r="{ref}"{s_attr} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class DwWorkbookPatcher:
+    """
+    patcher = DwWorkbookPatcher(src)
+    header = patcher.read_row("DWCKFS", 1)               # {列号: 值}
+    patcher.save(dst, "DWCKFS", {(行, 列): CellPatch(...)}, NewSheet(...))
+    save 之后源文件即关闭，同一个 patcher 只能保存一次。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            self.zf = zipfile.ZipFile(path)
+        except zipfile.BadZipFile as e:
+            raise XlsxPatchError(f"不是 xlsx（zip）文件：{path}") from e
+        self.names = set(self.zf.namelist())
+
+        try:
+            self._load_workbook_parts()
+        except (KeyError, AttributeError) as e:
+            self.zf.close()
+            raise XlsxPatchError(f"workbook 结构无法识别：{e}") from e
+        self._shared = None
+        self._shared_complete = False
+
+    def _load_workbook_parts(self):
+        self.workbook_path = self._office_document()
+        self.workbook_dir = posixpath.dirname(self.workbook_path)
+        self.workbook_rels_path = posixpath.join(self.workbook_dir, "_rels",
+                                                 posixpath.basename(self.workbook_path) + ".rels")
+        self.workbook_xml = self.zf.read(self.workbook_path).decode("utf-8")
+        self.rels_xml = self.zf.read(self.workbook_rels_path).decode("utf-8")
+
+        self.rels = {}   # rId -> (type, 部件路径)
+        for tag in _REL_RE.findall(self.rels_xml):
+            a = _attrs(tag)
+            if a.get("TargetMode") == "External":
+                continue
+            self.rels[a["Id"]] = (a.get("Type", ""), _resolve_target(self.workbook_dir, a["Target"]))
+
+        self.sheets = {}   # 工作表名 -> (sheetId, rId, 部件路径)
+        for tag in re.findall(r"<(?:\w+:)?sheet\b[^>]*?/?>", self.workbook_xml):
+            a = _attrs(tag)
+            rid = next((v for k, v in a.items() if k.endswith(":id")), None)
+            if rid in self.rels:
+                self.sheets[_unescape(a["name"])] = (int(a.get("sheetId", 0)), rid, self.rels[rid][1])
+
+    def close(self):
+        self.zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _office_document(self) -> str:
+        root_rels = self.zf.read("_rels/.rels").decode("utf-8")
+        for tag in _REL_RE.findall(root_rels):
+            a = _attrs(tag)
+            if a.get("Type", "").endswith("/officeDocument"):
+                return a["Target"].lstrip("/")
+        raise XlsxPatchError("找不到 workbook 部件")
+
+    def _rel_part(self, rel_type: str):
+        for typ, part in self.rels.values():
+            if typ == rel_type:
+                return part
+        return None
+
+    def sheet_part(self, sheet: str) -> str:
+        if sheet not in self.sheets:
+            raise KeyError(f"DW文件中找不到sheet: {sheet}")
+        return self.sheets[sheet][2]
+
+    # -------------------------
+    # 读取
+    # -------------------------
+    def shared_strings(self, upto: int = None) -> list[str]:
+        """流式读取共享字符串，只读到第 upto 个为止（表头只需要前面几个）；upto=None 读全部。"""
+        if self._shared is None:
+            self._shared = []
+        part = self._rel_part(REL_SHARED_STRINGS)
+        if part is None or self._shared_complete or (upto is not None and len(self._shared) > upto):
+            return self._shared
+        out = []
+        complete = True
+        with self.zf.open(part) as f:
+            for _, el in iterparse(f, events=("end",)):
+                if _local(el.tag) == "si":
+                    out.append(_si_text(el))
+                    el.clear()
+                    if upto is not None and len(out) > upto:
+                        complete = False
+                        break
+        self._shared = out
+        self._shared_complete = complete
+        return out
+
+    def read_row(self, sheet: str, row_no: int) -> dict:
+        """读取一行：{1-based 列号: 值}（共享字符串已解析，数字同 openpyxl：int / float）。"""
+        for num, row in _iter_rows(self.zf.open(self.sheet_part(sheet))):
+            if num == row_no:
+                return self._row_values(row)
+            if num > row_no:
+                break
+        return {}
+
+    def read_columns(self, sheet: str, cols: list) -> tuple:
+        """
+        单遍流式读取：第 1 行完整读出作表头，其余行只取 cols 这几列。
+        返回 (header, values, width)：
+        - header: {列号: 值}
+        - values: {列号: [第2行的值, 第3行的值, ...]}，空单元格为 None，中间缺失的行补 None，
+          末尾连续的空行去掉（与 pandas.read_excel 一致：第 i 个值对应 Excel 第 i+2 行）
+        - width: 所有行中最后一个非空单元格的最大列号（即 pandas 读出的列数）
+        值的转换同 pandas.read_excel：整数值的数字为 int，错误值（#N/A 等）为 NaN。
+        """
+        sst = self.shared_strings()
+        letters = {c: col_letter(c).encode() for c in cols}
+        values = {c: [] for c in cols}
+        header = {}
+        width = 0
+        n_rows = 0    # 到最后一个非空行为止的数据行数
+        expected = 2
+        prefix = None
+        for num, row in _iter_rows(self.zf.open(self.sheet_part(sheet))):
+            if prefix is None:
+                prefix = row[1:row.find(b"row")]
+            last = _last_value_col(row, prefix)
+            width = max(width, last)
+            if num == 1:
+                header = self._row_values(row)
+                continue
+            if last:
+                n_rows = num - 1
+            if _cells_without_ref(row, prefix):
+                # 单元格没写 r 属性（Excel 不会这样写）：整行按顺序解析
+                full = self._row_values(row, errors_as_nan=True)
+                got = {c: full.get(c) for c in cols}
+            else:
+                got = {}
+                for c, letter in letters.items():
+                    cell = _find_cell(row, letter, num, prefix)
+                    got[c] = None if cell is None else _cell_value(cell, sst, errors_as_nan=True)
+            for c, lst in values.items():
+                if num > expected:
+                    lst.extend([None] * (num - expected))
+                lst.append(got[c])
+            expected = num + 1
+        for lst in values.values():
+            del lst[n_rows:]
+        return header, values, width
+
+    def _row_values(self, row: bytes, errors_as_nan: bool = False) -> dict:
+        out = {}
+        col = 0
+        sst = None
+        for cell in _iter_cells(row):
+            m = _REF_RE.search(cell[:cell.find(b">") + 1])
+            col = column_index(m.group(1).decode()) if m else col + 1
+            if sst is None and re.search(rb'\st="s"', cell[:cell.find(b">") + 1]):
+                sst = self.shared_strings()
+            v = _cell_value(cell, sst, errors_as_nan)
+            if v is not None:
+                out[col] = v
+        return out
+
+    # -------------------------
+    # 写出
+    # -------------------------
+    def save(self, out_path: str, sheet: str, patches: dict, new_sheet: NewSheet = None):
+        sheet_part = self.sheet_part(sheet)
+        styles_part = self._rel_part(REL_STYLES)
+        if styles_part is None:
+            raise XlsxPatchError("workbook 没有 styles.xml")
+        styles = _StylePatcher(self.zf.read(styles_part).decode("utf-8"))
+
+        # 新工作表：同名则覆盖原部件（位置不变），否则追加到最后
+        new_part = None
+        sheet_xml = b""
+        replaced = {}
+        if new_sheet is not None:
+            if new_sheet.name in self.sheets:
+                new_part = self.sheets[new_sheet.name][2]
+            else:
+                new_part = self._new_sheet_part()
+                replaced.update(self._register_sheet(new_sheet.name, new_part))
+            sheet_xml = self._new_sheet_xml(new_sheet, styles)
+
+        tmp = out_path + ".tmp"
+        try:
+            with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zout:
+                for info in self.zf.infolist():
+                    name = info.filename
+                    if name == sheet_part:
+                        with self.zf.open(info) as src, zout.open(_new_info(info), "w", force_zip64=True) as dst:
+                            formulas_dropped = _patch_sheet(src, dst, patches, styles)
+                    elif name == new_part:
+                        zout.writestr(_new_info(info), sheet_xml)
+                    elif name == styles_part or name in replaced:
+                        continue   # 最后统一写（样式要等所有单元格处理完）
+                    else:
+                        _copy_raw(self.zf, info, zout)
+
+                if new_part is not None and new_part not in self.names:
+                    zout.writestr(_fresh_info(new_part), sheet_xml)
+                zout.writestr(_new_info(self.zf.getinfo(styles_part)), styles.to_bytes())
+                for name, data in replaced.items():
+                    info = self.zf.getinfo(name) if name in self.names else _fresh_info(name)
+                    zout.writestr(_new_info(info), data)
+
+            if formulas_dropped:
+                # 覆盖了公式单元格：calcChain 里的引用失效，去掉它让 Excel 重建
+                _drop_calc_chain(tmp, self)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        # 先关闭源文件：输出路径与源文件相同时（Windows）才能替换
+        self.close()
+        shutil.move(tmp, out_path)
+
+    def _new_sheet_part(self) -> str:
+        k = 1
+        while True:
+            part = posixpath.join(self.workbook_dir, "worksheets", f"sheet{k}.xml")
+            if part not in self.names:
+                return part
+            k += 1
+
+    def _register_sheet(self, name: str, part: str) -> dict:
+        """在 workbook.xml / rels / [Content_Types].xml 里登记新工作表，返回 {部件: 新内容}。"""
+        rid_nums = [int(m) for m in re.findall(r"rId(\d+)", " ".join(self.rels))]
+        rid = f"rId{max(rid_nums, default=0) + 1}"
+        while rid in self.rels:
+            rid = f"rId{int(rid[3:]) + 1}"
+        sheet_id = max((v[0] for v in self.sheets.values()), default=0) + 1
+
+        wb = self.workbook_xml
+        m = re.search(r"</(\w+:)?sheets>", wb)
+        rel_prefix = re.search(rf'xmlns:(\w+)="{re.escape(NS_REL)}"', wb)
+        if m is None or rel_prefix is None:
+            raise XlsxPatchError("workbook.xml 结构无法识别")
+        p = m.group(1) or ""
+        wb = (wb[:m.start()] + f'<{p}sheet name={_quoteattr(name)} sheetId="{sheet_id}" '
+              f'{rel_prefix.group(1)}:id="{rid}"/>' + wb[m.start():])
+
+        rels = self.rels_xml
+        m = re.search(r"</(\w+:)?Relationships>", rels)
+        if m is None:
+            raise XlsxPatchError("workbook.xml.rels 结构无法识别")
+        p = m.group(1) or ""
+        target = posixpath.relpath(part, self.workbook_dir)
+        rels = (rels[:m.start()] + f'<{p}Relationship Id="{rid}" Type="{REL_WORKSHEET}" Target="{target}"/>'
+                + rels[m.start():])
+
+        ct = self.zf.read("[Content_Types].xml").decode("utf-8")
+        m = re.search(r"</(\w+:)?Types>", ct)
+        if m is None:
+            raise XlsxPatchError("[Content_Types].xml 结构无法识别")
+        p = m.group(1) or ""
+        ct = ct[:m.start()] + f'<{p}Override PartName="/{part}" ContentType="{CT_WORKSHEET}"/>' + ct[m.start():]
+
+        return {
+            self.workbook_path: wb.encode("utf-8"),
+            self.workbook_rels_path: rels.encode("utf-8"),
+            "[Content_Types].xml": ct.encode("utf-8"),
+        }
+
+    @staticmethod
+    def _new_sheet_xml(sheet: NewSheet, styles: _StylePatcher) -> bytes:
+        bold = styles.derive(0, bold=True)
+        filled = styles.derive(0, fill=sheet.row_fill) if sheet.row_fill else 0
+        rows = []
+        header = "".join(_value_cell(f"{col_letter(c)}1", v, bold) for c, v in enumerate(sheet.header, 1))
+        rows.append(f'<row r="1">{header}</row>')
+        for r, values in enumerate(sheet.rows, start=2):
+            cells = "".join(_value_cell(f"{col_letter(c)}{r}", v, filled) for c, v in enumerate(values, 1))
+            rows.append(f'<row r="{r}">{cells}</row>')
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+            f'<sheetData>{"".join(rows)}</sheetData></worksheet>'
+        ).encode("utf-8")
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _si_text(si) -> str:
+    """共享字符串：纯文本 <t> 或富文本 <r><t>；注音 <rPh> 不算（同 openpyxl）"""
+    parts = []
+    for child in si:
+        name = _local(child.tag)
+        if name == "t":
+            parts.append(child.text or "")
+        elif name == "r":
+            for t in child:
+                if _local(t.tag) == "t":
+                    parts.append(t.text or "")
+    return "".join(parts)
+
+
+def _cell_value(cell: bytes, sst: list, errors_as_nan: bool = False):
+    """单元格 XML -> 值（同 openpyxl：共享字符串解析、数字 int / float、布尔）；空单元格为 None"""
+    head = cell[:cell.find(b">") + 1]
+    t = _T_ATTR_RE.search(head)
+    t = t.group(1) if t else b"n"
+    if t == b"inlineStr":
+        texts = _INLINE_T_RE.findall(cell)
+        return _unescape(b"".join(texts).decode("utf-8"))
+    v = _V_RE.search(cell)
+    if v is None:
+        return None
+    raw = _unescape(v.group(1).decode("utf-8"))
+    if t == b"s":
+        k = int(raw)
+        return sst[k] if sst is not None and k < len(sst) else ""
+    if t == b"e":
+        return float("nan") if errors_as_nan else raw
+    if t in (b"str", b"d"):
+        return raw
+    if t == b"b":
+        return raw == "1"
+    # 不含小数点/指数的按 int；整数值的 float 也按 int（pandas 读 Excel 时同样处理）
+    try:
+        if any(ch in raw for ch in ".eE"):
+            f = float(raw)
+            return int(f) if errors_as_nan and f.is_integer() else f
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+def _find_cell(row: bytes, letter: bytes, row_no: int, prefix: bytes):
+    """在行 XML 里直接按引用（如 X15）定位单元格，不逐个解析"""
+    ref = b'r="' + letter + str(row_no).encode() + b'"'
+    i = row.find(ref)
+    while i > 0 and row[i - 1:i] not in (b" ", b"\t", b"\n", b"\r"):
+        i = row.find(ref, i + 1)
+    if i < 0:
+        return None
+    start = row.rfind(b"<", 0, i)
+    gt = row.find(b">", i)
+    if row[gt - 1:gt] == b"/":
+        return row[start:gt + 1]
+    close = b"</" + prefix + b"c>"
+    return row[start:row.find(close, gt) + len(close)]
+
+
+def _cells_without_ref(row: bytes, prefix: bytes) -> bool:
+    """行内是否有单元格没写 r 属性（按个数比较，不逐个解析）"""
+    tag = b"<" + prefix + b"c"
+    n_cells = row.count(tag + b" ") + row.count(tag + b">") + row.count(tag + b"/")
+    head = row[:row.find(b">")]
+    n_refs = row.count(b' r="') - head.count(b' r="')
+    return n_refs < n_cells
+
+
+def _last_value_col(row: bytes, prefix: bytes) -> int:
+    """行内最后一个有值单元格的列号（只有样式的空单元格不算）；整行为空返回 0"""
+    open_tag = b"<" + prefix + b"c"
+    end = len(row)
+    while True:
+        start = row.rfind(open_tag, 0, end)
+        if start < 0:
+            return 0
+        nxt = row[start + len(open_tag):start + len(open_tag) + 1]
+        if nxt not in (b" ", b">", b"/", b"\t", b"\n", b"\r"):
+            end = start
+            continue
+        cell = row[start:end]
+        if b"<" + prefix + b"v>" in cell or b"<" + prefix + b"is>" in cell:
+            m = _REF_RE.search(cell, 0, cell.find(b">") + 1)
+            if m:
+                return column_index(m.group(1).decode())
+            # 没有 r 属性：按位置数
+            return sum(1 for _ in _iter_cells(row[:start])) + 1
+        end = start
+
+
+def _unescape(s: str) -> str:
+    if "&" not in s:
+        return s
+    return (s.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", '"')
+             .replace("&apos;", "'").replace("&amp;", "&"))
+
+
+# -----------------------------
+# zip 部件：原始字节拷贝
+# -----------------------------
+def _new_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    out = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    out.compress_type = zipfile.ZIP_DEFLATED
+    out.external_attr = info.external_attr
+    return out
+
+
+def _fresh_info(name: str) -> zipfile.ZipInfo:
+    out = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+    out.compress_type = zipfile.ZIP_DEFLATED
+    return out
+
+
+def _copy_raw(zin: zipfile.ZipFile, info: zipfile.ZipInfo, zout: zipfile.ZipFile):
+    """把压缩后的数据原样搬过去（不解压/重压）；加密等特殊条目退回普通拷贝。"""
+    if info.flag_bits & 0x1:
+        zout.writestr(_new_info(info), zin.read(info))
+        return
+    fp = zin.fp
+    fp.seek(info.header_offset)
+    header = fp.read(30)
+    if header[:4] != b"PK\x03\x04":
+        raise XlsxPatchError(f"zip 本地头损坏：{info.filename}")
+    n_name = int.from_bytes(header[26:28], "little")
+    n_extra = int.from_bytes(header[28:30], "little")
+    fp.seek(info.header_offset + 30 + n_name + n_extra)
+
+    out = copy.copy(info)
+    out.flag_bits &= ~0x08    # 不写 data descriptor：大小和 CRC 直接写进本地头
+    out.extra = b""
+    out.header_offset = zout.fp.tell()
+    zout.fp.write(out.FileHeader(zip64=out.file_size > zipfile.ZIP64_LIMIT
+                                 or out.compress_size > zipfile.ZIP64_LIMIT))
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = fp.read(min(READ_CHUNK, remaining))
+        if not chunk:
+            raise XlsxPatchError(f"zip 数据截断：{info.filename}")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.filelist.append(out)
+    zout.NameToInfo[out.filename] = out
+    zout.start_dir = zout.fp.tell()
+
+
+def _drop_calc_chain(path: str, patcher: DwWorkbookPatcher):
+    part = patcher._rel_part(REL_CALC_CHAIN)
+    if part is None:
+        return
+    tmp = path + ".nocalc"
+    with zipfile.ZipFile(path) as zin, zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zout:
+        for info in zin.infolist():
+            if info.filename == part:
+                continue
+            if info.filename == patcher.workbook_rels_path:
+                xml = zin.read(info).decode("utf-8")
+                xml = "".join(
+                    piece for piece in re.split(r"(<(?:\w+:)?Relationship\b[^>]*?/?>)", xml)
+                    if REL_CALC_CHAIN not in piece
+                )
+                zout.writestr(_new_info(info), xml)
+            elif info.filename == "[Content_Types].xml":
+                xml = zin.read(info).decode("utf-8")
+                xml = re.sub(rf'<(?:\w+:)?Override\b[^>]*PartName="/{re.escape(part)}"[^>]*/>', "", xml)
+                zout.writestr(_new_info(info), xml)
+            else:
+                _copy_raw(zin, info, zout)
+    shutil.move(tmp, path)
+
+
+# -----------------------------
+# 工作表 XML 流式改写
+# -----------------------------
+def _iter_rows(f):
+    """流式切出 <sheetData> 里的每一行：yield (行号, 行 XML bytes)。"""
+    buf = b""
+    pos = 0
+    in_data = False
+    last = 0
+    while True:
+        if not in_data:
+            m = re.search(rb"<(\w+:)?sheetData\b[^>]*?(/?)>", buf)
+            if m:
+                if m.group(2) == b"/":
+                    return
+                in_data = True
+                pos = m.end()
+            else:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    return
+                buf = buf[-64:] + chunk
+                continue
+        found = _next_row(buf, pos)
+        if found is None:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                return
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        if found == "end":
+            return
+        start, end, num = found
+        last = num if num is not None else last + 1
+        yield last, buf[start:end]
+        pos = end
+
+
+def _next_row(buf: bytes, pos: int):
+    """从 pos 开始找下一行：返回 (start, end, 行号) / 'end'（sheetData 结束）/ None（数据不够）。"""
+    lt = buf.find(b"<", pos)
+    while lt >= 0:
+        if buf.startswith(b"</", lt):
+            close = buf.find(b">", lt)
+            if close < 0:
+                return None
+            if buf[lt:close].endswith(b"sheetData"):
+                return "end"
+            lt = buf.find(b"<", close)
+            continue
+        gt = buf.find(b">", lt)
+        if gt < 0:
+            return None
+        name_end = lt + 1
+        while name_end < gt and buf[name_end:name_end + 1] not in (b" ", b"/", b">", b"\t", b"\n", b"\r"):
+            name_end += 1
+        tag = buf[lt + 1:name_end]
+        if tag == b"row" or tag.endswith(b":row"):
+            head = buf[lt:gt + 1]
+            if buf[gt - 1:gt] == b"/":
+                end = gt + 1
+            else:
+                close = buf.find(b"</" + tag + b">", gt)
+                if close < 0:
+                    return None
+                end = close + len(tag) + 3
+            m = _ROW_NUM_RE.search(head)
+            return lt, end, int(m.group(1)) if m else None
+        lt = buf.find(b"<", gt)
+    return None
+
+
+def _iter_cells(row: bytes):
+    pos = row.find(b">") + 1
+    while True:
+        lt = row.find(b"<", pos)
+        if lt < 0:
+            return
+        if row.startswith(b"</", lt):
+            return
+        gt = row.find(b">", lt)
+        name_end = lt + 1
+        while row[name_end:name_end + 1] not in (b" ", b"/", b">", b"\t", b"\n", b"\r"):
+            name_end += 1
+        tag = row[lt + 1:name_end]
+        if row[gt - 1:gt] == b"/":
+            end = gt + 1
+        else:
+            end = row.find(b"</" + tag + b">", gt) + len(tag) + 3
+        if tag == b"c" or tag.endswith(b":c"):
+            yield row[lt:end]
+        pos = end
+
+
+def _patch_cell(cell: bytes, ref: str, patch: CellPatch, styles: _StylePatcher, prefix: bytes):
+    """返回 (新单元格 XML, 是否覆盖了公式)。"""
+    head_end = cell.find(b">") + 1
+    head = cell[:head_end]
+    m = _S_ATTR_RE.search(head)
+    base = int(m.group(1)) if m else 0
+    style = styles.derive(base, fill=patch.fill) if patch.fill else base
+
+    if patch.value is KEEP:
+        if not patch.fill:
+            return cell, False
+        if m:
+            head = head[:m.start()] + b' s="%d"' % style + head[m.end():]
+        else:
+            close = head_end - 2 if head.endswith(b"/>") else head_end - 1
+            head = head[:close] + b' s="%d"' % style + head[close:]
+        return head + cell[head_end:], False
+
+    if b"<" + prefix + b"f" in cell:
+        f = re.search(rb"<(?:\w+:)?f\b[^>]*>", cell)
+        if f and b't="shared"' in f.group(0) and b"ref=" in f.group(0):
+            raise XlsxPatchError(f"{ref} 是共享公式的主单元格，不能直接覆盖")
+        dropped = True
+    else:
+        dropped = False
+    new = _value_cell(ref, patch.value, style).encode("utf-8")
+    if prefix:
+        new = new.replace(b"<c ", b"<" + prefix + b"c ").replace(b"</c>", b"</" + prefix + b"c>")
+        new = new.replace(b"<is>", b"<" + prefix + b"is>").replace(b"</is>", b"</" + prefix + b"is>")
+        new = re.sub(rb"<(/?)t([ >])", rb"<\1" + prefix + rb"t\2", new)
+        new = new.replace(b"<v>", b"<" + prefix + b"v>").replace(b"</v>", b"</" + prefix + b"v>")
+    return new, dropped
+
+
+def _new_cell(ref: str, patch: CellPatch, styles: _StylePatcher, prefix: bytes) -> bytes:
+    """行里原本没有的单元格：只改填充色时写一个空值单元格"""
+    value = None if patch.value is KEEP else patch.value
+    return _patch_cell(b"<" + prefix + b"c/>", ref, CellPatch(value, patch.fill), styles, prefix)[0]
+
+
+def _patch_row(row: bytes, row_no: int, cols: dict, styles: _StylePatcher, prefix: bytes):
+    head_end = row.find(b">") + 1
+    if row[head_end - 2:head_end] == b"/>":
+        head = row[:head_end - 2] + b">"
+        body_cells = []
+    else:
+        head = row[:head_end]
+        body_cells = list(_iter_cells(row))
+
+    out = []
+    dropped = False
+    todo = sorted(cols.items())
+    k = 0
+    col = 0
+    for cell in body_cells:
+        m = _REF_RE.search(cell[:cell.find(b">") + 1])
+        col = column_index(m.group(1).decode()) if m else col + 1
+        while k < len(todo) and todo[k][0] < col:
+            c, patch = todo[k]
+            out.append(_new_cell(f"{col_letter(c)}{row_no}", patch, styles, prefix))
+            k += 1
+        if k < len(todo) and todo[k][0] == col:
+            if not m:
+                cell = cell.replace(b"<" + prefix + b"c", b"<" + prefix + b'c r="%s%d"'
+                                    % (col_letter(col).encode(), row_no), 1)
+            new, d = _patch_cell(cell, f"{col_letter(col)}{row_no}", todo[k][1], styles, prefix)
+            out.append(new)
+            dropped = dropped or d
+            k += 1
+        else:
+            out.append(cell)
+    for c, patch in todo[k:]:
+        out.append(_new_cell(f"{col_letter(c)}{row_no}", patch, styles, prefix))
+
+    close = b"</" + prefix + b"row>"
+    return head + b"".join(out) + close, dropped
+
+
+def _new_row(row_no: int, cols: dict, styles: _StylePatcher, prefix: bytes) -> bytes:
+    row = b"<" + prefix + b'row r="%d"/>' % row_no
+    return _patch_row(row, row_no, cols, styles, prefix)[0]
+
+
+def _patch_sheet(src, dst, patches: dict, styles: _StylePatcher) -> bool:
+    """
+    patches: {(行, 列): CellPatch}。返回是否覆盖过公式单元格。
+    行按行号升序出现（Excel / openpyxl 都如此）；目标行不存在时按顺序插入新行。
+    """
+    by_row: dict[int, dict] = {}
+    for (r, c), p in patches.items():
+        by_row.setdefault(r, {})[c] = p
+    pending = sorted(by_row)
+    k = 0
+    dropped = False
+
+    buf = b""
+    pos = 0
+    prefix = None
+    while prefix is None:
+        chunk = src.read(READ_CHUNK)
+        buf += chunk
+        m = re.search(rb"<(\w+:)?sheetData\b[^>]*?(/?)>", buf)
+        if m:
+            prefix = m.group(1) or b""
+            if m.group(2) == b"/":
+                # 空表：展开成 <sheetData>新行</sheetData>
+                dst.write(buf[:m.start()])
+                rows = b"".join(_new_row(r, by_row[r], styles, prefix) for r in pending)
+                dst.write(b"<" + prefix + b"sheetData>" + rows + b"</" + prefix + b"sheetData>")
+                dst.write(buf[m.end():])
+                shutil.copyfileobj(src, dst, READ_CHUNK)
+                return False
+            dst.write(buf[:m.end()])
+            pos = m.end()
+        elif not chunk:
+            raise XlsxPatchError("工作表缺少 sheetData")
+
+    row_close = b"</" + prefix + b"row>"
+    last_row = 0
+    while True:
+        # 快速路径：缓冲区里最后一个完整行的行号仍小于下一个待改行，整段原样写出
+        if k < len(pending):
+            tail = buf.rfind(row_close)
+            if tail > pos:
+                start = buf.rfind(b"<" + prefix + b"row", pos, tail)
+                m = _ROW_NUM_RE.search(buf, start, buf.find(b">", start) + 1) if start >= 0 else None
+                if m and int(m.group(1)) < pending[k] and b"sheetData>" not in buf[pos:tail]:
+                    end = tail + len(row_close)
+                    dst.write(buf[pos:end])
+                    last_row = int(m.group(1))
+                    pos = end
+
+        found = _next_row(buf, pos)
+        if found is None:
+            chunk = src.read(READ_CHUNK)
+            if not chunk:
+                raise XlsxPatchError("工作表 XML 不完整")
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+
+        if found == "end":
+            end_tag = buf.find(b"</", pos)
+            dst.write(buf[pos:end_tag])
+            while k < len(pending):
+                dst.write(_new_row(pending[k], by_row[pending[k]], styles, prefix))
+                k += 1
+            dst.write(buf[end_tag:])
+            shutil.copyfileobj(src, dst, READ_CHUNK)
+            return dropped
+
+        start, end, num = found
+        num = num if num is not None else last_row + 1
+        dst.write(buf[pos:start])
+        while k < len(pending) and pending[k] < num:
+            dst.write(_new_row(pending[k], by_row[pending[k]], styles, prefix))
+            k += 1
+        if k < len(pending) and pending[k] == num:
+            new, d = _patch_row(buf[start:end], num, by_row[num], styles, prefix)
+            dst.write(new)
+            dropped = dropped or d
+            k += 1
+        else:
+            dst.write(buf[start:end])
+        last_row = num
+        pos = end
@@ -0,0 +1,123 @@
+# tests/test_dw_match.py
+import itertools
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import update_cp_swift as upd
+from swift_metrics import RunMetrics
+
+
+def _keys(rows):
+    """rows: [(账号, 金额或None)] -> dw_match_keys 的格式"""
+    return pd.DataFrame({
+        "acc": [a for a, _ in rows],
+        "amt": np.array([np.nan if v is None else v for _, v in rows], dtype=float),
+    })
+
+
+def _match(batch, step, dw, delta=upd.AMT_DELTA):
+    keys = _keys(dw)
+    amount_index = upd.amount_index_from_keys(keys)
+    match = upd.match_step3_batch if batch else upd.match_step3_rowwise
+    hits, kinds = match([a for a, _ in step], [v for _, v in step], [True] * len(step), keys, amount_index, delta)
+    return [int(h) if k else None for h, k in zip(hits, kinds)], kinds.tolist()
+
+
+def test_account_phase_is_min_cost_not_nearest_first():
+    # 金额差最小的先配会得到 105->104、100->200（共 101）；最优是 100->104、105->200（共 99）
+    step = [("X", 100.0), ("X", 105.0)]
+    dw = [("X", 104.0), ("X", 200.0)]
+    hits, kinds = _match(True, step, dw)
+    assert hits == [0, 1]
+    assert kinds == [upd.HIT_AC, upd.HIT_AC]
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_account_assignment_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    n_step, n_dw = rnd.randint(1, 5), rnd.randint(1, 5)
+    t = [float(rnd.randint(0, 50)) for _ in range(n_step)]
+    a = [float(rnd.randint(0, 50)) for _ in range(n_dw)]
+    out = upd._assign_account([(v, i) for i, v in enumerate(t)], [(v, j) for j, v in enumerate(a)])
+
+    k = min(n_step, n_dw)
+    assert len(out) == k and len(set(out.values())) == k
+    best = min(
+        sum(abs(t[i] - a[j]) for i, j in zip(si, dj))
+        for si in itertools.combinations(range(n_step), k)
+        for dj in itertools.permutations(range(n_dw), k)
+    )
+    assert sum(abs(t[i] - a[j]) for i, j in out.items()) == best
+
+
+def test_large_account_falls_back_to_nearest_first(monkeypatch):
+    monkeypatch.setattr(upd, "ASSIGN_MAX_PAIRS", 0)
+    out = upd._assign_account([(100.0, 0), (105.0, 1)], [(104.0, 10), (200.0, 11)])
+    assert out == {1: 10, 0: 11}
+
+
+def test_missing_amounts_fill_remaining_rows_in_row_order():
+    step = [("X", None), ("X", 10.0), ("X", None)]
+    dw = [("X", None), ("X", 11.0), ("X", 50.0)]
+    hits, _ = _match(True, step, dw)
+    assert hits == [0, 1, 2]
+
+
+def test_extra_step3_rows_fall_back_to_closest_row():
+    # 同账号 Step3 比 DW 行多：多出来的取金额最接近的行（两种方式相同，走冲突检查）
+    step = [("X", 100.0), ("X", 300.0), ("X", 290.0)]
+    dw = [("X", 98.0), ("X", 295.0)]
+    batch, _ = _match(True, step, dw)
+    rowwise, _ = _match(False, step, dw)
+    assert batch[:2] == [0, 1] and batch[2] == 1
+    assert rowwise == [0, 1, 1]
+
+
+def test_batch_avoids_conflict_that_rowwise_creates():
+    # s0 账号命中 DW0；s1 没账号，金额窗口里 DW0 最接近：逐行会重复占用 DW0，整批改分 DW1
+    step = [("X", 500.0), ("", 500.0)]
+    dw = [("X", 500.0), ("Y", 450.0)]
+    assert _match(False, step, dw)[0] == [0, 0]
+    assert _match(True, step, dw) == ([0, 1], [upd.HIT_AC, upd.HIT_AMT])
+
+
+def _write_dw(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = upd.DW_SHEET
+    ws.append(["序号", upd.DW_AMOUNT_COL[0], upd.DW_ACCOUNT_COL[0], "交易对手账户开户行号"])
+    for k, (acc, amt) in enumerate(rows, 1):
+        ws.append([k, amt, acc, None])
+    wb.save(path)
+
+
+def _write_back(tmp_path, monkeypatch, batch):
+    monkeypatch.setattr(upd, "BATCH_MATCH", batch)
+    monkeypatch.setattr(upd, "USE_DW_INDEX_CACHE", False)
+    dw_file = str(tmp_path / "dw.xlsx")
+    _write_dw(dw_file, [("A1", 100.0), ("A1", 200.0), ("B1", 500.0), ("C1", 450.0), ("D1", 9000.0)])
+    step3 = upd.Step3Rows()
+    for acc, amt, swift in [
+        ("A1", 199.0, "SWIFTAAAXXX"),   # A1 两行：金额最接近 200
+        ("A1", 101.0, "SWIFTBBBXXX"),
+        ("B1", 500.0, "SWIFTCCCXXX"),
+        ("", 500.0, "SWIFTDDDXXX"),     # 没账号：金额窗口 [400, 500]
+        ("", 7000.0, "SWIFTEEEXXX"),    # 没有能配的
+        ("A1", 150.0, ""),              # CP SWIFT 为空
+    ]:
+        step3.append_record({"CP A/C": acc, "AMT VALUE": amt, "CP SWIFT": swift})
+    metrics = RunMetrics("update_cp_swift")
+    upd.write_back_step3(step3, dw_file=dw_file, output_file=str(tmp_path / f"out_{batch}.xlsx"),
+                         status_callback=lambda msg: None, metrics=metrics)
+    return metrics.counters
+
+
+def test_write_back_report_batch_vs_rowwise(tmp_path, monkeypatch):
+    rowwise = _write_back(tmp_path, monkeypatch, False)
+    batch = _write_back(tmp_path, monkeypatch, True)
+    assert rowwise == {"matched_ac": 3, "matched_amt": 0, "written": 3, "unmatched": 2, "conflicts": 1}
+    assert batch == {"matched_ac": 3, "matched_amt": 1, "written": 4, "unmatched": 2, "conflicts": 0}
@@ -0,0 +1,38 @@
+# tests/test_metrics.py
+import json
+import os
+import time
+
+import swift_core
+from swift_corpus import generate_corpus
+from swift_metrics import RunMetrics, metrics_path_for
+
+
+def test_metrics_path_for_output_and_prefix():
+    assert metrics_path_for(os.path.join("out", "20240102_Swift.xlsx")) == os.path.join("out", "20240102_Swift_metrics.json")
+    assert metrics_path_for(os.path.join("out", "20240102_Swift")) == os.path.join("out", "20240102_Swift_metrics.json")
+
+
+def test_callbacks_are_timed_as_their_own_stage(tmp_path, monkeypatch):
+    monkeypatch.setattr(swift_core, "load_acct_mapping", lambda *a, **k: ({}, {}))
+    generate_corpus(str(tmp_path / "msgs"), 5, seed=6)
+    metrics = RunMetrics("swift_batch")
+    seen = []
+
+    def slow_callback(rec):
+        seen.append(rec["FILE"])
+        time.sleep(0.02)
+
+    out = swift_core.run_swift_batch(
+        str(tmp_path / "msgs"), str(tmp_path / "out"), "mapping.xlsx",
+        output_formats=("csv",), record_callback=slow_callback, metrics=metrics,
+    )
+    assert len(seen) == 5
+    callback, write = metrics.stages["callback"], metrics.stages["write"]
+    assert callback.records == 5 and callback.wall >= 0.1
+    assert write.wall < callback.wall
+
+    base, _ = swift_core.output_paths(str(tmp_path / "out"), ["csv"])
+    with open(base + "_metrics.json", encoding="utf-8") as f:
+        assert "callback" in json.load(f)["stages"]
+    assert out == base + "_Step3_Final.csv"
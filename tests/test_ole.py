@@ -0,0 +1,87 @@
+# tests/test_ole.py
+import struct
+
+import pytest
+
+import swift_core
+from swift_corpus import _build_cfb, build_ole_msg
+from swift_ole import _CompoundFile, read_msg_body_subject
+
+
+def _write(tmp_path, name, data: bytes) -> str:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def _stream_location(path: str, name: str) -> str:
+    """流放在 mini stream 还是普通扇区"""
+    with open(path, "rb") as f:
+        cf = _CompoundFile(f)
+        return "mini" if cf.root_streams()[name][6] < cf.mini_cutoff else "fat"
+
+
+def test_small_streams_come_from_mini_stream(tmp_path):
+    body = ":20:REF123\n:32A:240102USD1000,00\n"
+    path = _write(tmp_path, "a.msg", build_ole_msg(body, "SWIFT 主题"))
+    assert _stream_location(path, "__substg1.0_1000001F") == "mini"
+    assert read_msg_body_subject(path) == (body, "SWIFT 主题")
+
+
+@pytest.mark.parametrize("n_chars", [2048, 70_000])
+def test_large_body_comes_from_fat_sectors(tmp_path, n_chars):
+    # 2048 个字符 = 4096 字节，正好到 mini stream 上限；70000 个字符要用到不止一个 FAT 扇区
+    body = ("ABCDEFGHIJ" * (n_chars // 10 + 1))[:n_chars]
+    path = _write(tmp_path, "big.msg", build_ole_msg(body, "subj", attachment_size=5000))
+    assert _stream_location(path, "__substg1.0_1000001F") == "fat"
+    assert read_msg_body_subject(path) == (body, "subj")
+
+
+def test_attachment_storage_is_not_read_as_body(tmp_path):
+    path = _write(tmp_path, "att.msg", build_ole_msg("body", "subj", attachment_size=300))
+    with open(path, "rb") as f:
+        streams = _CompoundFile(f).root_streams()
+    assert "__substg1.0_37010102" not in streams
+    assert read_msg_body_subject(path) == ("body", "subj")
+
+
+def test_ansi_property_streams(tmp_path):
+    data = _build_cfb([
+        ("__substg1.0_1000001E", "caf\xe9 body\x00".encode("cp1252")),
+        ("__substg1.0_0037001E", b"ansi subject\x00"),
+    ])
+    path = _write(tmp_path, "ansi.msg", data)
+    assert read_msg_body_subject(path) == ("caf\xe9 body", "ansi subject")
+
+
+def test_unicode_stream_wins_over_ansi(tmp_path):
+    data = _build_cfb([
+        ("__substg1.0_1000001E", b"ansi"),
+        ("__substg1.0_1000001F", "unicode".encode("utf-16-le")),
+    ])
+    path = _write(tmp_path, "both.msg", data)
+    assert read_msg_body_subject(path) == ("unicode", "")
+
+
+def test_unreadable_files_return_none(tmp_path):
+    no_body = _write(tmp_path, "nobody.msg", _build_cfb([("__substg1.0_0037001F", "s".encode("utf-16-le"))]))
+    text = _write(tmp_path, "text.msg", b"{1:F01BANK}" + bytes(600))
+    truncated = _write(tmp_path, "cut.msg", build_ole_msg("x" * 5000, "s")[:1024])
+
+    # 目录扇区链指向自己：应判为损坏而不是死循环
+    data = bytearray(build_ole_msg("body", "s"))
+    dir_start = struct.unpack_from("<I", data, 0x30)[0]
+    fat_sector = struct.unpack_from("<I", data, 0x4C)[0]
+    struct.pack_into("<I", data, (fat_sector + 1) * 512 + dir_start * 4, dir_start)
+    loop = _write(tmp_path, "loop.msg", bytes(data))
+
+    for path in (no_body, text, truncated, loop):
+        assert read_msg_body_subject(path) is None
+
+
+def test_read_msg_text_appends_subject(tmp_path):
+    body = "{1:F01BANK}{4:\n:20:REF\n-}\n-- MESSAGE HISTORY\nold"
+    path = _write(tmp_path, "m.msg", build_ole_msg(body, "主题"))
+    text = swift_core.read_msg_text(path)
+    assert text.endswith("\n主题")
+    assert "MESSAGE HISTORY" not in text and ":20:REF" in text
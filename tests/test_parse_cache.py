@@ -0,0 +1,135 @@
+# tests/test_parse_cache.py
+import os
+import re
+
+import pytest
+
+import swift_cache
+import swift_core
+import swift_ole
+from swift_cache import ParseCache
+from swift_corpus import generate_corpus
+from swift_metrics import RunMetrics
+
+REC = {"CCY": "USD", "AMT": "1,000.00"}
+
+
+def _put(cache, path):
+    st = os.stat(path)
+    cache.put(path, REC, st.st_size, st.st_mtime_ns, swift_cache.file_digest(path))
+
+
+def _touch(path, mtime: int):
+    os.utime(path, ns=(mtime * 10**9, mtime * 10**9))
+
+
+@pytest.fixture
+def msg(tmp_path):
+    path = tmp_path / "a.msg"
+    path.write_bytes(b"{1:F01BANK}{4:\n:20:REF\n-}")
+    _touch(path, 100)
+    return str(path)
+
+
+def test_hit_when_size_and_mtime_unchanged(tmp_path, msg, monkeypatch):
+    cache = ParseCache(str(tmp_path / "c.sqlite"), 1)
+    _put(cache, msg)
+    monkeypatch.setattr(swift_cache, "file_digest", lambda p: pytest.fail("不该读文件内容"))
+    assert cache.get(msg) == REC
+
+
+def test_mtime_change_with_same_content_still_hits(tmp_path, msg, monkeypatch):
+    cache = ParseCache(str(tmp_path / "c.sqlite"), 1)
+    _put(cache, msg)
+    _touch(msg, 200)                       # 例如重新拷贝一遍
+    assert cache.get(msg) == REC
+    # 新的修改时间已记下：下次不用再算哈希
+    monkeypatch.setattr(swift_cache, "file_digest", lambda p: pytest.fail("不该读文件内容"))
+    assert cache.get(msg) == REC
+
+
+def test_content_change_with_same_size_misses(tmp_path, msg):
+    cache = ParseCache(str(tmp_path / "c.sqlite"), 1)
+    _put(cache, msg)
+    data = open(msg, "rb").read()
+    with open(msg, "wb") as f:
+        f.write(data.replace(b"REF", b"XYZ"))
+    _touch(msg, 200)
+    assert cache.get(msg) is None
+
+
+def test_size_change_misses(tmp_path, msg):
+    cache = ParseCache(str(tmp_path / "c.sqlite"), 1)
+    _put(cache, msg)
+    with open(msg, "ab") as f:
+        f.write(b"\n")
+    _touch(msg, 100)                       # 修改时间不变也不算命中
+    assert cache.get(msg) is None
+
+
+def test_missing_file_misses(tmp_path, msg):
+    cache = ParseCache(str(tmp_path / "c.sqlite"), 1)
+    _put(cache, msg)
+    os.remove(msg)
+    assert cache.get(msg) is None
+
+
+def test_parser_version_bump_drops_entries(tmp_path, msg):
+    db = str(tmp_path / "c.sqlite")
+    with ParseCache(db, 1) as cache:
+        _put(cache, msg)
+    with ParseCache(db, 1) as cache:
+        assert cache.get(msg) == REC
+    with ParseCache(db, 2) as cache:
+        assert cache.get(msg) is None
+        assert cache.conn.execute("SELECT COUNT(*) FROM parsed").fetchone()[0] == 0
+    with ParseCache(db, 1) as cache:       # 退回旧版本也不会复活
+        assert cache.get(msg) is None
+
+
+def _run(paths, db, version):
+    metrics = RunMetrics("swift_core")
+    with ParseCache(db, version) as cache:
+        out = list(swift_core.iter_parsed_files(paths, cache=cache, metrics=metrics))
+    return [rec for _, rec, _ in out], metrics.counters.get("cache_hits", 0)
+
+
+def test_iter_parsed_files_reuses_and_invalidates(tmp_path):
+    paths = generate_corpus(str(tmp_path / "msgs"), 6, seed=5, max_history=2)
+    db = str(tmp_path / "c.sqlite")
+    fresh, hits = _run(paths, db, swift_core.PARSER_VERSION)
+    assert hits == 0
+
+    again, hits = _run(paths, db, swift_core.PARSER_VERSION)
+    assert hits == 6 and again == fresh
+
+    # 改一个文件的内容（日期，大小不变）：只有它重新解析，结果跟着变
+    text = open(paths[2], encoding="utf-8").read()
+    with open(paths[2], "w", encoding="utf-8") as f:
+        f.write(re.sub(r"\d{2}/\d{2}/\d{4}", "01/01/2000", text))
+    changed, hits = _run(paths, db, swift_core.PARSER_VERSION)
+    assert hits == 5
+    assert changed[2] == swift_core.parse_msg_file(paths[2]) != fresh[2]
+
+    _, hits = _run(paths, db, swift_core.PARSER_VERSION + 1)
+    assert hits == 0
+
+
+@pytest.mark.parametrize("ole", [False, True])
+def test_miss_reads_the_file_once(tmp_path, monkeypatch, ole):
+    path = generate_corpus(str(tmp_path / "msgs"), 1, seed=1, ole_ratio=1.0 if ole else 0.0)[0]
+    opened = []
+
+    def counting_open(file, *args, **kwargs):
+        opened.append(file)
+        return open(file, *args, **kwargs)
+
+    for module in (swift_core, swift_cache, swift_ole):
+        monkeypatch.setattr(module, "open", counting_open, raising=False)
+    [(idx, rec, err, _, key)] = swift_core._parse_chunk([(0, path)], cache_key=True)
+    monkeypatch.undo()
+
+    assert opened == [path]
+    assert err is None and rec == swift_core.parse_msg_file(path)
+    st = os.stat(path)
+    assert key == (st.st_size, st.st_mtime_ns, swift_cache.file_digest(path))
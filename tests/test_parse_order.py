@@ -0,0 +1,74 @@
+# tests/test_parse_order.py
+import os
+import random
+
+import swift_core
+from swift_cache import ParseCache
+from swift_corpus import generate_corpus
+
+
+def _reorder_peak(items):
+    """模拟 iter_swift_records 的按序还原：返回暂存（乱序先到）记录数的峰值"""
+    pending, next_idx, peak = set(), 0, 0
+    for idx, _, _ in items:
+        pending.add(idx)
+        peak = max(peak, len(pending))
+        while next_idx in pending:
+            pending.remove(next_idx)
+            next_idx += 1
+    assert not pending
+    return peak
+
+
+def _shuffled_size_corpus(folder, n):
+    paths = generate_corpus(folder, n, seed=3, max_history=5)
+    rnd = random.Random(7)
+    # 大小随机打乱：部分文件补上很长的尾部，大文件和小文件交错
+    for p in paths:
+        if rnd.random() < 0.3:
+            with open(p, "a", encoding="utf-8") as f:
+                f.write("\n-- MESSAGE HISTORY\n" + "x" * rnd.randint(10_000, 200_000))
+    return paths
+
+
+def test_parallel_reorder_buffer_is_bounded(tmp_path):
+    workers = 2
+    paths = _shuffled_size_corpus(str(tmp_path / "msgs"), 600)
+
+    # 一半文件先进缓存：命中和未命中交错
+    cache = ParseCache(str(tmp_path / "cache.sqlite"), swift_core.PARSER_VERSION)
+    warm = [p for i, p in enumerate(paths) if i % 7 < 3]
+    list(swift_core.iter_parsed_files(warm, 1, cache))
+
+    items = list(swift_core.iter_parsed_files(paths, workers, cache))
+    cache.close()
+
+    assert sorted(i for i, _, _ in items) == list(range(len(paths)))
+    assert all(err is None for _, _, err in items)
+    window = workers * 2 * swift_core._segment_size(len(paths), workers)
+    assert _reorder_peak(items) <= window
+
+
+def test_ordered_records_follow_file_order(tmp_path):
+    paths = _shuffled_size_corpus(str(tmp_path / "msgs"), 300)
+    files = [os.path.basename(p) for p in paths]
+    recs = list(swift_core.iter_swift_records(str(tmp_path / "msgs"), workers=2))
+    assert [r["FILE"] for r in recs] == files
+
+    serial = list(swift_core.iter_swift_records(str(tmp_path / "msgs"), workers=1))
+    assert recs == serial
+
+
+def test_pool_starts_only_for_cache_misses(tmp_path, monkeypatch):
+    monkeypatch.setattr(swift_core, "PARALLEL_MIN_FILES", 1)
+    paths = generate_corpus(str(tmp_path / "msgs"), 40, seed=4, max_history=2)
+    cache = ParseCache(str(tmp_path / "cache.sqlite"), swift_core.PARSER_VERSION)
+    started = []
+
+    list(swift_core.iter_parsed_files(paths[:30], 2, cache, pool_callback=started.append))
+    assert started == [2]
+    list(swift_core.iter_parsed_files(paths[:30], 2, cache, pool_callback=started.append))
+    assert started == [2]                      # 全部命中：不起进程池
+    list(swift_core.iter_parsed_files(paths, 2, cache, pool_callback=started.append))
+    assert started == [2, 2]                   # 有未命中：只启动一次
+    cache.close()
@@ -0,0 +1,19 @@
+# tests/test_profile.py
+import swift_profile
+import swift_records
+
+
+def test_project_modules_follow_the_directory():
+    modules = swift_profile.project_modules()
+    assert {"swift_core", "swift_records", "swift_xlsx_patch", "update_cp_swift"} <= modules
+    assert "os" not in modules and "pandas" not in modules
+
+
+def test_report_lists_project_functions(tmp_path):
+    def work():
+        swift_records.is_step3_valid({})
+
+    _, (_, report) = swift_profile.run_profiled(work, str(tmp_path))
+    text = open(report, encoding="utf-8").read()
+    project = text.split("== 全部函数")[0]
+    assert "swift_records.py" in project and "(is_step3_valid)" in project
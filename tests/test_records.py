@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from swift_records import RecordStore, RecordView, is_step3_valid
+
+
+def _records(n: int, seed: int = 0) -> list[dict]:
+    rnd = random.Random(seed)
+    pick = lambda *vals: rnd.choice(vals)
+    return [
+        {
+            "FILE": f"{i:06d}.msg",
+            "Client Acct": pick("", "  ", "001-123", "002-456"),
+            "DATE": pick("", "2024-01-02", "2024-01-03"),
+            "CCY": pick("", "USD", "HKD", None),
+            "AMT": pick("", " ", "1,000.00", "25.5", "300", "abc"),
+            "CP A/C": pick("", "", "", "987"),
+            "CP SWIFT": pick("", None, "BANKHKHH"),
+            "DIRECTION": pick("IN", "OUT"),
+            "ERROR": "",
+        }
+        for i in range(n)
+    ]
+
+
+def test_valid_mask_matches_row_rule():
+    recs = _records(500)
+    store = RecordStore()
+    for rec in recs[:200]:
+        store.append(rec)
+    store.valid_mask()          # 中途取一次，后续追加仍要对得上
+    store.extend(recs[200:])
+    assert list(store.valid_mask()) == [int(is_step3_valid(r)) for r in recs]
+    final = store.select(store.valid_mask())
+    assert [r["FILE"] for r in final] == [r["FILE"] for r in recs if is_step3_valid(r)]
+
+
+@pytest.mark.parametrize("col", ["CCY", "AMT", "FILE"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_incremental_add_equals_full_sort(col, descending):
+    recs = _records(400, seed=1)
+    store = RecordStore()
+    view = RecordView(store)
+    view.set_sort(col, descending)
+    batches = [5, 1, 60, 0, 134, 200]
+    start = 0
+    for size in batches:
+        store.extend(recs[start:start + size])
+        start += size
+        view.extend()
+
+    full = RecordView(store)
+    full.extend()
+    full.set_sort(col, descending)
+    assert list(view.rows) == list(full.rows)
+
+    view.set_sort(None)
+    assert list(view.rows) == list(range(len(recs)))
@@ -0,0 +1,206 @@
+# tests/test_watch.py
+import os
+
+import pandas as pd
+import pytest
+
+import swift_core
+from swift_core import FolderWatcher
+from swift_corpus import generate_corpus
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _write(path, data: bytes, mtime: int, mode="wb"):
+    with open(path, mode) as f:
+        f.write(data)
+    os.utime(path, ns=(mtime * 10**9, mtime * 10**9))
+
+
+def test_partially_written_file_waits_until_settled(tmp_path):
+    clock = _Clock()
+    watcher = FolderWatcher(str(tmp_path), settle=3.0, clock=clock)
+    path = tmp_path / "a.msg"
+
+    _write(path, b"{1:F01", mtime=100)
+    assert watcher.poll() == ([], [])          # 第一次看到：开始计时
+
+    clock.now = 2.0
+    _write(path, b"BANK}{4:", mtime=102, mode="ab")
+    assert watcher.poll() == ([], [])          # 还在写：重新计时
+
+    clock.now = 4.9
+    assert watcher.poll() == ([], [])          # 最后一次变化后还不到 3 秒
+
+    clock.now = 5.0
+    assert watcher.poll() == (["a.msg"], [])
+    clock.now = 9.0
+    assert watcher.poll() == ([], [])          # 交出去之后不再重复
+
+
+def test_changed_file_is_handed_out_again_after_settling(tmp_path):
+    clock = _Clock()
+    watcher = FolderWatcher(str(tmp_path), settle=1.0, clock=clock)
+    path = tmp_path / "a.msg"
+    _write(path, b"v1", mtime=100)
+    watcher.poll()
+    clock.now = 1.0
+    assert watcher.poll() == (["a.msg"], [])
+
+    _write(path, b"v2", mtime=200)             # 大小不变，只有修改时间变
+    clock.now = 2.0
+    assert watcher.poll() == ([], [])
+    clock.now = 3.0
+    assert watcher.poll() == (["a.msg"], [])
+
+
+def test_removed_and_skipped_files(tmp_path):
+    clock = _Clock()
+    watcher = FolderWatcher(str(tmp_path), settle=0.0, clock=clock)
+    for name in ("b.msg", "a.msg", "x_FFD.msg", "notes.txt"):
+        _write(tmp_path / name, b"data", mtime=100)
+    watcher.poll()
+    assert watcher.poll() == (["a.msg", "b.msg"], [])
+
+    os.remove(tmp_path / "a.msg")
+    assert watcher.poll() == ([], ["a.msg"])
+    assert watcher.poll() == ([], [])
+
+
+def test_file_removed_while_settling_is_forgotten(tmp_path):
+    clock = _Clock()
+    watcher = FolderWatcher(str(tmp_path), settle=1.0, clock=clock)
+    path = tmp_path / "a.msg"
+    _write(path, b"tmp", mtime=100)
+    watcher.poll()
+    os.remove(path)
+    clock.now = 5.0
+    assert watcher.poll() == ([], [])          # 没交出去过，不算删除
+
+    _write(path, b"tmp", mtime=100)            # 同名同状态重新出现：重新计时
+    assert watcher.poll() == ([], [])
+    clock.now = 6.0
+    assert watcher.poll() == (["a.msg"], [])
+
+
+def test_locked_file_waits_until_readable(tmp_path, monkeypatch):
+    clock = _Clock()
+    watcher = FolderWatcher(str(tmp_path), settle=1.0, clock=clock)
+    _write(tmp_path / "a.msg", b"data", mtime=100)
+    watcher.poll()
+
+    locked = {str(tmp_path / "a.msg")}
+    monkeypatch.setattr(swift_core, "_readable", lambda p: p not in locked)
+    clock.now = 2.0
+    assert watcher.poll() == ([], [])          # 已稳定但还被写入方独占
+    locked.clear()
+    assert watcher.poll() == (["a.msg"], [])
+
+
+# -------------------------
+# 监视模式的输出：csv / parquet 只追加，Excel 按间隔/空闲重写
+# -------------------------
+def _records(tmp_path, n):
+    folder = str(tmp_path / "msgs")
+    generate_corpus(folder, n, seed=2, max_history=2)
+    return list(swift_core.iter_swift_records(folder))
+
+
+def _tables(folder, formats=("csv", "parquet")):
+    base, _ = swift_core.output_paths(str(folder), ["csv"])
+    out = {}
+    for fmt in formats:
+        for kind in ("Step3_Final", "Debug"):
+            path = f"{base}_{kind}.{fmt}"
+            out[(fmt, kind)] = open(path, "rb").read() if fmt == "csv" else pd.read_parquet(path)
+    return out
+
+
+def _assert_same_tables(got, want):
+    assert got.keys() == want.keys()
+    for k in got:
+        if k[0] == "csv":
+            assert got[k] == want[k], k
+        else:
+            pd.testing.assert_frame_equal(got[k], want[k])
+
+
+def _rewrites(monkeypatch):
+    calls = []
+    real = swift_core._write_watch_output
+
+    def counting(output_dir, formats, records):
+        calls.append(list(formats))
+        return real(output_dir, formats, records)
+
+    monkeypatch.setattr(swift_core, "_write_watch_output", counting)
+    return calls
+
+
+def test_watch_output_appends_new_files(tmp_path, monkeypatch):
+    recs = _records(tmp_path, 30)
+    out = swift_core._WatchOutput(str(tmp_path / "out"), ["csv", "parquet"], xlsx_interval=0)
+    os.makedirs(tmp_path / "out")
+    calls = _rewrites(monkeypatch)
+
+    out.update(recs[:10])
+    out.update(recs[:10])                          # 没有新记录：什么都不写
+    out.update(recs[:25])
+    out.update(recs)
+    assert calls == [["csv", "parquet"]]           # 只有第一次整表写
+
+    os.makedirs(tmp_path / "ref")
+    swift_core._write_watch_output(str(tmp_path / "ref"), ["csv", "parquet"], recs)
+    _assert_same_tables(_tables(tmp_path / "out"), _tables(tmp_path / "ref"))
+
+
+def test_watch_output_rewrites_when_order_or_content_changes(tmp_path, monkeypatch):
+    recs = _records(tmp_path, 20)
+    out = swift_core._WatchOutput(str(tmp_path / "out"), ["csv", "parquet"], xlsx_interval=0)
+    os.makedirs(tmp_path / "out")
+    calls = _rewrites(monkeypatch)
+    kept = recs[:3] + recs[4:15]
+
+    out.update(recs[5:15])
+    out.update(recs[:15])                          # 新文件排在已写出的前面
+    out.update(kept)                               # 删除
+    out.invalidate()                               # 已写出的记录内容变了（变更 / PRIM ID 重查）
+    out.update(kept)
+    assert len(calls) == 4
+
+    # 输出被手动删掉：追加失败（监视循环提示后下一轮重试），重试时整表重写
+    os.remove(swift_core.output_paths(str(tmp_path / "out"), ["csv"])[0] + "_Debug.csv")
+    with pytest.raises(FileNotFoundError):
+        out.update(kept + recs[15:18])
+    out.update(kept + recs[15:])
+    assert len(calls) == 5
+
+    os.makedirs(tmp_path / "ref")
+    swift_core._write_watch_output(str(tmp_path / "ref"), ["csv", "parquet"], kept + recs[15:])
+    _assert_same_tables(_tables(tmp_path / "out"), _tables(tmp_path / "ref"))
+
+
+def test_watch_output_throttles_xlsx(tmp_path, monkeypatch):
+    recs = _records(tmp_path, 5)
+    clock = _Clock()
+    out = swift_core._WatchOutput(str(tmp_path / "out"), ["xlsx", "csv"], xlsx_interval=30.0, clock=clock)
+    os.makedirs(tmp_path / "out")
+    calls = _rewrites(monkeypatch)
+
+    out.update(recs[:2])
+    assert out.xlsx_pending and out.write_xlsx(recs[:2])      # 第一次立即写
+    clock.now = 10.0
+    out.update(recs[:4])
+    assert not out.write_xlsx(recs[:4]) and out.xlsx_pending  # 不到 30 秒：推迟
+    assert out.write_xlsx(recs[:4], force=True)               # 空闲 / 停止：补写
+    clock.now = 20.0
+    out.update(recs)
+    clock.now = 40.0
+    assert out.write_xlsx(recs) and not out.xlsx_pending
+    assert calls == [["csv"], ["xlsx"], ["xlsx"], ["xlsx"]]
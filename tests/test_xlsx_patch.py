@@ -0,0 +1,297 @@
+# tests/test_xlsx_patch.py
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import update_cp_swift as upd
+from swift_xlsx_patch import NS_MAIN, NS_REL, CellPatch, DwWorkbookPatcher, NewSheet, XlsxPatchError
+
+SHEET = upd.DW_SHEET
+ORANGE = upd.ORANGE_RGB
+CT = "application/vnd.openxmlformats-officedocument.spreadsheetml."
+REL = NS_REL + "/"
+PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+UNMATCHED = [(2, "ACC1", 100.5, "SWIFTAAAXXX", "未匹配到DW"), (3, "", None, "", "CP SWIFT为空，未写回")]
+
+
+# -------------------------
+# 手写 xlsx：openpyxl 不会写出的结构（命名空间前缀、没有 r 的行/单元格、共享公式、calcChain……）
+# -------------------------
+class _Unseekable(io.RawIOBase):
+    """只能顺序写的输出：zipfile 会给每个部件写 data descriptor"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self.f.write(b)
+
+    def flush(self):
+        self.f.flush()
+
+
+def _xlsx(path, rows: str, p: str = "", strings=(), calc_chain=False, stream=False):
+    """rows：sheetData 里的行 XML（前缀已写好），None 表示 <sheetData/>；p 为主命名空间前缀（如 "x:"）"""
+    ns = f'xmlns{":" + p[:-1] if p else ""}="{NS_MAIN}"'
+    sheet_data = f"<{p}sheetData/>" if rows is None else f"<{p}sheetData>{rows}</{p}sheetData>"
+    parts = {
+        "[Content_Types].xml": (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{CT}sheet.main+xml"/>'
+            f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="{CT}worksheet+xml"/>'
+            f'<Override PartName="/xl/styles.xml" ContentType="{CT}styles+xml"/>'
+            f'<Override PartName="/xl/sharedStrings.xml" ContentType="{CT}sharedStrings+xml"/>'
+            + (f'<Override PartName="/xl/calcChain.xml" ContentType="{CT}calcChain+xml"/>' if calc_chain else "")
+            + "</Types>"
+        ),
+        "_rels/.rels": (
+            f'<Relationships xmlns="{PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{REL}officeDocument" Target="xl/workbook.xml"/></Relationships>'
+        ),
+        "xl/workbook.xml": (
+            f'<{p}workbook {ns} xmlns:r="{NS_REL}"><{p}sheets>'
+            f'<{p}sheet name="{SHEET}" sheetId="1" r:id="rId1"/>'
+            f'<{p}sheet name="Other" sheetId="2" r:id="rId5"/>'
+            f"</{p}sheets></{p}workbook>"
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            f'<Relationships xmlns="{PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{REL}worksheet" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId5" Type="{REL}worksheet" Target="worksheets/sheet2.xml"/>'
+            f'<Relationship Id="rId2" Type="{REL}styles" Target="styles.xml"/>'
+            f'<Relationship Id="rId3" Type="{REL}sharedStrings" Target="sharedStrings.xml"/>'
+            + (f'<Relationship Id="rId4" Type="{REL}calcChain" Target="calcChain.xml"/>' if calc_chain else "")
+            + "</Relationships>"
+        ),
+        "xl/styles.xml": (
+            f"<{p}styleSheet {ns}>"
+            f'<{p}fonts count="1"><{p}font><{p}sz val="11"/><{p}name val="Calibri"/></{p}font></{p}fonts>'
+            f'<{p}fills count="2"><{p}fill><{p}patternFill patternType="none"/></{p}fill>'
+            f'<{p}fill><{p}patternFill patternType="gray125"/></{p}fill></{p}fills>'
+            f'<{p}borders count="1"><{p}border><{p}left/><{p}right/><{p}top/><{p}bottom/><{p}diagonal/>'
+            f"</{p}border></{p}borders>"
+            f'<{p}cellStyleXfs count="1"><{p}xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></{p}cellStyleXfs>'
+            f'<{p}cellXfs count="1"><{p}xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></{p}cellXfs>'
+            f'<{p}cellStyles count="1"><{p}cellStyle name="Normal" xfId="0" builtinId="0"/></{p}cellStyles>'
+            f"</{p}styleSheet>"
+        ),
+        "xl/sharedStrings.xml": (
+            f'<{p}sst {ns} count="{len(strings)}" uniqueCount="{len(strings)}">'
+            + "".join(f"<{p}si><{p}t>{s}</{p}t></{p}si>" for s in strings)
+            + f"</{p}sst>"
+        ),
+        "xl/worksheets/sheet1.xml": f"<{p}worksheet {ns}>{sheet_data}</{p}worksheet>",
+        "xl/worksheets/sheet2.xml": (
+            f'<{p}worksheet {ns}><{p}sheetData><{p}row r="1"><{p}c r="A1"><{p}v>7</{p}v></{p}c>'
+            f"</{p}row></{p}sheetData></{p}worksheet>"
+        ),
+    }
+    if calc_chain:
+        parts["xl/calcChain.xml"] = f'<{p}calcChain {ns}><{p}c r="C2" i="1"/></{p}calcChain>'
+
+    with open(path, "wb") as f:
+        with zipfile.ZipFile(_Unseekable(f) if stream else f, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, xml in parts.items():
+                data = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + xml).encode("utf-8")
+                if stream:
+                    with zf.open(name, "w", force_zip64=True) as dst:
+                        dst.write(data)
+                else:
+                    zf.writestr(name, data)
+    return str(path)
+
+
+def _snapshot(path) -> dict:
+    """{工作表: {(行, 列): (值, 填充色, 加粗)}}，只收有值或有格式的单元格"""
+    wb = load_workbook(path)
+    out = {}
+    for ws in wb.worksheets:
+        cells = {}
+        for row in ws.iter_rows():
+            for c in row:
+                fill = c.fill.fgColor.rgb if c.fill.fill_type == "solid" else None
+                if c.value is not None or fill or c.font.b:
+                    cells[(c.row, c.column)] = (c.value, fill, bool(c.font.b))
+        out[ws.title] = cells
+    return out
+
+
+def _save_both(tmp_path, src, patches):
+    """定点改写和 openpyxl 整本写回各存一份，返回 (定点, openpyxl) 的输出路径"""
+    fast = str(tmp_path / "fast.xlsx")
+    ref = str(tmp_path / "ref.xlsx")
+    with DwWorkbookPatcher(src) as patcher:
+        patcher.save(fast, SHEET, patches,
+                     NewSheet(upd.UNMATCHED_SHEET, upd.UNMATCHED_HEADERS, UNMATCHED, row_fill=upd.YELLOW_RGB))
+    upd.save_with_openpyxl(patches, UNMATCHED, src, ref)
+    return fast, ref
+
+
+def _assert_same_as_openpyxl(tmp_path, src, patches):
+    fast, ref = _save_both(tmp_path, src, patches)
+    with zipfile.ZipFile(fast) as zf:
+        assert zf.testzip() is None
+    assert _snapshot(fast) == _snapshot(ref)
+    return fast
+
+
+def _assert_columns_match_pandas(src):
+    with DwWorkbookPatcher(src) as patcher:
+        dw_df, header = upd.read_dw_columns(patcher)
+    full = pd.read_excel(src, sheet_name=SHEET, engine="openpyxl")
+    want = full[[upd.DW_ACCOUNT_COL[0], upd.DW_AMOUNT_COL[0]]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(dw_df, want)
+    assert header == {c: v for c, v in enumerate(full.columns, 1) if not str(v).startswith("Unnamed")}
+
+
+# 表头：A 金额、B 账号、C 写回列（共享字符串 0/1/2）
+STRINGS = (upd.DW_AMOUNT_COL[0], upd.DW_ACCOUNT_COL[0], "交易对手账户开户行号", "ACC-1", "ACC-2")
+PATCHES = {
+    (2, 3): CellPatch("SWIFTAAAXXX"),                  # 已有单元格改值
+    (3, 3): CellPatch("SWIFTBBBXXX", fill=ORANGE),     # 行里没有的单元格
+    (4, 1): CellPatch(fill=ORANGE),                    # 只改填充色
+    (9, 3): CellPatch("SWIFTCCCXXX"),                  # 表里没有的行
+}
+
+
+def _rows(p: str, with_ref: bool = True) -> str:
+    def c(ref, inner, t=None):
+        attrs = (f' r="{ref}"' if with_ref else "") + (f' t="{t}"' if t else "")
+        return f"<{p}c{attrs}>{inner}</{p}c>"
+
+    def row(num, cells):
+        attrs = f' r="{num}"' if with_ref else ""
+        return f"<{p}row{attrs}>{''.join(cells)}</{p}row>"
+
+    v = lambda x: f"<{p}v>{x}</{p}v>"
+    return "".join([
+        row(1, [c("A1", v(0), "s"), c("B1", v(1), "s"), c("C1", v(2), "s")]),
+        row(2, [c("A2", v("100.5")), c("B2", v(3), "s"), c("C2", v("OLD"), "str")]),
+        row(3, [c("A3", v("200")), c("B3", v(4), "s")]),
+        row(4, [c("A4", v("300")), c("B4", f"<{p}is><{p}t>ACC-3</{p}t></{p}is>", "inlineStr")]),
+    ])
+
+
+@pytest.mark.parametrize("p", ["", "x:"])
+def test_round_trip_matches_openpyxl(tmp_path, p):
+    src = _xlsx(tmp_path / "dw.xlsx", _rows(p), p=p, strings=STRINGS)
+    _assert_same_as_openpyxl(tmp_path, src, PATCHES)
+    _assert_columns_match_pandas(src)
+
+
+def test_prefixed_namespace_is_kept(tmp_path):
+    src = _xlsx(tmp_path / "dw.xlsx", _rows("x:"), p="x:", strings=STRINGS)
+    fast = _assert_same_as_openpyxl(tmp_path, src, PATCHES)
+    with zipfile.ZipFile(fast) as zf:
+        sheet = zf.read("xl/worksheets/sheet1.xml")
+        workbook = zf.read("xl/workbook.xml")
+    assert b"<c " not in sheet and b"<row " not in sheet
+    assert b'<x:c r="C3"' in sheet and b'<x:row r="9"' in sheet
+    assert f'<x:sheet name="{upd.UNMATCHED_SHEET}"'.encode() in workbook
+
+
+def test_rows_and_cells_without_r_attribute(tmp_path):
+    src = _xlsx(tmp_path / "dw.xlsx", _rows("", with_ref=False), strings=STRINGS)
+    _assert_same_as_openpyxl(tmp_path, src, PATCHES)
+    _assert_columns_match_pandas(src)
+
+
+def test_empty_sheet_data(tmp_path):
+    src = _xlsx(tmp_path / "dw.xlsx", None, strings=STRINGS)
+    _assert_same_as_openpyxl(tmp_path, src, {(1, 2): CellPatch("X"), (3, 1): CellPatch("Y", fill=ORANGE)})
+    with DwWorkbookPatcher(src) as patcher:
+        assert patcher.read_columns(SHEET, [1, 2]) == ({}, {1: [], 2: []}, 0)
+
+
+def _formula_rows(shared_master: bool) -> str:
+    f = '<f t="shared" ref="C2:C3" si="0">A2*2</f>' if shared_master else "<f>A2*2</f>"
+    return (
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c></row>'
+        f'<row r="2"><c r="A2"><v>1</v></c><c r="C2">{f}<v>2</v></c></row>'
+        '<row r="3"><c r="A3"><v>2</v></c><c r="C3"><f t="shared" si="0"/><v>4</v></c></row>'
+    )
+
+
+def test_shared_formula_master_is_refused(tmp_path):
+    src = _xlsx(tmp_path / "dw.xlsx", _formula_rows(shared_master=True), strings=STRINGS)
+    out = tmp_path / "out.xlsx"
+    with DwWorkbookPatcher(src) as patcher, pytest.raises(XlsxPatchError):
+        patcher.save(str(out), SHEET, {(2, 3): CellPatch("SWIFT")})
+    assert not out.exists() and not (tmp_path / "out.xlsx.tmp").exists()
+
+    # 共享公式的从属单元格可以覆盖，结果同 openpyxl
+    _assert_same_as_openpyxl(tmp_path, src, {(3, 3): CellPatch("SWIFT")})
+
+
+def _calc_chain_refs(path):
+    with zipfile.ZipFile(path) as zf:
+        names = set(zf.namelist())
+        rels = zf.read("xl/_rels/workbook.xml.rels").decode()
+        types = zf.read("[Content_Types].xml").decode()
+    return "xl/calcChain.xml" in names, "calcChain" in rels, "calcChain" in types
+
+
+def test_calc_chain_dropped_only_when_formula_overwritten(tmp_path):
+    src = _xlsx(tmp_path / "dw.xlsx", _formula_rows(shared_master=False), strings=STRINGS, calc_chain=True)
+
+    fast = _assert_same_as_openpyxl(tmp_path, src, {(2, 1): CellPatch(5)})
+    assert _calc_chain_refs(fast) == (True, True, True)
+
+    fast = _assert_same_as_openpyxl(tmp_path, src, {(2, 3): CellPatch("SWIFT")})
+    assert _calc_chain_refs(fast) == (False, False, False)
+
+
+def test_copy_raw_data_descriptor_and_zip64(tmp_path):
+    src = _xlsx(tmp_path / "dw.xlsx", _rows(""), strings=STRINGS, stream=True)
+    with zipfile.ZipFile(src) as zf:
+        infos = zf.infolist()
+        assert all(i.flag_bits & 0x08 for i in infos)
+        with open(src, "rb") as f:
+            for i in infos:
+                f.seek(i.header_offset + 26)
+                n_name = int.from_bytes(f.read(2), "little")
+                n_extra = int.from_bytes(f.read(2), "little")
+                f.seek(n_name, 1)
+                assert f.read(n_extra)[:2] == b"\x01\x00"   # 本地头带 zip64 扩展
+        untouched = {i.filename: zf.read(i) for i in infos if "sheet1" not in i.filename
+                     and i.filename not in ("xl/styles.xml", "xl/workbook.xml",
+                                            "xl/_rels/workbook.xml.rels", "[Content_Types].xml")}
+
+    fast = _assert_same_as_openpyxl(tmp_path, src, PATCHES)
+    with zipfile.ZipFile(fast) as zf:
+        for name, data in untouched.items():
+            info = zf.getinfo(name)
+            assert not info.flag_bits & 0x08
+            assert zf.read(info) == data
+
+
+@pytest.mark.parametrize("broken", ["sheet", "column"])
+def test_write_back_closes_dw_on_read_error(tmp_path, monkeypatch, broken):
+    opened = []
+
+    class Recording(DwWorkbookPatcher):
+        def __init__(self, path):
+            super().__init__(path)
+            opened.append(self)
+
+    monkeypatch.setattr(upd, "DwWorkbookPatcher", Recording)
+    monkeypatch.setattr(upd, "USE_DW_INDEX_CACHE", False)
+    if broken == "sheet":
+        monkeypatch.setattr(upd, "DW_SHEET", "NoSuchSheet")
+    src = _xlsx(tmp_path / "dw.xlsx", None if broken == "column" else _rows(""), strings=STRINGS)
+
+    step3 = upd.Step3Rows()
+    step3.append_record({"CP A/C": "ACC-1", "AMT VALUE": 100.5, "CP SWIFT": "SWIFTAAAXXX"})
+    with pytest.raises(KeyError):
+        upd.write_back_step3(step3, dw_file=src, output_file=str(tmp_path / "out.xlsx"),
+                             status_callback=lambda msg: None)
+    assert len(opened) == 1 and opened[0].zf.fp is None
@@ -1,12 +1,20 @@
 
+import os
 import re
 import sys
+from bisect import bisect_left, bisect_right
 from typing import Optional, Tuple, List, Dict
 
+import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
 from openpyxl.styles import PatternFill, Font
 
+from swift_cache import dw_index_cache_key, load_dw_index_cache, save_dw_index_cache
+from swift_metrics import RunMetrics, metrics_path_for
+from swift_xlsx_patch import KEEP, CellPatch, DwWorkbookPatcher, NewSheet, XlsxPatchError
+
 
 # =======================
 # 配置区：按需修改
@@ -27,6 +35,30 @@ AMT_DELTA = 100
 # False = 不覆盖，保留第一次写入，并标橙提示冲突（更安全）
 ALLOW_OVERWRITE_ON_CONFLICT = False
 
+# 匹配方式：
+# True = 整批一对一匹配（每个账号内按金额差做最优分配，再在金额窗口内分配，同一DW行尽量只分给一条Step3，冲突更少）
+# False = 逐行匹配（按Step3顺序一条条找，先到先得）
+BATCH_MATCH = True
+
+# 整批匹配时单个账号的最优分配表（有金额的 Step3 行数 × DW 行数）上限；
+# 超过的账号退回“金额差最小的先配”的贪心分配，控制内存
+ASSIGN_MAX_PAIRS = 1_000_000
+
+# DW匹配索引（账号、金额）缓存到本机用户目录，按DW文件的 (路径, sheet, mtime, size) 失效；
+# DW没变时下次直接载入索引，不再读工作表
+USE_DW_INDEX_CACHE = True
+
+# DW匹配用到的列：(表头名, 找不到表头时的Excel列字母)
+DW_ACCOUNT_COL = ("交易对手存款账户编码", "X")
+DW_AMOUNT_COL = ("存款发生金额", "O")
+
+UNMATCHED_SHEET = "Unmatched_Step3"
+UNMATCHED_HEADERS = ["Step3_Excel行号", "CP A/C", "AMT", "CP SWIFT", "原因"]
+
+# 标色（ARGB，与 openpyxl PatternFill(start_color="FFFF00") 写出的一致）
+YELLOW_RGB = "00FFFF00"
+ORANGE_RGB = "00FFC000"   # 冲突
+
 
 # =======================
 # 工具函数
@@ -84,6 +116,7 @@ def pick_column(df: pd.DataFrame, preferred_name: str, fallback_excel_letter: st
 def find_best_by_amount(amount_list: List[Tuple[float, int]], target_amt: float, delta: float) -> Optional[int]:
     """
     在amount_list中找落在 [target-delta, target] 的记录，返回最接近target的dw_df行号(index)
+    线性扫描 O(N)；主流程用 AmountIndex.find_best（结果相同），这里保留作对照。
     """
     low = target_amt - delta
     high = target_amt
@@ -94,28 +127,541 @@ def find_best_by_amount(amount_list: List[Tuple[float, int]], target_amt: float,
     return candidates[0][1]
 
 
-def build_dw_indexes(dw_df: pd.DataFrame) -> Tuple[Dict[str, List[int]], List[Tuple[float, int]]]:
+class AmountIndex:
     """
-    构建两个索引：
-    1) account -> [dw_df_index...]
-    2) amount_list: [(amount_value, dw_df_index), ...]
+    按金额排序的索引：[target-delta, target] 窗口查询用二分，O(log N)。
+    结果与 find_best_by_amount 线性扫描完全一致：
+    - 取距离 target 最近（即窗口内最大）的金额
+    - 距离相同的多条取 amount_list 中靠前的（线性扫描用的是稳定排序）
+    """
+
+    __slots__ = ("amounts", "order", "rows")
+
+    def __init__(self, amount_list: List[Tuple[float, int]]):
+        # NaN 与任何数比较都为 False，线性扫描永远选不中，这里直接剔除
+        triples = sorted((a, pos, i) for pos, (a, i) in enumerate(amount_list) if a == a)
+        self.amounts = [t[0] for t in triples]
+        self.order = [t[1] for t in triples]
+        self.rows = [t[2] for t in triples]
+
+    @classmethod
+    def from_sorted(cls, amounts: List[float], rows: List[int]) -> "AmountIndex":
+        """已按 (金额, 行号) 排好序的数据直接建索引（缓存载入用）；行号本身就保持原先后顺序"""
+        index = cls.__new__(cls)
+        index.amounts = amounts
+        index.order = rows
+        index.rows = rows
+        return index
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def find_best(self, target_amt: float, delta: float) -> Optional[int]:
+        low = target_amt - delta
+        if target_amt != target_amt or low != low:
+            return None
+        amounts = self.amounts
+        lo = bisect_left(amounts, low)
+        hi = bisect_right(amounts, target_amt)
+        if lo >= hi:
+            return None
+
+        # 窗口内最大金额距离最近；向左收集同距离的（含浮点舍入后距离相等的不同金额），取最靠前的一条。
+        # target 为 ±inf 时距离是 NaN，线性扫描的排序视其相等，这里同样处理
+        best_dist = abs(target_amt - amounts[hi - 1])
+        best = hi - 1
+        k = hi - 2
+        while k >= lo:
+            d = abs(target_amt - amounts[k])
+            if not (d == best_dist or (d != d and best_dist != best_dist)):
+                break
+            if self.order[k] < self.order[best]:
+                best = k
+            k -= 1
+        return self.rows[best]
+
+
+def _closest(postings: List[Tuple[float, int]], target: float) -> Optional[int]:
+    """postings 按 (金额, 行号) 升序；返回金额离 target 最近的位置，距离相同取行号小的"""
+    if not postings:
+        return None
+    k = bisect_left(postings, (target,))
+    best = None
+    for j in (k - 1, k):
+        if not 0 <= j < len(postings):
+            continue
+        if j == k - 1:
+            j = bisect_left(postings, (postings[j][0],))   # 同金额多行：取行号最小的一条
+        d = abs(target - postings[j][0])
+        if best is None or d < best[0] or (d == best[0] and postings[j][1] < postings[best[1]][1]):
+            best = (d, j)
+    return best[1]
+
+
+class AccountAmountIndex:
+    """
+    账号 -> 该账号下按金额排序的DW行。
+    同一交易对手账号在DW里有多行时，take() 取“金额最接近 Step3 AMT、且还没写回过”的一行，
+    二分查找 O(log K)；用掉的行从可选列表里移除。
+    - Step3 没有金额，或该账号剩下的行都没有金额：取还没用过的行中行号最小的
+    - 该账号的行全部用过：仍按金额取最接近的一行（沿用冲突检查 / 标橙）
     """
-    dw_acc_col = pick_column(dw_df, "交易对手存款账户编码", "X")
-    dw_amt_col = pick_column(dw_df, "存款发生金额", "O")
 
-    account_map: Dict[str, List[int]] = {}
-    for i, v in dw_acc_col.items():
-        acc = normalize_account(v)
+    __slots__ = ("_all", "_available", "_key_of")
+
+    def __init__(self, account_rows: Dict[str, List[Tuple[Optional[float], int]]]):
+        # 每个账号：([(金额, 行号)...] 升序, [没金额的行号...] 升序)
+        self._all = {}
+        self._available = {}
+        self._key_of = {}   # 行号 -> (账号, 金额或None)
+        for acc, postings in account_rows.items():
+            valued = sorted((a, i) for a, i in postings if a is not None and a == a)
+            blank = sorted(i for a, i in postings if a is None or a != a)
+            self._all[acc] = (valued, blank)
+            self._available[acc] = (list(valued), list(blank))
+            for a, i in valued:
+                self._key_of[i] = (acc, a)
+            for i in blank:
+                self._key_of[i] = (acc, None)
+
+    def __contains__(self, account: str) -> bool:
+        return account in self._all
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def take(self, account: str, target_amt: Optional[float]) -> Optional[int]:
+        if account not in self._all:
+            return None
+        valued, blank = self._available[account]
+        has_target = target_amt is not None and target_amt == target_amt
+
+        if has_target and valued:
+            row = valued[_closest(valued, target_amt)][1]
+        elif has_target and blank:
+            row = blank[0]
+        elif valued or blank:
+            # Step3 没有金额可比：取行号最小的未用行
+            row = min([i for _, i in valued] + blank[:1])
+        else:
+            # 全部用过：不再区分是否写过，按金额（没金额则按行号）取
+            all_valued, all_blank = self._all[account]
+            if has_target and all_valued:
+                return all_valued[_closest(all_valued, target_amt)][1]
+            return min([i for _, i in all_valued] + all_blank)
+        self.mark_used(row)
+        return row
+
+    def has_available(self, account: str) -> bool:
+        valued, blank = self._available.get(account, ((), ()))
+        return bool(valued or blank)
+
+    def mark_used(self, row: int):
+        """DW行已写回（账号或金额匹配）：不再作为账号匹配的候选"""
+        key = self._key_of.get(row)
+        if key is None:
+            return
+        acc, amt = key
+        valued, blank = self._available[acc]
+        if amt is None:
+            k = bisect_left(blank, row)
+            if k < len(blank) and blank[k] == row:
+                del blank[k]
+        else:
+            k = bisect_left(valued, (amt, row))
+            if k < len(valued) and valued[k] == (amt, row):
+                del valued[k]
+
+
+def dw_match_keys(dw_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    DW 匹配键：index 为 dw_df 行号，两列
+    - acc：规范化后的交易对手账号（空为 ""）
+    - amt：金额 float（转不了为 NaN）
+    """
+    dw_acc_col = pick_column(dw_df, *DW_ACCOUNT_COL)
+    dw_amt_col = pick_column(dw_df, *DW_AMOUNT_COL)
+    amounts = [to_number(v) for v in dw_amt_col]
+    return pd.DataFrame(
+        {
+            "acc": [normalize_account(v) for v in dw_acc_col],
+            "amt": np.array([np.nan if a is None else a for a in amounts], dtype=float),
+        },
+        index=dw_acc_col.index,
+    )
+
+
+def amount_index_from_keys(keys: pd.DataFrame) -> AmountIndex:
+    amt = keys["amt"]
+    return AmountIndex(list(zip(amt[amt.notna()].tolist(), amt.index[amt.notna()].tolist())))
+
+
+def account_index_from_keys(keys: pd.DataFrame) -> AccountAmountIndex:
+    account_rows: Dict[str, List[Tuple[Optional[float], int]]] = {}
+    for i, acc, amt in zip(keys.index.tolist(), keys["acc"].tolist(), keys["amt"].tolist()):
         if acc:
-            account_map.setdefault(acc, []).append(i)
+            account_rows.setdefault(acc, []).append((amt, i))
+    return AccountAmountIndex(account_rows)
+
 
-    amount_list = []
-    for i, v in dw_amt_col.items():
-        amt = to_number(v)
-        if amt is not None:
-            amount_list.append((amt, i))
+def pack_dw_index(keys: pd.DataFrame, amount_index: AmountIndex, header: Dict[int, object]) -> dict:
+    """
+    匹配键 + 金额排序结果 -> 紧凑二进制（写缓存用）：
+    - acc：账号按 \0 连接后的 UTF-8
+    - amt：float64 数组
+    - amount_rows：AmountIndex 的行号顺序（int64），载入时不必重新排序
+    """
+    return {
+        "rows": len(keys),
+        "acc": "\0".join(keys["acc"].tolist()).encode("utf-8"),
+        "amt": keys["amt"].to_numpy(dtype=np.float64).tobytes(),
+        "amount_rows": np.asarray(amount_index.rows, dtype=np.int64).tobytes(),
+        "header": header,
+    }
+
+
+def unpack_dw_index(packed: dict) -> Tuple[pd.DataFrame, AmountIndex, Dict[int, object]]:
+    """pack_dw_index 的逆过程，返回 (匹配键, AmountIndex, 表头)"""
+    n = packed["rows"]
+    acc = packed["acc"].decode("utf-8").split("\0") if n else []
+    amt = np.frombuffer(packed["amt"], dtype=np.float64)
+    if len(acc) != n or len(amt) != n:
+        raise ValueError("DW索引缓存内容不完整")
+    rows = np.frombuffer(packed["amount_rows"], dtype=np.int64)
+    keys = pd.DataFrame({"acc": acc, "amt": amt.copy()})
+    amount_index = AmountIndex.from_sorted(amt[rows].tolist(), rows.tolist())
+    return keys, amount_index, packed["header"]
+
+
+def build_dw_indexes(dw_df: pd.DataFrame) -> Tuple[AccountAmountIndex, AmountIndex]:
+    """
+    构建两个索引：
+    1) AccountAmountIndex：account -> 按金额排序的DW行（同账号多行时按金额取最接近、未用过的）
+    2) AmountIndex：按金额排序，供 [AMT-DELTA, AMT] 窗口二分查找
+    """
+    keys = dw_match_keys(dw_df)
+    return account_index_from_keys(keys), amount_index_from_keys(keys)
 
-    return account_map, amount_list
+
+# =======================
+# 整批一对一匹配
+# =======================
+HIT_NONE, HIT_AC, HIT_AMT = 0, 1, 2
+
+
+def _assign_on_line(t: List[float], a: List[float]) -> List[Tuple[int, int]]:
+    """
+    t、a 都已升序：一对一配对使 Σ|t-a| 最小，较短的一方全部配上，返回 [(t 的位置, a 的位置)]。
+    直线上的绝对值代价总有一个不交叉（两边顺序一致）的最优配对，所以按排序后的顺序做 DP，
+    O(len(t) × len(a))；金额相同时优先配位置靠前的。
+    """
+    swap = len(t) > len(a)
+    if swap:
+        t, a = a, t
+    n, m = len(t), len(a)
+    if n == 0:
+        return []
+    av = np.asarray(a, dtype=float)
+    # dp[j]：前 i+1 个 t 配进前 j+1 个 a 的最小代价；take[i, j]：dp 在 (i, j) 处取的是“t_i 配 a_j”
+    take = np.zeros((n, m), dtype=bool)
+    prev = np.zeros(m)   # 前 0 个 t：代价 0
+    for i in range(n):
+        cand = np.abs(av - t[i])
+        if i:
+            cand[1:] += prev[:-1]
+            cand[0] = np.inf
+        dp = np.minimum.accumulate(cand)
+        take[i, 1:] = cand[1:] < dp[:-1]
+        take[i, 0] = True
+        prev = dp
+    pairs = []
+    i, j = n - 1, m - 1
+    while i >= 0:
+        if take[i, j]:
+            pairs.append((i, j))
+            i -= 1
+        j -= 1
+    pairs.reverse()
+    return [(q, p) for p, q in pairs] if swap else pairs
+
+
+def _assign_account(steps: List[Tuple[float, int]], rows: List[Tuple[float, int]]) -> Dict[int, int]:
+    """
+    一个账号内的一对一分配，返回 {Step3行: DW行}：
+    先在“双方都有金额”的行之间做金额差总和最小的分配（配对数取满），
+    剩下的（没金额的、或另一方有金额的行已分完）按 Step3 顺序依次取行号最小的空行。
+    """
+    sv = sorted((t, s) for t, s in steps if t == t)
+    rv = sorted((a, r) for a, r in rows if a == a)
+    out = {}
+    used = set()
+    if len(sv) * len(rv) <= ASSIGN_MAX_PAIRS:
+        for p, q in _assign_on_line([t for t, _ in sv], [a for a, _ in rv]):
+            out[sv[p][1]] = rv[q][1]
+            used.add(rv[q][1])
+    else:
+        # 太大：金额差最小的先配
+        dist = np.abs(np.subtract.outer(np.array([t for t, _ in sv]), np.array([a for a, _ in rv])))
+        ss = np.repeat(np.array([s for _, s in sv], dtype=np.int64), len(rv))
+        rr = np.tile(np.array([r for _, r in rv], dtype=np.int64), len(sv))
+        for k in np.lexsort((rr, ss, dist.ravel())).tolist():
+            si, ri = int(ss[k]), int(rr[k])
+            if si not in out and ri not in used:
+                out[si] = ri
+                used.add(ri)
+    rest_rows = iter(sorted(r for _, r in rows if r not in used))
+    for si in sorted(s for _, s in steps if s not in out):
+        ri = next(rest_rows, None)
+        if ri is None:
+            break
+        out[si] = ri
+    return out
+
+
+def _match_accounts(step_acc: np.ndarray, step_amt: np.ndarray, active: np.ndarray, keys: pd.DataFrame,
+                    hits: np.ndarray, kinds: np.ndarray, used: np.ndarray) -> Optional[pd.DataFrame]:
+    """
+    账号阶段：Step3 与 DW 按账号分组，每个账号内做一对一分配（_assign_account：金额差总和最小），
+    每条 Step3、每个 DW 行最多用一次；同账号 Step3 比 DW 行多时，多出来的取金额最接近的行（走冲突检查）。
+    返回参与分配的DW行（acc / a / row，只含 Step3 里出现过的账号），没有则返回 None。
+    """
+    dw_acc = keys["acc"].tolist()
+    dw_accounts = set(dw_acc)
+    dw_accounts.discard("")
+    steps: Dict[str, List[Tuple[float, int]]] = {}
+    for i in np.flatnonzero(active).tolist():
+        if step_acc[i] in dw_accounts:
+            steps.setdefault(step_acc[i], []).append((step_amt[i], i))
+    if not steps:
+        return None
+
+    # 只留 Step3 里出现过的账号
+    keep = np.fromiter((a in steps for a in dw_acc), dtype=bool, count=len(dw_acc))
+    dw = pd.DataFrame({
+        "acc": np.array(dw_acc, dtype=object)[keep],
+        "a": keys["amt"].to_numpy()[keep],
+        "row": keys.index.to_numpy()[keep],
+    })
+    rows: Dict[str, List[Tuple[float, int]]] = {}
+    for acc, a, row in zip(dw["acc"].tolist(), dw["a"].tolist(), dw["row"].tolist()):
+        rows.setdefault(acc, []).append((a, row))
+
+    for acc, sp in steps.items():
+        dp = rows[acc]
+        assigned = _assign_account(sp, dp)
+        for si, ri in assigned.items():
+            hits[si] = ri
+            kinds[si] = HIT_AC
+            used[ri] = True
+
+        # 账号下的DW行已分完：取金额最接近的一行（没金额可比时取行号最小的）
+        extra = [(t, si) for t, si in sp if si not in assigned]
+        if extra:
+            valued = sorted((a, r) for a, r in dp if a == a)
+            first_row = min(r for _, r in dp)
+            for t, si in extra:
+                hits[si] = valued[_closest(valued, t)][1] if valued and t == t else first_row
+                kinds[si] = HIT_AC
+    return dw
+
+
+def _match_amounts(step_acc: np.ndarray, step_amt: np.ndarray, active: np.ndarray, keys: pd.DataFrame,
+                   account_rows: Optional[pd.DataFrame], amount_index: AmountIndex, delta: float,
+                   hits: np.ndarray, kinds: np.ndarray, used: np.ndarray):
+    """
+    金额阶段：账号没命中的 Step3，在 [AMT-delta, AMT] 窗口里一对一分配还没用过的DW行。
+    Step3 按金额从大到小处理，每条取窗口内最大（最接近）的可用金额——窗口等宽时这样分配的配对数最多。
+    “可用金额中不超过 AMT 的最大者”用并查集跳过已分配的位置，近似 O(1)。
+    窗口内的行都被账号阶段占了时，若占用它的 Step3 在本账号下还有空行，就把它挪过去、腾出这一行。
+    仍分不到的，退回 AmountIndex.find_best（可能落到已用的行，走冲突检查）。
+    """
+    sel = np.flatnonzero(active & (kinds == HIT_NONE) & ~np.isnan(step_amt))
+    if len(sel) == 0:
+        return
+
+    amt = keys["amt"].to_numpy()
+    rows = keys.index.to_numpy()
+    free = ~np.isnan(amt) & ~used[rows]
+    pool_a, pool_r = amt[free], rows[free]
+    order = np.lexsort((-pool_r, pool_a))   # 同金额时行号小的排在后面，先被取到
+    pool_a, pool_r = pool_a[order], pool_r[order]
+
+    t = step_amt[sel]
+    order = np.lexsort((sel, -t))
+    sel, t = sel[order], t[order]
+    start = np.searchsorted(pool_a, t, side="right") - 1
+
+    parent = list(range(len(pool_a)))
+
+    def find(k: int) -> int:
+        root = k
+        while root >= 0 and parent[root] != root:
+            root = parent[root]
+        while k >= 0 and parent[k] != k:
+            parent[k], k = root, parent[k]
+        return root
+
+    pool_a_l = pool_a.tolist()
+    pool_r_l = pool_r.tolist()
+    spare = None   # 账号阶段之后各账号剩余的空行（用到时才建）
+    for si, ti, k in zip(sel.tolist(), t.tolist(), start.tolist()):
+        q = find(k) if k >= 0 else -1
+        while q >= 0 and used[pool_r_l[q]]:
+            # 已被挪过去的账号命中占用
+            parent[q] = q - 1
+            q = find(q)
+        low = ti - delta
+        if q >= 0 and low == low and pool_a_l[q] >= low:
+            hits[si] = pool_r_l[q]
+            kinds[si] = HIT_AMT
+            used[pool_r_l[q]] = True
+            parent[q] = q - 1
+            continue
+
+        if low == low and account_rows is not None:
+            if spare is None:
+                spare = _SpareRows(account_rows, hits, kinds, used)
+            row = _reroute_account_hit(ti, delta, amount_index, spare, step_acc, step_amt, hits, used)
+            if row is not None:
+                hits[si] = row
+                kinds[si] = HIT_AMT
+                continue
+
+        hit = amount_index.find_best(ti, delta)
+        if hit is not None:
+            hits[si] = hit
+            kinds[si] = HIT_AMT
+
+
+class _SpareRows:
+    """账号阶段之后各账号还没用的DW行；要挪行时才按账号逐个建索引（以 used 为准）"""
+
+    def __init__(self, account_rows: pd.DataFrame, hits: np.ndarray, kinds: np.ndarray, used: np.ndarray):
+        self.account_rows = account_rows   # _match_accounts 返回的DW行（acc / a / row）
+        self.used = used
+        self.holder = {}   # DW行 -> 一对一占用它的账号命中 Step3
+        for si in np.flatnonzero(kinds == HIT_AC).tolist():
+            self.holder.setdefault(int(hits[si]), si)
+        self._groups = None
+        self._index: Dict[str, AccountAmountIndex] = {}
+
+    def take(self, account: str, target_amt: Optional[float]) -> Optional[int]:
+        """本账号金额最接近的空行；没有返回 None"""
+        index = self._index.get(account)
+        if index is None:
+            if self._groups is None:
+                self._groups = {}
+                df = self.account_rows
+                for acc, a, row in zip(df["acc"].tolist(), df["a"].tolist(), df["row"].tolist()):
+                    self._groups.setdefault(acc, []).append((a, row))
+            index = self._index[account] = AccountAmountIndex({account: self._groups.get(account, [])})
+        while index.has_available(account):
+            row = index.take(account, target_amt)
+            if not self.used[row]:
+                return row
+        return None
+
+
+def _reroute_account_hit(target: float, delta: float, amount_index: AmountIndex, spare: _SpareRows,
+                         step_acc: np.ndarray, step_amt: np.ndarray,
+                         hits: np.ndarray, used: np.ndarray) -> Optional[int]:
+    """
+    金额窗口内没有空行时：从最接近的开始找一行“被账号命中占用、且占用者的账号还有空行”的，
+    把占用者挪到本账号最接近的空行，腾出的这一行返回给金额命中。找不到返回 None。
+    """
+    amounts = amount_index.amounts
+    lo = bisect_left(amounts, target - delta)
+    k = bisect_right(amounts, target) - 1
+    while k >= lo:
+        row = amount_index.rows[k]
+        si = spare.holder.get(row)
+        if si is not None:
+            t = step_amt[si]
+            new_row = spare.take(step_acc[si], None if t != t else t)
+            if new_row is not None:
+                hits[si] = new_row
+                used[new_row] = True
+                spare.holder[new_row] = si
+                del spare.holder[row]
+                return row
+        k -= 1
+    return None
+
+
+def match_step3_rowwise(step_acc: List[str], step_amt: List[Optional[float]], active: List[bool],
+                        keys: pd.DataFrame, amount_index: AmountIndex,
+                        delta: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    逐行匹配（BATCH_MATCH = False），返回值同 match_step3_batch：
+    按 Step3 顺序，账号优先（同账号多行时取金额最接近、还没写回过的一行），再金额窗口兜底，先到先得。
+    """
+    n = len(step_acc)
+    hits = np.full(n, -1, dtype=np.int64)
+    kinds = np.zeros(n, dtype=np.int8)
+    account_index = account_index_from_keys(keys)
+    for i in range(n):
+        if not active[i]:
+            continue
+        cp_ac, amt = step_acc[i], step_amt[i]
+        hit, kind = None, HIT_NONE
+        if cp_ac and cp_ac in account_index:
+            hit, kind = account_index.take(cp_ac, amt), HIT_AC
+        if hit is None and amt is not None:
+            hit, kind = amount_index.find_best(amt, delta), HIT_AMT
+            if hit is not None:
+                account_index.mark_used(hit)
+        if hit is not None:
+            hits[i] = hit
+            kinds[i] = kind
+    return hits, kinds
+
+
+def match_step3_batch(step_acc: List[str], step_amt: List[Optional[float]], active: List[bool],
+                      keys: pd.DataFrame, amount_index: AmountIndex,
+                      delta: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    整批一对一匹配，返回 (hits, kinds)：
+    - hits[i]：Step3 第 i 行命中的 dw_df 行号，-1 表示没命中
+    - kinds[i]：HIT_AC / HIT_AMT / HIT_NONE
+    active[i] 为 False 的行（CP SWIFT 为空）不参与。
+    规则与逐行匹配相同（账号优先、金额窗口兜底），区别是同一DW行尽量只分给一条Step3。
+    """
+    n = len(step_acc)
+    acc = np.array(step_acc, dtype=object)
+    amt = np.array([np.nan if a is None else a for a in step_amt], dtype=float)
+    mask = np.array(active, dtype=bool)
+    hits = np.full(n, -1, dtype=np.int64)
+    kinds = np.zeros(n, dtype=np.int8)
+    used = np.zeros(int(keys.index.max()) + 1 if len(keys) else 0, dtype=bool)
+
+    account_rows = _match_accounts(acc, amt, mask, keys, hits, kinds, used)
+    _match_amounts(acc, amt, mask, keys, account_rows, amount_index, delta, hits, kinds, used)
+    return hits, kinds
+
+
+def read_dw_columns(patcher: DwWorkbookPatcher) -> Tuple[pd.DataFrame, Dict[int, object]]:
+    """
+    单遍流式读取DW：只取表头和匹配用的两列（账号、金额），返回 (dw_df, 表头{列号: 值})。
+    dw_df 只有这两列，行号、取值、类型推断都与 pd.read_excel 整表读取后再 pick_column 的结果一致：
+    - 列按 pick_column 的规则定位（表头同名取第一个，否则用Excel列字母）
+    - 两列的值交给 pandas 的 TextParser（pd.read_excel 内部同一个解析器）做空值/类型推断
+    """
+    header = patcher.read_row(DW_SHEET, 1)
+
+    cols = []
+    for name, letter in (DW_ACCOUNT_COL, DW_AMOUNT_COL):
+        col = next((c for c in sorted(header) if header[c] == name), None)
+        cols.append(col if col is not None else excel_col_letter_to_index(letter) + 1)
+
+    _, values, width = patcher.read_columns(DW_SHEET, cols)
+    for (name, letter), col in zip((DW_ACCOUNT_COL, DW_AMOUNT_COL), cols):
+        if col > width:
+            raise KeyError(f"找不到列名'{name}'且fallback列 {letter} 超出范围。")
+
+    names = [DW_ACCOUNT_COL[0], DW_AMOUNT_COL[0]]
+    rows = [["" if v is None else v for v in pair] for pair in zip(values[cols[0]], values[cols[1]])]
+    dw_df = TextParser([names] + rows, header=0, skip_blank_lines=False).read()
+    return dw_df.reset_index(drop=True), header
 
 
 def locate_dw_target_col(ws_dw) -> int:
@@ -125,9 +671,16 @@ def locate_dw_target_col(ws_dw) -> int:
     否则用 Y 列（第25列）
     """
     header_row = 1
+    return target_col_from_header(
+        {c: ws_dw.cell(header_row, c).value for c in range(1, ws_dw.max_column + 1)}
+    )
+
+
+def target_col_from_header(header: Dict[int, object]) -> int:
+    """同 locate_dw_target_col，输入为表头 {1-based列号: 值}（同名列取最右边的）"""
     header_map = {}
-    for c in range(1, ws_dw.max_column + 1):
-        v = ws_dw.cell(header_row, c).value
+    for c in sorted(header):
+        v = header[c]
         if v is None:
             continue
         header_map[str(v).strip()] = c
@@ -138,124 +691,268 @@ def locate_dw_target_col(ws_dw) -> int:
         return excel_col_letter_to_index("Y") + 1  # openpyxl是1-based
 
 
-# =======================
-# 主流程
-# =======================
-def main():
-    print("开始处理（修正版：生成新的DW文件，并把DW的Y列/交易对手账户开户行号改为Step3的CP SWIFT）...")
-
-    # 1) 读取Step3_Final
-    step_df = pd.read_excel(SWIFT_FILE, sheet_name=SWIFT_SHEET, engine="openpyxl").reset_index(drop=True)
-    for need in ["CP A/C", "AMT", "CP SWIFT"]:
-        if need not in step_df.columns:
-            raise KeyError(f"Step3_Final缺少列: {need}。实际列：{list(step_df.columns)}")
-
-    # 2) 读取DW（pandas用于匹配）
-    dw_df = pd.read_excel(DW_FILE, sheet_name=DW_SHEET, engine="openpyxl").reset_index(drop=True)
-    account_map, amount_list = build_dw_indexes(dw_df)
-
-    # 3) openpyxl加载DW原工作簿（用于写回并尽量保留格式）
-    wb_dw = load_workbook(DW_FILE)
+def save_with_openpyxl(cell_patches: Dict[Tuple[int, int], CellPatch], unmatched_rows: list,
+                       dw_file: str = None, output_file: str = None):
+    """
+    回退写法：openpyxl 整本载入、改单元格、整本保存。
+    DW 文件结构 DwWorkbookPatcher 处理不了时使用（结果相同，只是慢、且会重写整个文件）。
+    dw_file / output_file 默认取 DW_FILE / OUTPUT_FILE。
+    """
+    dw_file = dw_file or DW_FILE
+    output_file = output_file or OUTPUT_FILE
+    wb_dw = load_workbook(dw_file)
     if DW_SHEET not in wb_dw.sheetnames:
         raise KeyError(f"DW文件中找不到sheet: {DW_SHEET}")
     ws_dw = wb_dw[DW_SHEET]
 
-    target_col = locate_dw_target_col(ws_dw)
-
-    # 标色
-    yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-    orange_fill = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")  # 冲突
+    yellow_fill = PatternFill(start_color=YELLOW_RGB[2:], end_color=YELLOW_RGB[2:], fill_type="solid")
+    orange_fill = PatternFill(start_color=ORANGE_RGB[2:], end_color=ORANGE_RGB[2:], fill_type="solid")
     bold_font = Font(bold=True)
 
-    # 4) 开始匹配并写回DW
-    matched_ac = 0
-    matched_amt = 0
-    written = 0
-    conflicts = []
+    for (r, c), patch in cell_patches.items():
+        cell = ws_dw.cell(row=r, column=c)
+        if patch.fill:
+            cell.fill = orange_fill
+        if patch.value is not KEEP:
+            cell.value = patch.value
+
+    if UNMATCHED_SHEET in wb_dw.sheetnames:
+        del wb_dw[UNMATCHED_SHEET]
+    ws_un = wb_dw.create_sheet(UNMATCHED_SHEET)
+    for c, h in enumerate(UNMATCHED_HEADERS, 1):
+        ws_un.cell(row=1, column=c, value=h).font = bold_font
+    for r, row in enumerate(unmatched_rows, start=2):
+        for c, v in enumerate(row, start=1):
+            ws_un.cell(row=r, column=c, value=v)
+            ws_un.cell(row=r, column=c).fill = yellow_fill
+
+    wb_dw.save(output_file)
+
 
-    # 记录：dw_row_index -> 已写入的swift值
-    dw_written_value: Dict[int, str] = {}
+# =======================
+# Step3 输入
+# =======================
+class Step3Rows:
+    """
+    Step3_Final 匹配用到的三列，第 i 条对应 Step3_Final 的 Excel 行号 i+2：
+    - acc：规范化后的 CP A/C
+    - amt：金额 float（没有为 None）
+    - swift：去空格后的 CP SWIFT
+    既可以从读回的 Step3_Final 表（from_frame）构建，也可以由解析器逐条追加（append_record，不经过 Excel）。
+    """
 
-    unmatched_rows = []
+    __slots__ = ("acc", "amt", "swift")
 
-    for i in range(len(step_df)):
-        cp_ac = normalize_account(step_df.at[i, "CP A/C"])
-        amt = to_number(step_df.at[i, "AMT"])
-        cp_swift = "" if pd.isna(step_df.at[i, "CP SWIFT"]) else str(step_df.at[i, "CP SWIFT"]).strip()
+    def __init__(self):
+        self.acc: List[str] = []
+        self.amt: List[Optional[float]] = []
+        self.swift: List[str] = []
 
-        # Step3的Excel行号（假设第1行表头）
-        step_excel_row = i + 2
+    @classmethod
+    def from_frame(cls, step_df: pd.DataFrame) -> "Step3Rows":
+        for need in ["CP A/C", "AMT", "CP SWIFT"]:
+            if need not in step_df.columns:
+                raise KeyError(f"Step3_Final缺少列: {need}。实际列：{list(step_df.columns)}")
+        rows = cls()
+        rows.acc = [normalize_account(v) for v in step_df["CP A/C"]]
+        rows.amt = [to_number(v) for v in step_df["AMT"]]
+        rows.swift = ["" if pd.isna(v) else str(v).strip() for v in step_df["CP SWIFT"]]
+        return rows
 
-        if not cp_swift:
-            unmatched_rows.append((step_excel_row, cp_ac, amt, cp_swift, "CP SWIFT为空，未写回"))
-            continue
+    def append_record(self, rec: dict):
+        """追加一条解析记录（swift_core 的记录 dict）；有 AMT VALUE 时直接用数值，不再解析 AMT 文本"""
+        self.acc.append(normalize_account(rec.get("CP A/C", "")))
+        amt = rec.get("AMT VALUE")
+        self.amt.append(float(amt) if amt is not None else to_number(rec.get("AMT", "")))
+        self.swift.append(str(rec.get("CP SWIFT", "")).strip())
 
-        dw_hit = None
-        hit_type = None
+    def __len__(self) -> int:
+        return len(self.acc)
 
-        # 账号优先
-        if cp_ac and cp_ac in account_map:
-            dw_hit = account_map[cp_ac][0]
-            hit_type = "AC"
 
-        # 金额模糊匹配
-        if dw_hit is None and amt is not None:
-            dw_hit = find_best_by_amount(amount_list, amt, AMT_DELTA)
-            if dw_hit is not None:
-                hit_type = "AMT"
+def updated_output_path(dw_file: str) -> str:
+    """DW 新文件默认路径：DW 文件旁的 <DW文件名>_updated.xlsx"""
+    base, _ = os.path.splitext(dw_file)
+    return base + "_updated.xlsx"
 
-        if dw_hit is None:
-            unmatched_rows.append((step_excel_row, cp_ac, amt, cp_swift, "未匹配到DW"))
-            continue
 
-        # 写回DW：dw_hit 是 dw_df 的行号（0-based），对应Excel行号=dw_hit+2
-        dw_excel_row = dw_hit + 2
-        cell = ws_dw.cell(row=dw_excel_row, column=target_col)
+# =======================
+# 主流程
+# =======================
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
 
-        # 冲突检查
-        if dw_hit in dw_written_value and dw_written_value[dw_hit] != cp_swift:
-            conflicts.append((dw_excel_row, dw_written_value[dw_hit], cp_swift))
-            cell.fill = orange_fill
-            if ALLOW_OVERWRITE_ON_CONFLICT:
-                cell.value = cp_swift
-                dw_written_value[dw_hit] = cp_swift
-            # 若不允许覆盖，就保持第一次写入不动
-        else:
-            # 第一次写入 or 同值重复
-            cell.value = cp_swift
-            dw_written_value[dw_hit] = cp_swift
-            written += 1
-            if hit_type == "AC":
-                matched_ac += 1
-            else:
-                matched_amt += 1
-
-    # 5) 把未匹配行写入新sheet，并标黄
-    sheet_name_unmatched = "Unmatched_Step3"
-    if sheet_name_unmatched in wb_dw.sheetnames:
-        del wb_dw[sheet_name_unmatched]
-    ws_un = wb_dw.create_sheet(sheet_name_unmatched)
-
-    headers = ["Step3_Excel行号", "CP A/C", "AMT", "CP SWIFT", "原因"]
-    for c, h in enumerate(headers, 1):
-        ws_un.cell(row=1, column=c, value=h).font = bold_font
 
-    for r, row in enumerate(unmatched_rows, start=2):
-        for c, v in enumerate(row, start=1):
-            ws_un.cell(row=r, column=c, value=v)
-            ws_un.cell(row=r, column=c).fill = yellow_fill
+def main(status_callback=None):
+    """status_callback(message:str)：分阶段耗时摘要的输出通道，默认打印到终端。"""
+    metrics = RunMetrics("update_cp_swift")
+
+    print("开始处理（修正版：生成新的DW文件，并把DW的Y列/交易对手账户开户行号改为Step3的CP SWIFT）...")
+
+    # 1) 读取Step3_Final
+    with metrics.stage("read_step3", files=1, nbytes=_file_size(SWIFT_FILE)):
+        step_df = pd.read_excel(SWIFT_FILE, sheet_name=SWIFT_SHEET, engine="openpyxl").reset_index(drop=True)
+        step3 = Step3Rows.from_frame(step_df)
 
-    # 6) 保存新DW文件
-    wb_dw.save(OUTPUT_FILE)
+    write_back_step3(step3, status_callback=status_callback, metrics=metrics)
 
-    # 7) 终端汇总输出
-    print("\n==================== 处理完成（生成DW新文件） ====================")
-    print(f"输出文件: {OUTPUT_FILE}")
-    print(f"账号匹配写回: {matched_ac}")
-    print(f"金额模糊匹配写回: {matched_amt}")
-    print(f"实际写入DW单元格次数(去重后): {written}")
-    print(f"匹配失败/未写回(见Unmatched_Step3并已标黄): {len(unmatched_rows)}")
-    print(f"冲突数(同一DW行匹配到不同CP SWIFT，DW目标单元格标橙): {len(conflicts)}")
+
+def write_back_step3(step3: Step3Rows, dw_file: str = None, output_file: str = None,
+                     status_callback=None, metrics: RunMetrics = None) -> str:
+    """
+    把 Step3 行匹配回写到 DW，生成新的 DW 文件并返回其路径。
+    step3 可以来自读回的 Step3_Final（main），也可以由解析器在内存里直接交过来（swift_core.run_swift_pipeline）。
+    dw_file / output_file 默认取 DW_FILE / OUTPUT_FILE。
+    """
+    emit = status_callback or print
+    dw_file = dw_file or DW_FILE
+    output_file = output_file or OUTPUT_FILE
+    if metrics is None:
+        metrics = RunMetrics("update_cp_swift")
+
+    # 2) 读取DW：单遍流式，只取表头和匹配用的两列；同一个文件对象之后用于定点写回
+    #    （结构处理不了时回退 pd.read_excel 整表读取 + openpyxl 整本写回）
+    #    DW没变且索引缓存命中时，直接载入匹配键和金额索引，不再读工作表
+    patcher = None
+    dw_df = None
+    cache_key = dw_index_cache_key(dw_file, DW_SHEET, (DW_ACCOUNT_COL, DW_AMOUNT_COL))
+    cached = load_dw_index_cache(cache_key) if USE_DW_INDEX_CACHE else None
+    if cached is not None:
+        try:
+            with metrics.stage("load_dw_index", files=1):
+                dw_keys, amount_index, header = unpack_dw_index(cached)
+        except Exception:
+            cached = None   # 缓存损坏：当作未命中，重新读DW
+    try:
+        with metrics.stage("read_dw", files=1, nbytes=0 if cached is not None else _file_size(dw_file)):
+            try:
+                patcher = DwWorkbookPatcher(dw_file)
+                if cached is None:
+                    dw_df, header = read_dw_columns(patcher)
+            except XlsxPatchError as e:
+                emit(f"DW文件无法定点修改（{e}），改用openpyxl整本写回")
+                if patcher is not None:
+                    patcher.close()
+                    patcher = None
+                if cached is None:
+                    dw_df = pd.read_excel(dw_file, sheet_name=DW_SHEET, engine="openpyxl").reset_index(drop=True)
+                    wb_dw = load_workbook(dw_file, read_only=True)
+                    header = {c: v for c, v in enumerate(next(wb_dw[DW_SHEET].iter_rows(
+                        min_row=1, max_row=1, values_only=True), ()), 1)}
+                    wb_dw.close()
+        if dw_df is not None:
+            with metrics.stage("index", records=len(dw_df)):
+                dw_keys = dw_match_keys(dw_df)
+                amount_index = amount_index_from_keys(dw_keys)
+            if USE_DW_INDEX_CACHE:
+                save_dw_index_cache(cache_key, pack_dw_index(dw_keys, amount_index, header))
+
+        # 3) 定位写回列
+        target_col = target_col_from_header(header)
+
+        # 4) 开始匹配，记录要写回DW的单元格
+        matched_ac = 0
+        matched_amt = 0
+        written = 0
+        conflicts = []
+
+        # 记录：dw_row_index -> 已写入的swift值
+        dw_written_value: Dict[int, str] = {}
+        # (Excel行号, 列号) -> 改动（值 / 冲突标橙）
+        cell_patches: Dict[Tuple[int, int], CellPatch] = {}
+
+        unmatched_rows = []
+
+        with metrics.stage("match", records=len(step3)):
+            step_acc, step_amt, step_swift = step3.acc, step3.amt, step3.swift
+            match = match_step3_batch if BATCH_MATCH else match_step3_rowwise
+            hits, kinds = match(step_acc, step_amt, [bool(v) for v in step_swift], dw_keys, amount_index, AMT_DELTA)
+
+            for i in range(len(step3)):
+                cp_ac = step_acc[i]
+                amt = step_amt[i]
+                cp_swift = step_swift[i]
+
+                # Step3的Excel行号（假设第1行表头）
+                step_excel_row = i + 2
+
+                if not cp_swift:
+                    unmatched_rows.append((step_excel_row, cp_ac, amt, cp_swift, "CP SWIFT为空，未写回"))
+                    continue
+
+                dw_hit = None
+                hit_type = None
+                if kinds[i] != HIT_NONE:
+                    dw_hit = int(hits[i])
+                    hit_type = "AC" if kinds[i] == HIT_AC else "AMT"
+
+                if dw_hit is None:
+                    unmatched_rows.append((step_excel_row, cp_ac, amt, cp_swift, "未匹配到DW"))
+                    continue
+
+                # 写回DW：dw_hit 是 dw_df 的行号（0-based），对应Excel行号=dw_hit+2
+                dw_excel_row = dw_hit + 2
+                cell = cell_patches.get((dw_excel_row, target_col))
+                if cell is None:
+                    cell = cell_patches[(dw_excel_row, target_col)] = CellPatch()
+
+                # 冲突检查
+                if dw_hit in dw_written_value and dw_written_value[dw_hit] != cp_swift:
+                    conflicts.append((dw_excel_row, dw_written_value[dw_hit], cp_swift))
+                    cell.fill = ORANGE_RGB
+                    if ALLOW_OVERWRITE_ON_CONFLICT:
+                        cell.value = cp_swift
+                        dw_written_value[dw_hit] = cp_swift
+                    # 若不允许覆盖，就保持第一次写入不动
+                else:
+                    # 第一次写入 or 同值重复
+                    cell.value = cp_swift
+                    dw_written_value[dw_hit] = cp_swift
+                    written += 1
+                    if hit_type == "AC":
+                        matched_ac += 1
+                    else:
+                        matched_amt += 1
+
+        # 5) 把未匹配行写入新sheet，并标黄（已存在同名sheet时原位覆盖）
+        with metrics.stage("write_unmatched", records=len(unmatched_rows)):
+            unmatched_sheet = NewSheet(UNMATCHED_SHEET, UNMATCHED_HEADERS, unmatched_rows, row_fill=YELLOW_RGB)
+
+        # 6) 保存新DW文件：目标工作表流式改写，其余部件按原始字节拷贝
+        with metrics.stage("save", files=1):
+            if patcher is not None:
+                try:
+                    patcher.save(output_file, DW_SHEET, cell_patches, unmatched_sheet)
+                except XlsxPatchError as e:
+                    emit(f"DW文件无法定点修改（{e}），改用openpyxl整本写回")
+                    patcher.close()
+                    patcher = None
+            if patcher is None:
+                save_with_openpyxl(cell_patches, unmatched_rows, dw_file, output_file)
+    finally:
+        # 中途出错（如DW缺sheet/缺列抛 KeyError）也要关掉源文件；save 成功时已关闭，再关一次无副作用
+        if patcher is not None:
+            patcher.close()
+    metrics.add("save", nbytes=_file_size(output_file), calls=0)
+    metrics.count("matched_ac", matched_ac)
+    metrics.count("matched_amt", matched_amt)
+    metrics.count("written", written)
+    metrics.count("unmatched", len(unmatched_rows))
+    metrics.count("conflicts", len(conflicts))
+    metrics.finish(records=len(step3))
+    metrics.write_json(metrics_path_for(output_file))
+
+    # 7) 汇总输出（走 status_callback，GUI / exe 也能看到）；明细清单只打印到终端
+    emit("\n==================== 处理完成（生成DW新文件） ====================")
+    emit(f"输出文件: {output_file}")
+    emit(f"账号匹配写回: {matched_ac}")
+    emit(f"金额模糊匹配写回: {matched_amt}")
+    emit(f"实际写入DW单元格次数(去重后): {written}")
+    emit(f"匹配失败/未写回(见Unmatched_Step3并已标黄): {len(unmatched_rows)}")
+    emit(f"冲突数(同一DW行匹配到不同CP SWIFT，DW目标单元格标橙): {len(conflicts)}")
 
     if unmatched_rows:
         print("\n--- 未匹配/未写回（前50条）---")
@@ -271,6 +968,10 @@ def main():
         if len(conflicts) > 50:
             print(f"... 还有 {len(conflicts) - 50} 条未显示")
 
+    emit(f"耗时：{metrics.summary()}")
+    emit(f"指标文件: {metrics_path_for(output_file)}")
+    return output_file
+
 
 if __name__ == "__main__":
     try: